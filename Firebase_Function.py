@@ -5,127 +5,181 @@ FIREBASE STORAGE AND RETRIEVAL + FIREAUTH
 import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, firestore
-import hashlib
-import secrets
+from google.api_core.exceptions import AlreadyExists
+import copy
+import threading
+
+import local_cache
+from storage_codecs import encode_value, decode_value, pack, unpack, has_field
+from password_hasher import hash_password, verify_password, needs_rehash, PasswordHasherBusy
+
+# One Firestore client per server process. Streamlit imports this module once
+# and shares it between every browser session, so the client (and its gRPC
+# channel + TLS connection) only ever gets built once.
+_db = None
+_db_lock = threading.Lock()
+_warm_up_started = False  # main.py asks on every rerun; only the first one starts a thread
+
+
+def _load_credentials():
+    """Firebase credentials from the local json file, or Streamlit secrets."""
+    try:
+        return credentials.Certificate('firebase-credentials.json')
+    except FileNotFoundError:
+        # STREAMLIT secrets folder for Firebase Creds
+        return credentials.Certificate(dict(st.secrets["firebase"]))
+
+
+def get_db():
+    """Return the shared Firestore client, creating it on first use (thread-safe)."""
+    global _db
+
+    if _db is not None:
+        return _db
+
+    with _db_lock:
+        if _db is None:
+            try:
+                app = firebase_admin.get_app()
+            except ValueError:
+                app = firebase_admin.initialize_app(_load_credentials())
+            _db = firestore.client(app)
+
+    return _db
 
-# db (database) variable for Firebase
-db = None
 
 def init_firebase():
     """Initialise Firebase app and return Firestore information"""
-    global db
-    
+    return get_db()
+
+
+def _warm_up():
     try:
-        # Check if already initialised
-        firebase_admin.get_app()
-    except ValueError:
-        # don
-        try:
-            cred = credentials.Certificate('firebase-credentials.json')
-            firebase_admin.initialize_app(cred)
-        except FileNotFoundError:
-            # STREAMLIT secrets folder for Firebase Creds
-            cred_dict = {
-                "type": st.secrets["firebase"]["type"],
-                "project_id": st.secrets["firebase"]["project_id"],
-                "private_key_id": st.secrets["firebase"]["private_key_id"],
-                "private_key": st.secrets["firebase"]["private_key"],
-                "client_email": st.secrets["firebase"]["client_email"],
-                "client_id": st.secrets["firebase"]["client_id"],
-                "auth_uri": st.secrets["firebase"]["auth_uri"],
-                "token_uri": st.secrets["firebase"]["token_uri"],
-                "auth_provider_x509_cert_url": st.secrets["firebase"]["auth_provider_x509_cert_url"],
-                "client_x509_cert_url": st.secrets["firebase"]["client_x509_cert_url"]
-            }
-            cred = credentials.Certificate(cred_dict) # obtain credentials
+        # Cheap read so the channel + TLS handshake are done before anyone logs in
+        get_db().collection('users').limit(1).get()
+    except Exception:
+        pass
 
-            firebase_admin.initialize_app(cred)
-    
-    # Initialise db 
-    if db is None:
-        db = firestore.client()
-    
-    return db
+
+def warm_up_firebase():
+    """Build the Firestore client in the background so the first login doesn't pay for it (once per process)."""
+    global _warm_up_started
+    with _db_lock:
+        if _warm_up_started or _db is not None:
+            return
+        _warm_up_started = True
+    threading.Thread(target=_warm_up, name="nero-firebase-warmup", daemon=True).start()
 
 # ==================== AUTHENTICATION ====================
 
-def hash_password(password, salt=None):
-    """Password Hasher (for storage purposes)"""
-    if salt is None:
-        salt = secrets.token_hex(32)
+def _username_ref(db, username):
+    """usernames/{username} index doc, or None if the name can't be a document ID"""
+    if not username or '/' in username or username in ('.', '..') \
+            or (username.startswith('__') and username.endswith('__')):
+        return None
+    return db.collection('usernames').document(username)
 
-    hashed = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-    return hashed.hex(), salt
 
-def verify_password(stored_hash, stored_salt, password):
-    """Verify a password against stored hash"""
-    
-    hashed, _ = hash_password(password, stored_salt)
+@firestore.transactional
+def _reserve_username(transaction, username_ref, user_ref, user_data):
+    """Claim the username and create the user doc in one go. False if the name is taken."""
+    if username_ref.get(transaction=transaction).exists:
+        return False
+
+    # Accounts made before the index existed have no index doc - check the
+    # users themselves too (and index the old account while we're here)
+    legacy = user_ref.parent.where('username', '==', user_data['username']).limit(1)
+    existing = list(transaction.get(legacy))
+    if existing:
+        transaction.set(username_ref, {'user_id': existing[0].id})
+        return False
+
+    transaction.set(username_ref, {'user_id': user_ref.id})
+    transaction.set(user_ref, user_data)
+    return True
+
+
+def _find_user_by_username(db, username):
+    """Get a user doc by username through the usernames index (single key lookups)"""
+    username_ref = _username_ref(db, username)
+    if username_ref is None:
+        return None
+
+    index_doc = username_ref.get()
+    if index_doc.exists:
+        user_doc = db.collection('users').document(index_doc.to_dict()['user_id']).get()
+        return user_doc if user_doc.exists else None
+
+    # Accounts made before the index existed - look them up once and index them
+    users = list(db.collection('users').where('username', '==', username).limit(1).stream())
+    if not users:
+        return None
+    username_ref.set({'user_id': users[0].id})
+    return users[0]
 
-    return hashed == stored_hash
 
 def create_user(username, password, email=None): 
     """Create a new user account"""
-    global db
-    if db is None:
-        db = init_firebase()
+    db = get_db()
     
     try:
-        # Check if username already exists
-        users_ref = db.collection('users')
-        existing_user = users_ref.where('username', '==', username).limit(1).stream()
-        
-        if list(existing_user):
-            return {"success": False, "message": "Username already exists"}
-        
+        username_ref = _username_ref(db, username)
+        if username_ref is None:
+            return {"success": False, "message": "Username cannot contain '/' or be reserved"}
+
         # Hash the password
-        password_hash, salt = hash_password(password)
+        password_hash, salt, hash_params = hash_password(password)
         
         # Create user document with auto-generated ID
+        user_ref = db.collection('users').document()
         user_data = {
             'username': username,
             'email': email,
             'password_hash': password_hash,
             'salt': salt, # id
+            'hash_params': hash_params,
             'created_at': firestore.SERVER_TIMESTAMP,
             'tutorial_completed': False # for future use
         }
-        
-        doc_ref = users_ref.add(user_data)
-        user_id = doc_ref[1].id  # Get the generated document ID
+
+        # Username check + insert happen in one transaction, so two people
+        # registering the same name at once can't both get it
+        if not _reserve_username(db.transaction(), username_ref, user_ref, user_data):
+            return {"success": False, "message": "Username already exists"}
         
         return {
             "success": True, 
             "message": "Account created successfully!",
-            "user_id": user_id
+            "user_id": user_ref.id
         }
     
+    except PasswordHasherBusy as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"Error creating account: {str(e)}"}
 
 def authenticate_user(username, password):
     """Sign-in a user with username and password"""
-    global db
-    if db is None:
-        db = init_firebase()
+    db = get_db()
     
     try:
         # Find user by username
-        users_ref = db.collection('users')
-        user_query = users_ref.where('username', '==', username).limit(1).stream()
-        
-        users = list(user_query)
-        if not users:
+        user_doc = _find_user_by_username(db, username)
+        if user_doc is None:
             return {"success": False, "message": "Invalid username or password"}
         
-        user_doc = users[0]
         user_data = user_doc.to_dict()
         
         # Verify password
         stored_hash = user_data.get('password_hash')
         stored_salt = user_data.get('salt')
+        hash_params = user_data.get('hash_params')
         
-        if verify_password(stored_hash, stored_salt, password):
+        if verify_password(stored_hash, stored_salt, password, hash_params):
+            if needs_rehash(hash_params):
+                # Upgrade to the current cost off the login path
+                threading.Thread(target=_rehash_password, args=(user_doc.id, password),
+                                 daemon=True).start()
             return {
                 "success": True,
                 "message": "Login successful!",
@@ -137,28 +191,66 @@ def authenticate_user(username, password):
         else:
             return {"success": False, "message": "Invalid username or password"}
     
+    except PasswordHasherBusy as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"Error during login: {str(e)}"}
 
+def _rehash_password(user_id, password):
+    """Re-hash a password with CURRENT_HASH_PARAMS (runs in a background thread)"""
+    try:
+        new_hash, new_salt, new_params = hash_password(password)
+        get_db().collection('users').document(user_id).update({
+            'password_hash': new_hash,
+            'salt': new_salt,
+            'hash_params': new_params
+        })
+    except Exception:
+        pass  # keeps the old hash, tries again next login
+
 def check_username_exists(username):
     #Check if a username already exists
-    global db
-    if db is None:
-        db = init_firebase()
+    db = get_db()
     
     try:
-        users_ref = db.collection('users')
-        existing_user = users_ref.where('username', '==', username).limit(1).stream()
-        return len(list(existing_user)) > 0
+        return _find_user_by_username(db, username) is not None
     except Exception as e:
         st.error(f"Error checking username: {e}")
         return False
 
+def find_user_id(username):
+    """user_id for a username, or None"""
+    db = get_db()
+
+    try:
+        user = _find_user_by_username(db, username)
+        return user.id if user is not None else None
+    except Exception as e:
+        st.error(f"Error finding user: {e}")
+        return None
+
+def backfill_username_index():
+    """Write usernames/{username} docs for every existing account. Returns how many were added."""
+    db = get_db()
+
+    added = 0
+    batch = db.batch()
+    for user_doc in db.collection('users').select(['username']).stream():
+        username = (user_doc.to_dict() or {}).get('username')
+        username_ref = _username_ref(db, username)
+        if username_ref is None or username_ref.get().exists:
+            continue
+        batch.set(username_ref, {'user_id': user_doc.id})
+        added += 1
+        if added % 400 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    return added
+
 def update_user_email(user_id, new_email):
     #Update user's email address
-    global db
-    if db is None:
-        db = init_firebase()
+    db = get_db()
     
     try:
         user_ref = db.collection('users').document(user_id)
@@ -169,9 +261,7 @@ def update_user_email(user_id, new_email):
 
 def change_password(user_id, old_password, new_password):
     #Change user's password
-    global db
-    if db is None:
-        db = init_firebase()
+    db = get_db()
     
     try:
         user_ref = db.collection('users').document(user_id)
@@ -183,91 +273,391 @@ def change_password(user_id, old_password, new_password):
         user_data = user_doc.to_dict()
         
         # Verify old password
-        if not verify_password(user_data['password_hash'], user_data['salt'], old_password):
+        if not verify_password(user_data['password_hash'], user_data['salt'], old_password,
+                               user_data.get('hash_params')):
             return {"success": False, "message": "Incorrect current password"}
         
         # Hash new password
-        new_hash, new_salt = hash_password(new_password)
+        new_hash, new_salt, new_params = hash_password(new_password)
         
         # Update password
         user_ref.update({
             'password_hash': new_hash,
-            'salt': new_salt
+            'salt': new_salt,
+            'hash_params': new_params
         })
         
         return {"success": True, "message": "Password changed successfully!"}
     
+    except PasswordHasherBusy as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"Error changing password: {str(e)}"}
 
 # ==================== DATA STORAGE FUNCTIONS ====================
 
-def save_to_firebase(user_id, data_type, data):
-    """Save data to Firebase of a certain data type"""
-    global db
+# Values are cached in a local SQLite file (local_cache.py): reads come from
+# there when it has a fresh copy, writes land there first and a background
+# thread pushes them to Firestore. Values are encoded and, when big,
+# compressed (storage_codecs.py) only on the Firestore side; the local cache
+# keeps them as the app uses them.
+
+def _state_ref(db, user_id, data_type):
+    return db.collection('users').document(user_id).collection(data_type).document('current')
 
-    # INITIALISE db IF NOT DONE ALREADY
-    if db is None:
-        db = init_firebase()
+def _push_to_firestore(user_id, data_type, data, base_version):
+    """Write a cached value to Firestore if nobody else changed it since base_version"""
+    db = get_db()
+    doc_ref = _state_ref(db, user_id, data_type)
+
+    @firestore.transactional
+    def push(transaction):
+        doc = doc_ref.get(transaction=transaction)
+        remote = doc.to_dict() if doc.exists else {}
+        remote_version = remote.get('version', 0)
+
+        # base_version 0: never saw a remote version, so nothing to conflict with
+        if doc.exists and base_version and remote_version != base_version:
+            return False, decode_value(data_type, unpack(remote, 'data')), remote_version
+
+        transaction.set(doc_ref, {
+            **pack('data', encode_value(data_type, data)),
+            'version': remote_version + 1,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        })
+        return True, data, remote_version + 1
+
+    return push(db.transaction())
+
+def save_to_firebase(user_id, data_type, data):
+    """
+    Save data to Firebase of a certain data type.
+    True once it's in the local cache - the sync thread pushes it to Firestore
+    later (local_cache.unsynced() says how much is still waiting).
+    """
+    local_cache.start_sync(_push_to_firestore)
     
     try:
-        doc_ref = db.collection('users').document(user_id).collection(data_type).document('current')
-        doc_ref.set({'data': data, 'updated_at': firestore.SERVER_TIMESTAMP})
+        local_cache.put(user_id, data_type, data)
         return True
     
     except Exception as e:
         st.error(f"Error saving to Firebase: {e}")
         return False
 
+def save_many_to_firebase(user_id, values):
+    """Save several {data_type: data} in one local write (each still syncs as its own doc)"""
+    local_cache.start_sync(_push_to_firestore)
+
+    try:
+        local_cache.put_many(user_id, values)
+        return True
+
+    except Exception as e:
+        st.error(f"Error saving to Firebase: {e}")
+        return False
+
 def load_from_firebase(user_id, data_type):
     """Load data from Firebase of a certain key / data_type"""
-    global db
-    if db is None:
-        db = init_firebase()
-    
+    local_cache.start_sync(_push_to_firestore)
+
+    found, cached, usable = local_cache.get(user_id, data_type)
+    if usable:
+        return cached
+
     try:
-        doc_ref = db.collection('users').document(user_id).collection(data_type).document('current')
-        doc = doc_ref.get()
-        if doc.exists:
-            return doc.to_dict().get('data', None)
-        return None
+        doc = _state_ref(get_db(), user_id, data_type).get()
+        if not doc.exists:
+            return cached if found else None
+        remote = doc.to_dict()
+        data = decode_value(data_type, unpack(remote, 'data'))
+        local_cache.store_remote(user_id, data_type, data, remote.get('version', 0))
+        return data
     except Exception as e:
+        if found:
+            return cached  # offline - the stale local copy is better than nothing
         st.error(f"Error loading from Firebase: {e}")
         return None
 
-def save_timetable_snapshot(user_id, timetable, activities, events):
+# ==================== TIMETABLE HISTORY ====================
+# users/{uid}/timetable_history/{seq:08d}
+# Every HISTORY_KEYFRAME_EVERY-th snapshot is a full copy ('state'); the ones
+# in between only store what changed since the previous snapshot ('delta').
+# Snapshots older than HISTORY_MAX_ENTRIES are dropped a whole keyframe
+# block at a time, so every snapshot that's kept can still be rebuilt.
+# Big keyframes / deltas are stored compressed (storage_codecs.pack).
+# Each doc also carries small metadata fields (HISTORY_META_FIELDS) so the
+# history list can be browsed without downloading any snapshot bodies.
+
+HISTORY_KEYFRAME_EVERY = 10
+HISTORY_MAX_ENTRIES    = 100
+HISTORY_META_FIELDS    = ['seq', 'created_at', 'num_activities', 'num_events',
+                          'num_fixed_events', 'summary']
+
+# Latest (seq, state) per user written by this process, so saving a snapshot
+# doesn't have to rebuild the previous one from Firebase first. The state is a
+# copy - the live session objects it came from keep getting edited in place.
+# Another process may have written since; a seq that's already taken shows
+# up as AlreadyExists and the head is read again from Firebase.
+_history_heads = {}
+_history_lock = threading.Lock()
+
+
+def _diff(old, new):
+    """What changed between two dicts: {'set': {key: value}, 'unset': [key], 'sub': {key: diff}}"""
+    diff = {}
+    for key, value in new.items():
+        if key not in old:
+            diff.setdefault('set', {})[key] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                diff.setdefault('sub', {})[key] = _diff(old[key], value)
+            else:
+                diff.setdefault('set', {})[key] = value
+    unset = [key for key in old if key not in new]
+    if unset:
+        diff['unset'] = unset
+    return diff
+
+
+def _apply_diff(old, diff):
+    """Inverse of _diff: returns a new dict, `old` is left alone"""
+    new = dict(old)
+    for key in diff.get('unset', []):
+        new.pop(key, None)
+    for key, sub in diff.get('sub', {}).items():
+        new[key] = _apply_diff(new.get(key, {}), sub)
+    new.update(diff.get('set', {}))
+    return new
+
+
+def _history_ref(db, user_id):
+    return db.collection('users').document(user_id).collection('timetable_history')
+
+
+def _rebuild_snapshots(history_ref, first_seq, last_seq):
+    """{seq: state} for every snapshot in [first_seq, last_seq], replayed from the keyframe before first_seq"""
+    keyframe = (first_seq // HISTORY_KEYFRAME_EVERY) * HISTORY_KEYFRAME_EVERY
+    docs = history_ref.where('seq', '>=', keyframe).where('seq', '<=', last_seq)\
+        .order_by('seq').stream()
+
+    states = {}
+    state = None
+    for doc in docs:
+        data = doc.to_dict()
+        if has_field(data, 'state'):
+            state = unpack(data, 'state')
+        elif state is not None:
+            state = _apply_diff(state, unpack(data, 'delta'))
+        else:
+            continue  # keyframe missing (retention) - nothing to replay onto
+        if data['seq'] >= first_seq:
+            states[data['seq']] = state
+    return states
+
+
+def _history_head(db, user_id, cached=True):
+    """(seq, state) of the newest snapshot, or (-1, None) if there are none yet"""
+    with _history_lock:
+        if cached and user_id in _history_heads:
+            return _history_heads[user_id]
+
+    history_ref = _history_ref(db, user_id)
+    latest = list(history_ref.order_by('seq', direction=firestore.Query.DESCENDING).limit(1).stream())
+    if not latest:
+        return -1, None
+
+    seq = latest[0].to_dict()['seq']
+    return seq, _rebuild_snapshots(history_ref, seq, seq).get(seq)
+
+
+def _compact_history(history_ref, seq, max_entries):
+    """Delete keyframe blocks that fall entirely outside the newest max_entries snapshots"""
+    cutoff = ((seq - max_entries + 1) // HISTORY_KEYFRAME_EVERY) * HISTORY_KEYFRAME_EVERY
+    if cutoff <= 0:
+        return
+
+    db = get_db()
+    batch = db.batch()
+    count = 0
+    for doc in history_ref.where('seq', '<', cutoff).select([]).stream():
+        batch.delete(doc.reference)
+        count += 1
+        if count % 400 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+
+def save_timetable_snapshot(user_id, timetable, activities, events,
+                            max_entries=HISTORY_MAX_ENTRIES):
     """Saving a Timetable Snapshot inside timetable_history"""
-    global db
-    if db is None:
-        db = init_firebase()
+    db = get_db()
     
     try:
-        snapshot_data = {
+        state = copy.deepcopy({
             'timetable': timetable,
             'activities': activities,
             'events': events,
-            'created_at': firestore.SERVER_TIMESTAMP
-        }
-        db.collection('users').document(user_id).collection('timetable_history').add(snapshot_data)
+        })
+        history_ref = _history_ref(db, user_id)
+        num_fixed = sum(len(day_events) for day_events in timetable.values())
+
+        for attempt in range(3):
+            prev_seq, prev_state = _history_head(db, user_id, cached=attempt == 0)
+            seq = prev_seq + 1
+
+            if prev_state is not None and prev_state == state:
+                return True  # nothing changed since the last snapshot
+
+            snapshot_data = {
+                'seq': seq,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'num_activities': len(activities),
+                'num_events': len(events),
+                'num_fixed_events': num_fixed,
+                'summary': f"{len(activities)} activities, {len(events)} events, {num_fixed} fixed blocks",
+            }
+            if seq % HISTORY_KEYFRAME_EVERY == 0 or prev_state is None:
+                snapshot_data.update(pack('state', state))
+            else:
+                snapshot_data.update(pack('delta', _diff(prev_state, state)))
+
+            try:
+                # create() fails if another process already wrote this seq
+                history_ref.document(f"{seq:08d}").create(snapshot_data)
+                break
+            except AlreadyExists:
+                continue
+        else:
+            raise RuntimeError("history kept changing under us, try again")
+
+        with _history_lock:
+            _history_heads[user_id] = (seq, state)
+
+        if seq % HISTORY_KEYFRAME_EVERY == 0:
+            _compact_history(history_ref, seq, max_entries)
         return True
     
     except Exception as e:
         st.error(f"Error saving snapshot: {e}")
         return False
 
-def get_timetable_history(user_id, limit=10):
-    """Retrieving Timetable Snapshot History"""
-    global db
-    if db is None:
-        db = init_firebase()
-    
+def list_timetable_history(user_id, page_size=10, start_after=None):
+    """
+    One page of snapshot metadata, newest first - no snapshot bodies.
+    Pass the returned 'next_cursor' as start_after to get the next page
+    ('next_cursor' is None on the last page).
+    """
+    db = get_db()
+
     try:
-        docs = db.collection('users').document(user_id).collection('timetable_history')\
-            .order_by('created_at', direction=firestore.Query.DESCENDING)\
-            .limit(limit)\
-            .stream()
-        return [{'id': doc.id, **doc.to_dict()} for doc in docs]
-    
+        query = _history_ref(db, user_id)\
+            .order_by('seq', direction=firestore.Query.DESCENDING)\
+            .select(HISTORY_META_FIELDS)
+        if start_after is not None:
+            query = query.start_after({'seq': start_after})
+
+        docs = list(query.limit(page_size + 1).stream())
+        items = [{'id': doc.id, **doc.to_dict()} for doc in docs[:page_size]]
+        next_cursor = items[-1]['seq'] if len(docs) > page_size else None
+        return {'items': items, 'next_cursor': next_cursor}
+
     except Exception as e:
         st.error(f"Error loading history: {e}")
-        return []
+        return {'items': [], 'next_cursor': None}
+
+def get_timetable_snapshot(user_id, seq):
+    """Full body (timetable, activities, events) of one snapshot, or None if it's gone"""
+    db = get_db()
+
+    try:
+        return _rebuild_snapshots(_history_ref(db, user_id), seq, seq).get(seq)
+    except Exception as e:
+        st.error(f"Error loading snapshot: {e}")
+        return None
+
+# ==================== SESSION TOKENS ====================
+# Every issued token gets a users/{uid}/session_tokens/{token_id} doc with an
+# 'expires' timestamp. Logging out flags it revoked. The collection group
+# queries below need single-field collection-group indexes on 'expires' and
+# 'revoked' (Firestore console -> Indexes -> Single field -> Add exemption).
+
+def _session_tokens_ref(db, user_id):
+    return db.collection('users').document(user_id).collection('session_tokens')
+
+def save_session_token(user_id, token_id, expires):
+    """Record a newly issued token"""
+    db = get_db()
+
+    try:
+        _session_tokens_ref(db, user_id).document(token_id).set({
+            'expires': expires,
+            'revoked': False,
+            'created_at': firestore.SERVER_TIMESTAMP
+        })
+        return True
+    except Exception:
+        return False
+
+def revoke_session_token(user_id, token_id, expires):
+    """Flag a logged-out token as revoked (kept until the token would have expired)"""
+    db = get_db()
+
+    try:
+        _session_tokens_ref(db, user_id).document(token_id).set(
+            {'expires': expires, 'revoked': True}, merge=True
+        )
+        return True
+    except Exception:
+        return False
+
+def load_revoked_tokens(now):
+    """All revoked tokens that haven't expired yet, as {token_id: expires}"""
+    db = get_db()
+
+    try:
+        docs = db.collection_group('session_tokens').where('revoked', '==', True).stream()
+        revoked = {}
+        for doc in docs:
+            expires = doc.to_dict().get('expires')
+            if expires and expires > now:
+                revoked[doc.id] = expires
+        return revoked
+    except Exception:
+        return {}
+
+def delete_expired_session_tokens(now, batch_size=400):
+    """Delete every token doc (any user) that expired before `now`. Returns how many went."""
+    db = get_db()
+
+    deleted = 0
+    query = db.collection_group('session_tokens').where('expires', '<', now).select([])
+    while True:
+        docs = list(query.limit(batch_size).stream())
+        if not docs:
+            return deleted
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+
+def delete_legacy_session_tokens(batch_size=400):
+    """Delete the old users/{uid}/session_token_<token>/current docs. Returns how many went."""
+    db = get_db()
+
+    deleted = 0
+    batch = db.batch()
+    for user_ref in db.collection('users').list_documents():
+        for sub in user_ref.collections():
+            if not sub.id.startswith('session_token_'):
+                continue
+            for doc_ref in sub.list_documents():
+                batch.delete(doc_ref)
+                deleted += 1
+                if deleted % batch_size == 0:
+                    batch.commit()
+                    batch = db.batch()
+    batch.commit()
+    return deleted
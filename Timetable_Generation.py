@@ -2,10 +2,11 @@
 NERO-time
 """
 
+import copy
 from datetime import datetime, timedelta
 import streamlit as st
 import random
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Optional, Tuple
 import pytz
 timezone_str="Asia/Singapore"
 tz = pytz.timezone(timezone_str)
@@ -18,13 +19,21 @@ _DEFAULT_WORK_END_MINUTES   = 23 * 60 + 30  # 23:30
 BREAK_MINUTES = 30  # enforced break in between activities
 
 
+# Everything below reads and writes a `state` mapping. Left out, that's
+# st.session_state; the background generator passes a plain dict copy instead
+# (see generation_job.py) so it never touches the live session from its thread.
+
+def _state(state=None):
+    return st.session_state if state is None else state
+
+
 # Get starting time and ending time
 
-def get_work_start_minutes() -> int:
-    return st.session_state.get('work_start_minutes', _DEFAULT_WORK_START_MINUTES)
+def get_work_start_minutes(state=None) -> int:
+    return _state(state).get('work_start_minutes', _DEFAULT_WORK_START_MINUTES)
 
-def get_work_end_minutes() -> int:
-    return st.session_state.get('work_end_minutes', _DEFAULT_WORK_END_MINUTES)
+def get_work_end_minutes(state=None) -> int:
+    return _state(state).get('work_end_minutes', _DEFAULT_WORK_END_MINUTES)
 
 
 # TIME UTILITIES
@@ -70,9 +79,24 @@ def get_month_days(year: int, month: int) -> list:
     return days
 
 
+def get_range_days(first, last) -> list:
+    """Same as get_month_days, for every date from first to last (inclusive, may cross months)."""
+    days = []
+    day  = datetime(first.year, first.month, first.day)
+    while day.date() <= last:
+        day_name = WEEKDAY_NAMES[day.weekday()]
+        days.append({
+            'date': day,
+            'day_name': day_name,
+            'display': f"{day_name} {day.strftime('%d/%m')}"
+        })
+        day += timedelta(days=1)
+    return days
+
+
 # === TIMETABLE ==
 
-def get_timetable_view() -> Dict[str, list]:
+def get_timetable_view(state=None) -> Dict[str, list]:
     """
     Build the full timetable view 
 
@@ -83,15 +107,15 @@ def get_timetable_view() -> Dict[str, list]:
     Returns dict keyed by "Weekday DD/MM" → list of event dicts.
     """
 
-    now = datetime.now(tz)
+    state = _state(state)
     view: Dict[str, list] = {}
 
     # Copy fixed events (SCHOOL / COMPULSORY) from stored timetable
-    for day_display, events in st.session_state.timetable.items():
+    for day_display, events in state['timetable'].items():
         view[day_display] = [e.copy() for e in events]
 
     # Inject ACTIVITY rows from the sessions store
-    for session in st.session_state.sessions.values():
+    for session in state['sessions'].values():
         day_display = session.get('scheduled_day')
         start_time  = session.get('scheduled_time')
 
@@ -138,43 +162,29 @@ def get_timetable_view() -> Dict[str, list]:
 
 # === Slot checking (against both stored fixed events AND scheduled sessions) ===
 
-def is_time_slot_free(day: str, start_time: str, end_time: str) -> bool:
+def is_time_slot_free(day: str, start_time: str, end_time: str, state=None) -> bool:
     """
     Return True if [start_time, end_time) has zero overlap with every
     already-placed event on `day` (fixed events + sessions).
     """
-    s = time_str_to_minutes(start_time)
-    e = time_str_to_minutes(end_time)
-
-    # Check fixed events
-    for event in st.session_state.timetable.get(day, []):
-        es = time_str_to_minutes(event["start"])
-        ee = time_str_to_minutes(event["end"])
-        if not (e <= es or s >= ee):
-            return False
-
-    # Check already-scheduled sessions
-    for session in st.session_state.sessions.values():
-        if session.get('scheduled_day') != day:
-            continue
-        sched_time = session.get('scheduled_time')
-        if not sched_time:
-            continue
-        ss = time_str_to_minutes(sched_time)
-        se = ss + session['duration_minutes']
-        if not (e <= ss or s >= se):
-            return False
-
-    return True
+    from conflict_service import get_index
+    return get_index(_state(state)).is_free(
+        day, time_str_to_minutes(start_time), time_str_to_minutes(end_time)
+    )
 
 
 def add_fixed_event_to_timetable(day: str, start_time: str, end_time: str,
-                                  event_name: str, event_type: str):
-    """Insert a SCHOOL or COMPULSORY event into the stored timetable and sort."""
-    if day not in st.session_state.timetable:
-        st.session_state.timetable[day] = []
+                                  event_name: str, event_type: str, state=None, source_id: str = None):
+    """Insert a SCHOOL or COMPULSORY event into the stored timetable and sort.
+    source_id is the event_id of the schedule entry / event it came from."""
+    from conflict_service import get_index
+    state     = _state(state)
+    index     = get_index(state)
+    timetable = state['timetable']
+    if day not in timetable:
+        timetable[day] = []
     # Declare fixed activity
-    st.session_state.timetable[day].append({
+    timetable[day].append({
         "start":        start_time,
         "end":          end_time,
         "name":         event_name,
@@ -182,107 +192,110 @@ def add_fixed_event_to_timetable(day: str, start_time: str, end_time: str,
         "is_completed": False,
         "is_skipped":   False,
         "is_finished":  False,
+        "source_id":    source_id,
     })
-    st.session_state.timetable[day].sort(key=lambda x: time_str_to_minutes(x["start"]))
+    index.add_fixed(day, timetable[day][-1])
+    timetable[day].sort(key=lambda x: time_str_to_minutes(x["start"]))
 
 
 # ── Core slot finder ───────────────────────────────────────────────────────────
 
 def find_free_slot(day: str, duration_minutes: int,
-                   current_time_minutes: Optional[int] = None) -> Optional[Tuple[str, str]]:
+                   current_time_minutes: Optional[int] = None,
+                   state=None, rng=None) -> Optional[Tuple[str, str]]:
     """
-    Scan every 15-minute boundary on `day` and return the first (start, end)
-    pair where the activity window + silent break gap are both free.
+    Pick a (start, end) on `day` where the activity window + silent break gap
+    are both free, at random from the earliest third of the candidates.
+    Only the day's free gaps (from the conflict index) are walked, not every
+    15-minute boundary.
 
     Uses _ceil15 (ceiling) so that current_time_minutes is never rounded *down*
     into a slot that has already started.
     """
+    from conflict_service import get_index
+
     duration_minutes = int(duration_minutes)
-    work_start = get_work_start_minutes()
-    work_end   = get_work_end_minutes()
+    work_start = get_work_start_minutes(state)
+    work_end   = get_work_end_minutes(state)
 
     # Look for empty slots — ceiling-round so we never land in the past
     earliest = work_start
     if current_time_minutes is not None:
         earliest = max(work_start, _ceil15(current_time_minutes + 15))
 
-    # Find all possible "candidates" to add to the timetable
-    candidates = []
-    t = earliest
-    while t + duration_minutes <= work_end:
-        end_t     = t + duration_minutes
-        start_str = minutes_to_time_str(t)
-        end_str   = minutes_to_time_str(end_t)
-
-        if is_time_slot_free(day, start_str, end_str):
-            break_end = end_t + BREAK_MINUTES
-            if break_end <= work_end:
-                if is_time_slot_free(day, end_str, minutes_to_time_str(break_end)):
-                    candidates.append((t, start_str, end_str))
-            else:
-                candidates.append((t, start_str, end_str))
-
-        t += 15
-
-    if not candidates:
+    start = get_index(_state(state)).find_slot(day, duration_minutes, earliest, work_end, rng or random)
+    if start is None:
         return None
-
-    candidates.sort(key=lambda x: x[0])
-    pool = candidates[: max(1, len(candidates) // 3)]
-    random.shuffle(pool)
-    _, start_str, end_str = pool[0]
-    return start_str, end_str
+    return minutes_to_time_str(start), minutes_to_time_str(start + duration_minutes)
 
 
 # Fixed event placement
 
-def place_school_schedules(month_days: list, today: datetime):
-    """Place recurring school/work blocks from today onwards."""
-    if not st.session_state.school_schedule:
+def place_school_schedules(month_days: list, today: datetime, state=None):
+    """Place recurring school/work blocks from today onwards (see recurrence.py for the rules)."""
+    from recurrence import occurrences, school_rule
+    state = _state(state)
+    if not state['school_schedule']:
         return
 
-    today_date = today.date()
-    for day_info in month_days:
-        if day_info['date'].date() < today_date:
-            continue
-        day_name    = day_info['day_name']
-        day_display = day_info['display']
-        if day_name in st.session_state.school_schedule:
-            for evt in st.session_state.school_schedule[day_name]:
-                if is_time_slot_free(day_display, evt['start_time'], evt['end_time']):
+    displays = {day_info['date'].date(): day_info['display'] for day_info in month_days}
+    first    = max(today.date(), min(displays))
+    last     = max(displays)
+    for day_name, events in state['school_schedule'].items():
+        for evt in events:
+            for day in occurrences(school_rule(day_name, evt), first, last):
+                day_display = displays[day]
+                if is_time_slot_free(day_display, evt['start_time'], evt['end_time'], state):
                     add_fixed_event_to_timetable(
                         day_display, evt['start_time'], evt['end_time'],
-                        evt['subject'], "SCHOOL"
+                        evt['subject'], "SCHOOL", state, evt.get('event_id')
                     )
 
 
-def place_compulsory_events(today: datetime):
-    """Place one-time compulsory events from today onwards."""
+def place_compulsory_events(today: datetime, state=None, month_days: list = None,
+                            range_only: bool = False):
+    """
+    Place compulsory events from today onwards. Monthly ones go on every
+    occurrence in month_days; with range_only, one-time ones only if they're
+    in month_days too (range regeneration).
+    """
+    from recurrence import day_display, event_rule, occurrences
+    state = _state(state)
     today_date = today.date()
-    for event in st.session_state.list_of_compulsory_events:
-        day        = event["day"]
+    year = state.get('current_year', datetime.now(tz).year)
+    last = month_days[-1]['date'].date() if month_days else None
+    # Monthly events only from the first day being generated - a future month
+    # mustn't get this month's occurrences too
+    first = max(today_date, month_days[0]['date'].date()) if month_days else today_date
+    in_range = {day_info['display'] for day_info in month_days or []}
+
+    for event in state['list_of_compulsory_events']:
         start_time = event["start_time"]
         end_time   = event["end_time"]
-        try:
-            date_part = day.split()[-1]
-            day_num, month_num = map(int, date_part.split('/'))
-            year = st.session_state.get('current_year', datetime.now(tz).year)
-            event_date = datetime(year, month_num, day_num).date()
-            if event_date >= today_date and is_time_slot_free(day, start_time, end_time):
-                add_fixed_event_to_timetable(day, start_time, end_time, event["event"], "COMPULSORY")
-        except Exception:
-            if is_time_slot_free(day, start_time, end_time):
-                add_fixed_event_to_timetable(day, start_time, end_time, event["event"], "COMPULSORY")
+        rule       = event_rule(event, year)
+        if rule is None:
+            days = [event["day"]]  # can't tell when it is - place it where it says
+        elif rule[0] == 'once' or last is None:
+            days = [event["day"]] if rule[2] >= today_date else []
+        else:
+            days = [day_display(d) for d in occurrences(rule, first, last)]
+
+        if range_only:
+            days = [day for day in days if day in in_range]
+        for day in days:
+            if is_time_slot_free(day, start_time, end_time, state):
+                add_fixed_event_to_timetable(day, start_time, end_time, event["event"], "COMPULSORY",
+                                             state, event.get('event_id'))
 
 
 # Available-day calculation
 
 def get_available_days_for_activity(activity: dict, month_days: list,
-                                    today: datetime) -> list:
+                                    today: datetime, state=None) -> list:
     """Return days (from today up to deadline) on which this activity may be scheduled."""
     today_date           = today.date()
     current_time_minutes = today.hour * 60 + today.minute
-    work_end             = get_work_end_minutes()
+    work_end             = get_work_end_minutes(state)
 
     deadline_days = activity['deadline']
     deadline      = datetime.combine(today_date, datetime.min.time()) + timedelta(days=deadline_days)
@@ -305,19 +318,43 @@ def get_available_days_for_activity(activity: dict, month_days: list,
     return available
 
 
+def activity_windows(state, month_days: list, today: datetime) -> Dict[str, Dict[str, int]]:
+    """{activity name: {day display: earliest start minute}} for every day it may use."""
+    work_start = get_work_start_minutes(state)
+    return {
+        activity['activity']: {
+            d['display']: (max(work_start, _ceil15(d['current_time_minutes'] + 15))
+                           if d['is_today'] else work_start)
+            for d in get_available_days_for_activity(activity, month_days, today, state)
+        }
+        for activity in state['list_of_activities']
+    }
+
+
+def activity_shortfalls(state) -> Dict[str, int]:
+    """{activity name: minutes still not covered by any of its sessions}"""
+    scheduled = {}
+    for s in state['sessions'].values():
+        scheduled[s['activity_name']] = scheduled.get(s['activity_name'], 0) + s['duration_minutes']
+    return {
+        a['activity']: int(a['timing'] * 60) - scheduled.get(a['activity'], 0)
+        for a in state['list_of_activities']
+    }
+
+
 #  Past-session warnings
 
-def check_past_activities(activity: dict, warnings: list, today: datetime):
+def check_past_activities(activity: dict, warnings: list, today: datetime, state=None):
     """
     Warn about sessions for this activity that are scheduled in the past
     but have never been verified (not completed and not skipped).
-    Reads directly from st.session_state.sessions.
+    Reads directly from state['sessions'].
     """
     today_date    = today.date()
     activity_name = activity['activity']
     past_count    = 0
 
-    for session in st.session_state.sessions.values():
+    for session in _state(state)['sessions'].values():
         if session['activity_name'] != activity_name:
             continue
         if session.get('is_completed') or session.get('is_skipped'):
@@ -340,7 +377,36 @@ def check_past_activities(activity: dict, warnings: list, today: datetime):
 
 # === ACTIVITY SCHEDULER ===
 
-def _build_chunk_pool(min_session: int, max_session: int) -> list:
+def next_session_num(sessions: dict, activity_name: str) -> int:
+    """Number for a new session of this activity (after its others, ID not taken yet)."""
+    num = max((s['session_num'] for s in sessions.values() if s['activity_name'] == activity_name),
+              default=0) + 1
+    while f"{activity_name.replace(' ', '_')}_session_{num}" in sessions:
+        num += 1
+    return num
+
+
+def make_session(activity_name: str, session_num: int, day_display: str,
+                 date: datetime, start_time: str, duration_minutes: int) -> dict:
+    """A new generated (not manual, not edited) session."""
+    return {
+        'session_id':       f"{activity_name.replace(' ', '_')}_session_{session_num}",
+        'session_num':      session_num,
+        'activity_name':    activity_name,
+        'scheduled_day':    day_display,
+        'scheduled_date':   date.isoformat(),
+        'scheduled_time':   start_time,
+        'duration_minutes': duration_minutes,
+        'duration_hours':   round(duration_minutes / 60, 2),
+        'is_completed':     False,
+        'is_skipped':       False,
+        'is_finished':      False,
+        'is_user_edited':   False,
+        'is_manual':        False,
+    }
+
+
+def _build_chunk_pool(min_session: int, max_session: int, rng=None) -> list:
     """
     Build a weighted pool of chunk sizes between min_session and max_session
     so that random.choice() across the pool produces a realistic spread of
@@ -366,34 +432,48 @@ def _build_chunk_pool(min_session: int, max_session: int) -> list:
         weight = max(1, round((n - i) * 0.5 + 0.5))  # decreasing as size grows
         pool.extend([size] * weight)
 
-    random.shuffle(pool)
+    (rng or random).shuffle(pool)
     return pool
 
 
 def place_activity_sessions(activity: dict, month_days: list,
-                            warnings: list, today: datetime):
+                            warnings: list, today: datetime, state=None, rng=None):
+    """Schedule `activity` into free slots (see iter_place_activity_sessions)."""
+    for _ in iter_place_activity_sessions(activity, month_days, warnings, today, state, rng):
+        pass
+
+
+def iter_place_activity_sessions(activity: dict, month_days: list,
+                                 warnings: list, today: datetime, state=None, rng=None,
+                                 regen_days: set = None):
     """
     Schedule `activity` into free slots.
-    Writes new sessions directly into st.session_state.sessions.
+    Writes new sessions directly into state['sessions'] and yields each
+    new session as it's placed.
 
     Session handling:
       COMPLETED      → always kept, hours deducted from remaining
       USER-EDITED    → kept as-is (respects manual placement), hours deducted
+      OUTSIDE regen_days (when given) → frozen, kept as-is, hours deducted
       Everything else → discarded and regenerated
 
     Chunk sizes are drawn randomly from a weighted pool between min_session
     and max_session so output is varied rather than always max-length blocks.
+    All randomness comes from `rng` (a random.Random) when one is given.
     """
     activity_name = activity['activity']
     total_hours   = activity['timing']
     min_session   = round_to_15_minutes(activity.get('min_session_minutes', 30))
     max_session   = round_to_15_minutes(activity.get('max_session_minutes', 120))
 
-    check_past_activities(activity, warnings, today)
+    from conflict_service import get_index
+    sessions = _state(state)['sessions']
+    if regen_days is None:  # past sessions are outside any regenerated range
+        check_past_activities(activity, warnings, today, state)
 
     # ── Partition existing sessions ────────────────────────────────────────────
     existing = {
-        sid: s for sid, s in st.session_state.sessions.items()
+        sid: s for sid, s in sessions.items()
         if s['activity_name'] == activity_name
     }
     completed   = {sid: s for sid, s in existing.items() if s.get('is_completed', False)}
@@ -405,11 +485,14 @@ def place_activity_sessions(activity: dict, month_days: list,
     }
 
     keep = {**completed, **user_edited}
+    if regen_days is not None:
+        keep.update({sid: s for sid, s in existing.items() if s.get('scheduled_day') not in regen_days})
 
     # Remove every session that isn't being kept
+    index = get_index(_state(state))
     for sid in existing:
         if sid not in keep:
-            del st.session_state.sessions[sid]
+            index.remove_session(sessions.pop(sid))
 
     # Deduct hours already accounted for (completed + user-edited)
     kept_hours        = sum(s.get('duration_hours', 0) for s in keep.values())
@@ -418,10 +501,13 @@ def place_activity_sessions(activity: dict, month_days: list,
     if remaining_minutes <= 0:
         return
 
-    available_days = get_available_days_for_activity(activity, month_days, today)
+    available_days = get_available_days_for_activity(activity, month_days, today, state)
 
     if not available_days:
-        warnings.append(f"❌ '{activity_name}': No available days before deadline!")
+        if regen_days is None:
+            warnings.append(f"❌ '{activity_name}': No available days before deadline!")
+        else:
+            warnings.append(f"❌ '{activity_name}': No available days in this range before the deadline!")
         return
 
     # Determine next session number (after kept ones)
@@ -432,7 +518,7 @@ def place_activity_sessions(activity: dict, month_days: list,
 
     # ── Build a randomised chunk pool ─────────────────────────────────────────
     # Each slot draw picks a random size from this pool, giving natural variety.
-    chunk_pool = _build_chunk_pool(min_session, max_session)
+    chunk_pool = _build_chunk_pool(min_session, max_session, rng)
     pool_index = 0  # cycles through the shuffled pool
 
     new_sessions_count = 0
@@ -457,30 +543,20 @@ def place_activity_sessions(activity: dict, month_days: list,
             day_info['current_time_minutes'] if day_info.get('is_today') else None
         )
 
-        slot = find_free_slot(day_display, chunk, current_time_minutes=current_time_mins)
+        slot = find_free_slot(day_display, chunk, current_time_minutes=current_time_mins,
+                              state=state, rng=rng)
 
         if slot:
             start_time, _ = slot
             session_count      += 1
             new_sessions_count += 1
-            session_id = f"{activity_name.replace(' ', '_')}_session_{session_count}"
-
-            st.session_state.sessions[session_id] = {
-                'session_id':       session_id,
-                'session_num':      session_count,
-                'activity_name':    activity_name,
-                'scheduled_day':    day_display,
-                'scheduled_date':   day_info['date'].isoformat(),
-                'scheduled_time':   start_time,
-                'duration_minutes': chunk,
-                'duration_hours':   round(chunk / 60, 2),
-                'is_completed':     False,
-                'is_skipped':       False,
-                'is_finished':      False,
-                'is_user_edited':   False,
-                'is_manual':        False,
-            }
+            session = make_session(activity_name, session_count, day_display,
+                                   day_info['date'], start_time, chunk)
+            sessions[session['session_id']] = session
+            index.add_session(session)
+            session_id = session['session_id']
             remaining_minutes -= chunk
+            yield sessions[session_id]
 
         day_index  += 1
         days_tried += 1
@@ -507,61 +583,224 @@ def place_activity_sessions(activity: dict, month_days: list,
 
 # === TOP-LEVEL GENERATION ENTRY POINT ===
 
-def generate_timetable_with_sessions(year=None, month=None):
-    """Generate the complete timetable for the given month."""
-    if year is None or month is None:
-        now   = datetime.now(tz)
-        year  = now.year
-        month = now.month
+def iter_generate_timetable(state, year: int, month: int, today: Optional[datetime] = None,
+                            seed: Optional[int] = None, improve_budget_ms: Optional[int] = None):
+    """
+    Generate the complete timetable for the given month into `state`,
+    yielding progress events as it goes:
+
+        {'type': 'start',    'total': <number of activities>}
+        {'type': 'fixed'}                                         school + compulsory events placed
+        {'type': 'session',  'activity': name, 'session': {...}}  one new session placed
+        {'type': 'activity', 'activity': name, 'index': i, 'total': n}   activity finished
+        {'type': 'pack',     'added': {name: minutes}}            tight days re-packed (day_packer.py)
+        {'type': 'improve',  'added': {name: minutes}}            local search pass finished
+        {'type': 'done',     'warnings': [...]}
+
+    Stop iterating to cancel - `state` is then left half-generated, so only
+    do that on a copy. The same seed (and inputs) always gives the same greedy
+    placement; the local search after it (timetable_improve.py) runs for
+    improve_budget_ms, so how far it gets depends on the machine.
+    """
+    from conflict_service import invalidate
 
-    today      = datetime.now(tz)
     month_days = get_month_days(year, month)
 
     # ── Reset stored timetable (fixed events only) ─────────────────────────────
-    st.session_state.timetable     = {day['display']: [] for day in month_days}
-    st.session_state.current_month = month
-    st.session_state.current_year  = year
+    state['timetable']     = {day['display']: [] for day in month_days}
+    state['current_month'] = month
+    state['current_year']  = year
+    invalidate(state)
+
+    yield from _iter_generate(state, month_days, today, seed, improve_budget_ms)
+
+
+def iter_generate_range(state, first, last, today: Optional[datetime] = None,
+                        seed: Optional[int] = None, improve_budget_ms: Optional[int] = None):
+    """
+    Regenerate only the dates first..last (inclusive, starting today at the
+    earliest), yielding the same events as iter_generate_timetable.
+    Fixed events and sessions outside the range are frozen: they stay where
+    they are and still count towards each activity's hours.
+    """
+    from conflict_service import invalidate
+
+    if today is None:
+        today = datetime.now(tz)
+    days = get_range_days(max(first, today.date()), last)
+
+    for day_info in days:
+        state['timetable'][day_info['display']] = []
+    invalidate(state)
+
+    yield from _iter_generate(state, days, today, seed, improve_budget_ms,
+                              regen_days={day_info['display'] for day_info in days})
+
+
+def _iter_generate(state, month_days: list, today: Optional[datetime], seed: Optional[int],
+                   improve_budget_ms: Optional[int], regen_days: set = None):
+    """The generation itself, over month_days (the whole month, or just regen_days)."""
+    from conflict_service import invalidate
+    from day_packer import pack_tight_days
+    from timetable_improve import IMPROVE_BUDGET_MS, improve_timetable
+
+    if today is None:
+        today = datetime.now(tz)
+    rng = random.Random(seed) if seed is not None else None
 
     # ── Reset non-completed, non-user-edited sessions ──────────────────────────
-    for session in st.session_state.sessions.values():
+    for session in state['sessions'].values():
+        if regen_days is not None and session.get('scheduled_day') not in regen_days:
+            continue
         if not session.get('is_completed', False) and not session.get('is_user_edited', False):
             session['is_skipped']  = False
             session['is_finished'] = False
 
     warnings = []
 
-    # Fixed events first — activities must work around them
-    place_school_schedules(month_days, today)
-    place_compulsory_events(today)
-
     # Sort by urgency: nearest deadline first, then highest priority
     sorted_activities = sorted(
-        st.session_state.list_of_activities,
+        state['list_of_activities'],
         key=lambda x: (x['deadline'], -x['priority'])
     )
+    yield {'type': 'start', 'total': len(sorted_activities)}
 
-    for activity in sorted_activities:
-        place_activity_sessions(activity, month_days, warnings, today)
+    # Fixed events first — activities must work around them
+    place_school_schedules(month_days, today, state)
+    place_compulsory_events(today, state, month_days, range_only=regen_days is not None)
+    yield {'type': 'fixed'}
+
+    for index, activity in enumerate(sorted_activities):
+        for session in iter_place_activity_sessions(activity, month_days, warnings, today, state, rng,
+                                                    regen_days):
+            yield {'type': 'session', 'activity': activity['activity'], 'session': session}
         # Update num_sessions on the activity metadata
         activity['num_sessions'] = sum(
-            1 for s in st.session_state.sessions.values()
+            1 for s in state['sessions'].values()
             if s['activity_name'] == activity['activity']
         )
+        yield {'type': 'activity', 'activity': activity['activity'],
+               'index': index, 'total': len(sorted_activities)}
+
+    # Try to fit whatever greedy placement couldn't: re-pack tight days exactly,
+    # then local search for the rest
+    added = pack_tight_days(state, month_days, today)
+    yield {'type': 'pack', 'added': dict(added)}
+    for name, minutes in improve_timetable(
+        state, month_days, today,
+        IMPROVE_BUDGET_MS if improve_budget_ms is None else improve_budget_ms,
+        rng
+    ).items():
+        added[name] = added.get(name, 0) + minutes
+    for activity in sorted_activities:
+        if activity['activity'] in added:
+            _update_shortfall_warning(activity, added[activity['activity']], warnings, state)
+    invalidate(state)  # sessions changed - anything keyed on state_version is stale
+    yield {'type': 'improve', 'added': added}
 
-    st.session_state.timetable_warnings = warnings or []
-    # Save to firebase to open on the next use
-    if st.session_state.user_id:
-        from Firebase_Function import save_to_firebase, save_timetable_snapshot
-        save_to_firebase(st.session_state.user_id, 'timetable', st.session_state.timetable)
-        save_to_firebase(st.session_state.user_id, 'sessions',  st.session_state.sessions)
-        save_to_firebase(st.session_state.user_id, 'activities', st.session_state.list_of_activities)
-        save_to_firebase(st.session_state.user_id, 'current_month', month)
-        save_to_firebase(st.session_state.user_id, 'current_year', year)
-        save_timetable_snapshot(
-            st.session_state.user_id,
-            st.session_state.timetable,
-            st.session_state.list_of_activities,
-            st.session_state.list_of_compulsory_events,
-        )
+    state['timetable_warnings'] = warnings or []
+    yield {'type': 'done', 'warnings': warnings}
+
+
+def _update_shortfall_warning(activity: dict, added_minutes: int, warnings: list, state):
+    """Rewrite an activity's "could not fit" warning after the local search fitted more in."""
+    name = activity['activity']
+    activity['num_sessions'] = sum(1 for s in state['sessions'].values() if s['activity_name'] == name)
+    remaining = int(activity['timing'] * 60) - sum(
+        s['duration_minutes'] for s in state['sessions'].values() if s['activity_name'] == name
+    )
+    if remaining > 0:
+        message = (f"⚠️ '{name}': {remaining / 60:.1f}h could not fit before the deadline, "
+                   f"even after rearranging ({added_minutes / 60:.1f}h more fitted in)")
+    else:
+        message = (f"✓ '{name}': All {activity['timing']:.1f}h scheduled "
+                   f"({added_minutes / 60:.1f}h fitted in by rearranging other sessions)")
+
+    for i, warning in enumerate(warnings):
+        if warning.startswith(f"⚠️ '{name}': Scheduled"):
+            warnings[i] = message
+            return
+    warnings.append(message)
+
+
+def plan_snapshot(state=None) -> dict:
+    """Copy of the saved plan documents, to hand to save_generated_timetable(before=...) after generating."""
+    state = _state(state)
+    return copy.deepcopy({
+        'timetable':     state['timetable'],
+        'sessions':      state['sessions'],
+        'activities':    state['list_of_activities'],
+        'current_month': state.get('current_month'),
+        'current_year':  state.get('current_year'),
+    })
+
+
+def save_generated_timetable(year: int, month: int, before: dict = None):
+    """
+    Save a freshly generated timetable (already in st.session_state) to open on the next use.
+    With `before` (a plan_snapshot from before generating) only the documents that
+    changed are written, in one batch - nothing at all if the plan came out the same.
+    """
+    if not st.session_state.user_id:
+        return
+
+    from storage import get_storage
+    from timetable_diff import changed_documents
+
+    current = {
+        'timetable':     st.session_state.timetable,
+        'sessions':      st.session_state.sessions,
+        'activities':    st.session_state.list_of_activities,
+        'current_month': month,
+        'current_year':  year,
+    }
+    changed = changed_documents(before, current) if before is not None else list(current)
+    if not changed:
+        return
+
+    from group_availability import summary_if_changed
+
+    batch = {data_type: current[data_type] for data_type in changed}
+    summary = summary_if_changed(st.session_state.user_id, st.session_state, datetime.now(tz).date())
+    if summary is not None:
+        batch['availability'] = summary
+
+    storage = get_storage()
+    storage.save_many(st.session_state.user_id, batch)
+    storage.save_snapshot(
+        st.session_state.user_id,
+        st.session_state.timetable,
+        st.session_state.list_of_activities,
+        st.session_state.list_of_compulsory_events,
+    )
+    # History list in Settings reloads with the new snapshot on it
+    st.session_state.pop('history_items', None)
+
+
+def generate_timetable_with_sessions(year=None, month=None):
+    """Generate the complete timetable for the given month (blocking, straight into st.session_state)."""
+    if year is None or month is None:
+        now   = datetime.now(tz)
+        year  = now.year
+        month = now.month
+
+    before = plan_snapshot()
+    warnings = []
+    for event in iter_generate_timetable(st.session_state, year, month):
+        if event['type'] == 'done':
+            warnings = event['warnings']
+
+    save_generated_timetable(year, month, before)
+    return {'success': True, 'warnings': warnings or None}
+
+
+def generate_range_with_sessions(first, last):
+    """Regenerate just first..last (dates) in st.session_state and save it (blocking - ranges are small)."""
+    before = plan_snapshot()
+    warnings = []
+    for event in iter_generate_range(st.session_state, first, last):
+        if event['type'] == 'done':
+            warnings = event['warnings']
 
-    return {'success': True, 'warnings': warnings or None}
\ No newline at end of file
+    save_generated_timetable(st.session_state.current_year, st.session_state.current_month, before)
+    return {'success': True, 'warnings': warnings or None}
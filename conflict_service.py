@@ -0,0 +1,224 @@
+"""
+CONFLICT SERVICE
+The one per-day index of the timetable, and the one place that answers
+"what does this slot overlap?" / "where does a block fit?". Used by the
+generator (is_time_slot_free, find_free_slot), the planners that move
+sessions around (day_packer, timetable_improve, repair_planner),
+NeroTimeLogic._check_slot_conflicts / suggest_slots and the session edit
+preview in the Activities tab.
+
+- Each day's fixed events and scheduled sessions are indexed once, as
+  (start, end, item) sorted by start, so a query only looks at that day.
+- The index is rebuilt only when state['state_version'] changes. Anything
+  that changes the timetable or sessions either keeps the index in step
+  (add_fixed / add_session / remove_session, as the generator and planners
+  do) or calls invalidate() (NeroTimeLogic._save does it for you).
+- Query results are memoised by (day, start, duration, exclude_id, state_version),
+  so a form that re-renders every second doesn't redo the check.
+
+Results are dicts:
+    {'kind': 'work_start' | 'work_end' | 'fixed' | 'session',
+     'message': str, 'start': int, 'end': int,        (minutes)
+     'name': str, 'event_type': str | None, 'session_id': str | None}
+"""
+
+import bisect
+
+import streamlit as st
+
+from Timetable_Generation import (
+    get_work_end_minutes,
+    get_work_start_minutes,
+    minutes_to_time_str,
+    time_str_to_minutes,
+)
+from schedule_index import slot_starts
+
+INDEX_KEY   = 'conflict_index'
+VERSION_KEY = 'state_version'
+
+
+def _state(state=None):
+    return st.session_state if state is None else state
+
+
+def invalidate(state=None):
+    """Call after changing the timetable or sessions."""
+    state = _state(state)
+    state[VERSION_KEY] = state.get(VERSION_KEY, 0) + 1
+
+
+class ConflictIndex:
+    def __init__(self, state, version: int):
+        self.version = version
+        self._days   = {}  # day display -> [(start, end, item)] sorted by start
+        self._starts = {}  # day display -> [start, ...] (for bisect)
+        self._rows   = {}  # event_id -> [(day display, timetable row)] placed for it
+        self._memo   = {}
+
+        for day, events in state['timetable'].items():
+            for event in events:
+                self.add_fixed(day, event)
+        for session in state['sessions'].values():
+            self.add_session(session)
+
+    # === Incremental updates (the generator and planners use these while they place things) ===
+
+    def add(self, day: str, start: int, end: int, item: dict):
+        """Take [start, end) on `day` for `item` (a session, a timetable row, or a placeholder)."""
+        starts = self._starts.setdefault(day, [])
+        i = bisect.bisect_right(starts, start)
+        starts.insert(i, start)
+        self._days.setdefault(day, []).insert(i, (start, end, item))
+        self._memo.clear()
+
+    def remove(self, day: str, item: dict) -> bool:
+        """Free the interval `item` was added with on `day`. False if it wasn't there."""
+        for i, (_, _, other) in enumerate(self._days.get(day, [])):
+            if other is item:
+                del self._days[day][i]
+                del self._starts[day][i]
+                self._memo.clear()
+                return True
+        return False
+
+    def add_fixed(self, day: str, event: dict):
+        self.add(day, time_str_to_minutes(event['start']), time_str_to_minutes(event['end']), event)
+        if event.get('source_id'):
+            self._rows.setdefault(event['source_id'], []).append((day, event))
+
+    def add_session(self, session: dict):
+        """Index `session` where it's scheduled now (nothing if it isn't)."""
+        if session.get('scheduled_day') and session.get('scheduled_time'):
+            start = time_str_to_minutes(session['scheduled_time'])
+            self.add(session['scheduled_day'], start,
+                     start + session.get('duration_minutes', 0), session)
+
+    def remove_session(self, session: dict):
+        """Drop `session` from the day it's scheduled on - call before changing its day / time."""
+        for _, _, item in self._days.get(session.get('scheduled_day'), []):
+            if item.get('session_id') == session['session_id']:
+                self.remove(session['scheduled_day'], item)
+                return
+
+    # === Queries ===
+
+    def session_ids(self, day: str) -> list:
+        """Ids of the sessions on `day`, by start time."""
+        return [item['session_id'] for _, _, item in self._days.get(day, []) if item.get('session_id')]
+
+    def overlapping(self, day: str, start: int, end: int, exclude_id=None) -> list:
+        """(start, end, item) on `day` overlapping [start, end), by start time."""
+        items = self._days.get(day, [])
+        stop  = bisect.bisect_left(self._starts.get(day, []), end)
+        return [
+            (s, e, item) for s, e, item in items[:stop]
+            if e > start and (exclude_id is None or item.get('session_id') != exclude_id)
+        ]
+
+    def free_gaps(self, day: str, lo: int, hi: int, exclude_id=None) -> list:
+        """Free (start, end) stretches of `day` between lo and hi."""
+        gaps   = []
+        cursor = lo
+        for s, e, item in self._days.get(day, []):
+            if s >= hi:
+                break
+            if e <= cursor or (exclude_id is not None and item.get('session_id') == exclude_id):
+                continue
+            if s > cursor:
+                gaps.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < hi:
+            gaps.append((cursor, hi))
+        return gaps
+
+    def slot_candidates(self, day: str, duration: int, earliest: int, work_end: int) -> list:
+        """Every start minute for a `duration`-long block on `day` (see schedule_index.slot_starts)."""
+        return slot_starts(self.free_gaps(day, earliest, work_end), duration, work_end)
+
+    def find_slot(self, day: str, duration: int, earliest: int, work_end: int, rng=None):
+        """
+        Start minute for a `duration`-long block on `day` (see slot_candidates),
+        picked at random from the earliest third of them. None if nothing fits.
+        """
+        candidates = self.slot_candidates(day, duration, earliest, work_end)
+        if not candidates:
+            return None
+        pool = candidates[: max(1, len(candidates) // 3)]
+        return rng.choice(pool) if rng is not None else pool[0]
+
+    def fixed_rows(self, source_id: str) -> list:
+        """(day, timetable row) for every row placed for the event / schedule entry `source_id`."""
+        return list(self._rows.get(source_id, []))
+
+    def is_free(self, day: str, start: int, end: int) -> bool:
+        items = self._days.get(day, [])
+        stop  = bisect.bisect_left(self._starts.get(day, []), end)
+        return not any(e > start for _, e, _ in items[:stop])
+
+    def check(self, day: str, start: int, duration: int, exclude_id=None,
+              work_start: int = None, work_end: int = None) -> list:
+        """Structured conflicts for [start, start + duration) on `day` (see module docstring)."""
+        key = (day, start, duration, exclude_id, self.version, work_start, work_end)
+        if key in self._memo:
+            return self._memo[key]
+
+        end = start + duration
+        conflicts = []
+        if work_start is not None and start < work_start:
+            conflicts.append({
+                'kind': 'work_start', 'start': start, 'end': end, 'name': None,
+                'event_type': None, 'session_id': None,
+                'message': f"Start time {minutes_to_time_str(start)} is before your work start "
+                           f"({minutes_to_time_str(work_start)}).",
+            })
+        if work_end is not None and end > work_end:
+            conflicts.append({
+                'kind': 'work_end', 'start': start, 'end': end, 'name': None,
+                'event_type': None, 'session_id': None,
+                'message': f"Session would end at {minutes_to_time_str(end)}, "
+                           f"after your work end ({minutes_to_time_str(work_end)}).",
+            })
+
+        for s, e, item in self.overlapping(day, start, end, exclude_id):
+            if 'session_id' in item:
+                conflicts.append({
+                    'kind': 'session', 'start': s, 'end': e,
+                    'name': item.get('activity_name', '?'), 'event_type': 'ACTIVITY',
+                    'session_id': item['session_id'],
+                    'message': f"Overlaps with '{item.get('activity_name', '?')}' "
+                               f"Session {item.get('session_num', '?')} "
+                               f"({minutes_to_time_str(s)}–{minutes_to_time_str(e)}).",
+                })
+            else:
+                label = "Recurring schedule" if item.get("type") == "SCHOOL" else "Compulsory event"
+                conflicts.append({
+                    'kind': 'fixed', 'start': s, 'end': e, 'name': item['name'],
+                    'event_type': item.get('type'), 'session_id': None,
+                    'message': f"Overlaps with {label} '{item['name']}' "
+                               f"({item['start']}–{item['end']}).",
+                })
+
+        self._memo[key] = conflicts
+        return conflicts
+
+
+def get_index(state=None) -> ConflictIndex:
+    """The conflict index for `state` (st.session_state by default), rebuilt if the state changed."""
+    state   = _state(state)
+    version = state.get(VERSION_KEY, 0)
+    index   = state.get(INDEX_KEY)
+    if index is None or index.version != version:
+        index = ConflictIndex(state, version)
+        state[INDEX_KEY] = index
+    return index
+
+
+def check_slot(day: str, start_time: str, duration_minutes: int,
+               exclude_session_id: str = None, state=None) -> list:
+    """Conflicts (work hours, fixed events, other sessions) for a proposed session slot."""
+    state = _state(state)
+    return get_index(state).check(
+        day, time_str_to_minutes(start_time), int(duration_minutes), exclude_session_id,
+        get_work_start_minutes(state), get_work_end_minutes(state)
+    )
@@ -13,7 +13,7 @@ HOW IT WORKS:
              the URL.
 
 SECURITY NOTE:
-  The token value is a 48-byte random secret validated against Firebase.
+  The token value is signed (HMAC) by session_tokens.py and checked locally.
   Exposing it in the URL is acceptable for a personal productivity app, but
   if you need higher security, consider a proper backend session endpoint.
 """
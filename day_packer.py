@@ -0,0 +1,205 @@
+"""
+SINGLE-DAY PACKER (dynamic programming)
+On a nearly full day, find_free_slot takes the first gap that fits and can
+leave fragments nothing else fits into. For each such day this re-packs the
+day exactly:
+
+    - the day's movable sessions (not completed / edited / manual / past)
+      are lifted out and MUST all go back in (same length, maybe new time)
+    - new chunks of every activity that's short and may use the day are
+      added on top, using any length between its min and max session
+
+and maximises the minutes of new chunks. Everything is counted in
+15-minute units. Every block takes its length plus BREAK_MINUTES of the
+gap it sits in, except that the last block in the gap that runs to the end
+of the work day may let its break run past it.
+
+The state space is (gap, space left in it, sessions still to put back,
+minutes still wanted per activity). That's small on a tight day. If a day
+would need more than MAX_PACK_STATES states it is left alone.
+"""
+
+from Timetable_Generation import (
+    BREAK_MINUTES,
+    activity_shortfalls,
+    activity_windows,
+    get_work_end_minutes,
+    make_session,
+    minutes_to_time_str,
+    next_session_num,
+    round_to_15_minutes,
+    time_str_to_minutes,
+)
+from conflict_service import get_index
+
+MAX_PACK_STATES = 50_000
+
+_UNIT = 15
+
+
+class _TooBig(Exception):
+    pass
+
+
+def pack_day(gaps, work_end: int, required: list, wanted: dict, break_minutes: int = BREAK_MINUTES):
+    """
+    Best packing of one day.
+
+    gaps      [(start, end)] free stretches, in minutes
+    required  [(key, activity, minutes)] blocks that must all be placed
+    wanted    {activity: (min_session, max_session, minutes_short)} optional new blocks
+
+    Returns [(start, minutes, key_or_None, activity)] (key None = new block),
+    or None if it can't be done (or the day is too big to solve exactly).
+    """
+    brk = break_minutes // _UNIT
+    caps = []
+    for start, end in gaps:
+        start = -(-start // _UNIT) * _UNIT
+        allowance = break_minutes if end >= work_end else 0
+        caps.append(max(0, (end - start + allowance) // _UNIT))
+    total_cap = sum(caps)
+
+    # Required blocks with the same activity + length are interchangeable
+    kinds = sorted({(act, -(-mins // _UNIT)) for _, act, mins in required})
+    need  = tuple(sum(1 for _, act, mins in required if (act, -(-mins // _UNIT)) == k) for k in kinds)
+
+    acts  = sorted(wanted)
+    sizes = []
+    rem   = []
+    for act in acts:
+        lo, hi, short = wanted[act]
+        short_u = min(round_to_15_minutes(short) // _UNIT, total_cap)
+        sizes.append((max(1, lo // _UNIT), max(1, hi // _UNIT)))
+        rem.append(short_u)
+    rem = tuple(rem)
+
+    memo = {}
+
+    def best(g, cap, need, rem):
+        """(value, first move) for the rest of the day. value None = infeasible."""
+        if g == len(caps):
+            return (0, None) if not any(need) else (None, None)
+        key = (g, cap, need, rem)
+        if key in memo:
+            return memo[key]
+        if len(memo) >= MAX_PACK_STATES:
+            raise _TooBig()
+
+        result = (best(g + 1, caps[g + 1] if g + 1 < len(caps) else 0, need, rem)[0], ('next',))
+        for i, (_, units) in enumerate(kinds):
+            if need[i] and units + brk <= cap:
+                value = best(g, cap - units - brk, need[:i] + (need[i] - 1,) + need[i + 1:], rem)[0]
+                if value is not None and (result[0] is None or value > result[0]):
+                    result = (value, ('req', i))
+        for j, (lo, hi) in enumerate(sizes):
+            for units in range(1, min(hi, rem[j]) + 1):
+                # below the minimum session length only to finish off what's left
+                if (units < lo and units != rem[j]) or units + brk > cap:
+                    continue
+                value = best(g, cap - units - brk, need, rem[:j] + (rem[j] - units,) + rem[j + 1:])[0]
+                if value is None:
+                    continue
+                value += units * 100 - 1  # more minutes first, then fewer blocks
+                if result[0] is None or value > result[0]:
+                    result = (value, ('new', j, units))
+
+        memo[key] = result
+        return result
+
+    try:
+        value, _ = best(0, caps[0] if caps else 0, need, rem)
+    except (_TooBig, RecursionError):
+        return None
+    if value is None:
+        return None
+
+    # Walk the choices back out into actual times
+    placed  = []
+    keys    = {k: [key for key, act, mins in required if (act, -(-mins // _UNIT)) == k] for k in kinds}
+    g, cap  = 0, caps[0] if caps else 0
+    cursor  = -(-gaps[0][0] // _UNIT) * _UNIT if gaps else 0
+    while g < len(caps):
+        _, move = best(g, cap, need, rem)  # memoised
+        if move[0] == 'next':
+            g += 1
+            if g < len(caps):
+                cap, cursor = caps[g], -(-gaps[g][0] // _UNIT) * _UNIT
+            continue
+        if move[0] == 'req':
+            act, units = kinds[move[1]]
+            placed.append((cursor, units * _UNIT, keys[kinds[move[1]]].pop(), act))
+            need = need[:move[1]] + (need[move[1]] - 1,) + need[move[1] + 1:]
+        else:
+            _, j, units = move
+            placed.append((cursor, units * _UNIT, None, acts[j]))
+            rem = rem[:j] + (rem[j] - units,) + rem[j + 1:]
+        cap    -= units + brk
+        cursor += (units + brk) * _UNIT
+    return placed
+
+
+def pack_tight_days(state, month_days: list, today) -> dict:
+    """
+    Run pack_day on every day the greedy pass left with room for a chunk
+    of an activity that's still short. Returns {activity: minutes added}.
+    """
+    sessions   = state['sessions']
+    work_end   = get_work_end_minutes(state)
+    windows    = activity_windows(state, month_days, today)
+    shortfall  = activity_shortfalls(state)
+    activities = {a['activity']: a for a in state['list_of_activities']}
+    index      = get_index(state)
+    added      = {}
+
+    for day_info in month_days:
+        day   = day_info['display']
+        short = [n for n, m in shortfall.items() if m > 0 and day in windows[n]]
+        if not short:
+            continue
+        earliest = windows[short[0]][day]
+
+        # Worth a look only if there's room for the smallest chunk anyone wants
+        smallest = min(min(round_to_15_minutes(activities[n].get('min_session_minutes', 30)),
+                           max(15, round_to_15_minutes(shortfall[n]))) for n in short)
+        if not any(end - start >= smallest for start, end in index.free_gaps(day, earliest, work_end)):
+            continue
+
+        movable = [
+            sid for sid in index.session_ids(day)
+            if not sessions[sid].get('is_completed')
+            and not sessions[sid].get('is_user_edited') and not sessions[sid].get('is_manual')
+            and day in windows.get(sessions[sid]['activity_name'], {})
+            and time_str_to_minutes(sessions[sid]['scheduled_time']) >= earliest
+        ]
+        for sid in movable:
+            index.remove_session(sessions[sid])
+
+        wanted = {
+            n: (round_to_15_minutes(activities[n].get('min_session_minutes', 30)),
+                round_to_15_minutes(activities[n].get('max_session_minutes', 120)),
+                shortfall[n])
+            for n in short
+        }
+        required = [(sid, sessions[sid]['activity_name'], sessions[sid]['duration_minutes'])
+                    for sid in movable]
+        placed = pack_day(index.free_gaps(day, earliest, work_end), work_end, required, wanted)
+
+        if placed is None or all(key is not None for _, _, key, _ in placed):
+            for sid in movable:  # nothing gained - put the day back as it was
+                index.add_session(sessions[sid])
+            continue
+
+        for start, minutes, key, act in placed:
+            if key is not None:
+                sessions[key]['scheduled_time'] = minutes_to_time_str(start)
+            else:
+                session = make_session(act, next_session_num(sessions, act), day,
+                                       day_info['date'], minutes_to_time_str(start), minutes)
+                key = session['session_id']
+                sessions[key] = session
+                shortfall[act] -= minutes
+                added[act] = added.get(act, 0) + minutes
+            index.add_session(sessions[key])
+
+    return added
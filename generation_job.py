@@ -0,0 +1,128 @@
+"""
+BACKGROUND TIMETABLE GENERATION
+Runs iter_generate_timetable in a worker thread so the page stays usable.
+
+- The job works on a deep copy of the inputs it needs, never on st.session_state
+  (Streamlit state isn't safe to touch from another thread).
+- progress / message are updated after every placement event; the dashboard
+  just reads them on each rerun (the clock already reruns the page every second).
+- cancel() stops it between two placement events and throws the copy away.
+- When it's done, the script thread copies RESULT_KEYS back into
+  st.session_state in one go (NeroTimeLogic.finish_generation).
+- With candidates > 1 it runs portfolio mode instead (timetable_portfolio.py):
+  several seeded generations in parallel, best one kept.
+"""
+
+import copy
+import threading
+
+from Timetable_Generation import iter_generate_timetable
+from timetable_portfolio import PORTFOLIO_CANDIDATES, iter_portfolio
+
+# What the generator reads from session state
+INPUT_KEYS = (
+    'timetable', 'sessions', 'list_of_activities', 'list_of_compulsory_events',
+    'school_schedule', 'work_start_minutes', 'work_end_minutes', 'current_year',
+)
+# What it hands back
+RESULT_KEYS = (
+    'timetable', 'sessions', 'list_of_activities', 'timetable_warnings',
+    'current_month', 'current_year',
+)
+
+# Inputs the user can still edit while a job runs (if any of these change, the result is stale)
+_WATCHED_KEYS = ('sessions', 'list_of_activities', 'list_of_compulsory_events', 'school_schedule')
+# Session fields the clock sets on its own (check_expired_sessions, every rerun) - not edits
+_CLOCK_FIELDS = ('is_finished',)
+
+
+def _watched(key, value):
+    """What of `value` counts as user input for inputs_changed()."""
+    if key == 'sessions' and isinstance(value, dict):
+        return {sid: {f: v for f, v in s.items() if f not in _CLOCK_FIELDS} for sid, s in value.items()}
+    return value
+
+
+class GenerationJob:
+    """Handle for one background generation run."""
+
+    def __init__(self, session_state, year: int, month: int, candidates: int = PORTFOLIO_CANDIDATES):
+        self.year  = year
+        self.month = month
+        self.candidates = candidates
+
+        self.status   = 'running'  # running | done | cancelled | failed
+        self.progress = 0.0        # 0.0 - 1.0
+        self.message  = "Starting..."
+        self.sessions_placed = 0
+        self.error    = None
+        self.result   = None       # {key: value} for RESULT_KEYS once done
+
+        self._inputs = {k: copy.deepcopy(session_state[k]) for k in INPUT_KEYS if k in session_state}
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="nero-generate", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def running(self) -> bool:
+        return self.status == 'running'
+
+    def inputs_changed(self, session_state) -> bool:
+        """True if the user edited something the job was generating from."""
+        return any(_watched(k, session_state.get(k)) != _watched(k, self._inputs.get(k))
+                   for k in _WATCHED_KEYS)
+
+    def _run(self):
+        state = copy.deepcopy(self._inputs)
+        try:
+            if self.candidates > 1:
+                events = iter_portfolio(state, self.year, self.month, self.candidates, cancel=self._cancel)
+            else:
+                events = iter_generate_timetable(state, self.year, self.month)
+            for event in events:
+                if self._cancel.is_set():
+                    break
+                if event['type'] == 'best':
+                    state = event['state']
+                    state['timetable_warnings'].append(
+                        f"✓ Picked the best of {event['tried']} candidate timetables "
+                        f"(score {event['score']['total']:.1f})"
+                    )
+                self._on_event(event)
+            if self._cancel.is_set():
+                self.status  = 'cancelled'
+                self.message = "Generation cancelled"
+                return
+        except Exception as e:
+            self.error   = str(e)
+            self.status  = 'failed'
+            self.message = f"Error: {e}"
+            return
+
+        self.result   = {k: state[k] for k in RESULT_KEYS}
+        self.progress = 1.0
+        self.message  = "Done"
+        self.status   = 'done'
+
+    def _on_event(self, event):
+        kind = event['type']
+        if kind == 'start':
+            self._total = max(1, event['total'])
+            self.message = "Placing school and compulsory events..."
+        elif kind == 'fixed':
+            self.progress = 0.05
+        elif kind == 'session':
+            self.sessions_placed += 1
+            self.message = f"Scheduling '{event['activity']}' ({self.sessions_placed} session(s) placed)"
+        elif kind == 'activity':
+            self.progress = 0.05 + 0.95 * (event['index'] + 1) / self._total
+        elif kind == 'candidate':
+            self.progress = event['index'] / event['total']
+            self.message  = (f"Tried {event['index']} of {event['total']} candidate timetables "
+                             f"(best score {event['best_score']:.1f})")
@@ -0,0 +1,208 @@
+"""
+GROUP AVAILABILITY
+Finds times a whole study group is free, without loading anyone's plan.
+
+Sharing is opt-in (Settings, 'share_availability'): only users who turned
+it on have a summary at all, so nobody else's free time can be searched.
+Sharers have a small 'availability' document, rebuilt when generation saves
+the plan, on login, and at most every AVAILABILITY_REFRESH_SECONDS after
+other edits:
+    {'from': "YYYY-MM-DD", 'days': [hex busy mask, ...]}
+one mask per day from 'from' on (HORIZON_DAYS of them). Bit i is the 15
+minutes starting at i * 15 past midnight; it's set when the user is busy -
+a fixed event, a session, or outside their work hours. Breaks count as free.
+
+A group search loads only those documents (cached here for
+SUMMARY_MAX_AGE_SECONDS), flips them to free masks and ANDs them per day.
+A start that has `n` free slots after it is then just
+    free & free >> 1 & ... & free >> (n - 1)
+so a day for a group of 50 is 50 integer ANDs.
+
+Days outside a member's summary (before it was built, or past its horizon)
+aren't offered - nobody can vouch for them.
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from Timetable_Generation import (
+    get_range_days,
+    get_timetable_view,
+    get_work_end_minutes,
+    get_work_start_minutes,
+    minutes_to_time_str,
+    time_str_to_minutes,
+)
+from recurrence import day_display, fixed_events_between
+
+SLOT_MINUTES  = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY      = (1 << SLOTS_PER_DAY) - 1
+HORIZON_DAYS  = 42
+
+SUMMARY_MAX_AGE_SECONDS      = 60
+AVAILABILITY_REFRESH_SECONDS = 300
+
+# Saved plan documents the summary is built from
+AVAILABILITY_INPUTS = ('timetable', 'sessions', 'events', 'school_schedule',
+                       'work_start_minutes', 'work_end_minutes')
+
+
+def _span_mask(start: int, end: int) -> int:
+    """Bits for every slot that [start, end) minutes touches."""
+    lo = max(start // SLOT_MINUTES, 0)
+    hi = min(-(-end // SLOT_MINUTES), SLOTS_PER_DAY)
+    if hi <= lo:
+        return 0
+    return ((1 << hi) - 1) ^ ((1 << lo) - 1)
+
+
+# === Summaries ===
+
+def build_summary(state, today: date) -> dict:
+    """The 'availability' document for `state`, covering today .. today + HORIZON_DAYS - 1."""
+    last = today + timedelta(days=HORIZON_DAYS - 1)
+    off_hours = FULL_DAY ^ _span_mask(get_work_start_minutes(state), get_work_end_minutes(state))
+
+    view  = get_timetable_view(state)
+    fixed = None  # only worked out if some day isn't on the timetable
+    days  = []
+    for day_info in get_range_days(today, last):
+        busy = off_hours
+        rows = view.get(day_info['display'])
+        if rows is None:
+            if fixed is None:
+                fixed = fixed_events_between(state, today, last)
+            rows = [{'start': start, 'end': end, 'type': event_type}
+                    for _, start, end, event_type, _ in fixed.get(day_info['date'].date(), [])]
+        for row in rows:
+            if row.get('type') == 'BREAK' or row.get('is_skipped'):
+                continue
+            busy |= _span_mask(time_str_to_minutes(row['start']), time_str_to_minutes(row['end']))
+        days.append(format(busy, 'x'))
+
+    return {'from': today.isoformat(), 'days': days}
+
+
+def summary_if_changed(user_id: str, state, today: date) -> Optional[dict]:
+    """
+    A fresh summary for user_id, or None if it's the same as the one last
+    built / loaded - or if they don't share their availability.
+    """
+    if not state.get('share_availability'):
+        return None
+    summary = build_summary(state, today)
+    return summary if remember_summary(user_id, summary) else None
+
+
+def forget_summary(user_id: str):
+    with _cache_lock:
+        _cache.pop(user_id, None)
+
+
+class _Member:
+    """A summary decoded to one int per day."""
+    def __init__(self, summary: dict):
+        self.first = date.fromisoformat(summary['from'])
+        self.busy  = [int(mask, 16) for mask in summary['days']]
+
+    def free(self, day: date) -> Optional[int]:
+        i = (day - self.first).days
+        if not 0 <= i < len(self.busy):
+            return None
+        return FULL_DAY & ~self.busy[i]
+
+
+_cache: Dict[str, tuple] = {}  # user_id -> (loaded at, summary, _Member)
+_cache_lock = threading.Lock()
+
+
+def remember_summary(user_id: str, summary: dict) -> bool:
+    """Cache a summary just built for user_id. False if it's the same as the cached one."""
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached is not None and cached[1] == summary:
+            _cache[user_id] = (time.time(), summary, cached[2])
+            return False
+        _cache[user_id] = (time.time(), summary, _Member(summary))
+        return True
+
+
+def load_members(storage, user_ids: List[str]) -> Dict[str, Optional[_Member]]:
+    """{user_id: _Member, or None if they don't share (or haven't got a summary yet)}"""
+    members = {}
+    for user_id in user_ids:
+        with _cache_lock:
+            cached = _cache.get(user_id)
+        if cached is not None and time.time() - cached[0] < SUMMARY_MAX_AGE_SECONDS:
+            members[user_id] = cached[2]
+            continue
+
+        summary = storage.load(user_id, 'availability')
+        if not summary:
+            members[user_id] = None
+            continue
+        remember_summary(user_id, summary)
+        with _cache_lock:
+            members[user_id] = _cache[user_id][2]
+    return members
+
+
+# === Search ===
+
+def _runs(mask: int):
+    """(first slot, length) of every run of set bits, in order."""
+    starts = mask & ~(mask << 1)
+    while starts:
+        low   = starts & -starts
+        first = low.bit_length() - 1
+        rest  = ~(mask >> first)
+        yield first, (rest & -rest).bit_length() - 1
+        starts ^= low
+
+
+def find_shared_slots(members: List[_Member], first: date, last: date, duration_minutes: int,
+                      k: int = 5, now: Optional[datetime] = None) -> List[dict]:
+    """
+    Up to k times in [first, last] when every member is free for duration_minutes,
+    earliest first - one per shared free stretch, at its start.
+    [{'date', 'day', 'start', 'end', 'free_until'}]
+    """
+    need  = -(-duration_minutes // SLOT_MINUTES)
+    slots = []
+    day   = first
+    while day <= last and len(slots) < k:
+        shared = FULL_DAY
+        for member in members:
+            free = member.free(day)
+            if free is None:
+                shared = 0  # someone's summary doesn't cover this day
+            else:
+                shared &= free
+            if not shared:
+                break
+
+        if shared and now is not None and day == now.date():
+            shared &= ~_span_mask(0, now.hour * 60 + now.minute)  # slots already started
+
+        fits = shared
+        for i in range(1, need):
+            fits &= shared >> i
+
+        if fits:
+            for start, length in _runs(shared):
+                if length < need:
+                    continue
+                slots.append({
+                    'date':       day.isoformat(),
+                    'day':        day_display(day),
+                    'start':      minutes_to_time_str(start * SLOT_MINUTES),
+                    'end':        minutes_to_time_str((start + need) * SLOT_MINUTES),
+                    'free_until': minutes_to_time_str((start + length) * SLOT_MINUTES),
+                })
+                if len(slots) == k:
+                    break
+        day += timedelta(days=1)
+    return slots
@@ -0,0 +1,236 @@
+"""
+LOCAL CACHE (SQLite, WAL mode)
+Sits underneath load_from_firebase / save_to_firebase.
+
+- Reads are answered from the local file when it has a fresh enough copy.
+- Writes go to the local file first and are pushed to Firestore by a
+  background sync thread, so a flaky connection doesn't lose anything
+  (unsent changes stay in the file and are retried, even after a restart).
+- Every Firestore doc carries a 'version'. A push only goes through if the
+  remote version is still the one the local copy was based on; otherwise
+  someone else (another device / server) changed it first. That's a
+  conflict: the remote copy wins and the user gets told their view was reloaded.
+  A base_version of 0 means the local copy never saw a remote version (e.g.
+  a first save into a fresh cache) - there's nothing to conflict with, so
+  that push just goes through.
+- A write counts as saved once it's in the local file. Pushes that fail are
+  logged and retried; unsynced() says how many are still waiting.
+
+One row per (user_id, data_type):
+    data          JSON of the value
+    rev           local edit counter, bumped on every local write
+    base_version  remote 'version' the local copy is based on
+    dirty         1 if there's a local change Firestore hasn't got yet
+    synced_at     unix time we last agreed with Firestore
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CACHE_PATH            = os.environ.get("NERO_CACHE_PATH", os.path.join(".nero_cache", "nero_cache.sqlite3"))
+CACHE_MAX_AGE_SECONDS = 300  # older (clean) copies get re-read from Firestore
+SYNC_RETRY_SECONDS    = 5    # wait between push attempts when Firestore is unreachable
+
+log = logging.getLogger(__name__)
+
+# One connection per process, used under _conn_lock (WAL + PRAGMAs set up once,
+# not again for every Streamlit script thread)
+_connection = None
+_conn_lock = threading.RLock()
+_init_lock = threading.Lock()
+
+_sync_thread = None
+_sync_wakeup = threading.Event()
+_conflicts = {}  # user_id -> [data_type, ...] reloaded because of a conflict
+_conflicts_lock = threading.Lock()
+
+
+def _open() -> sqlite3.Connection:
+    global _connection
+
+    with _init_lock:
+        if _connection is None:
+            os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+            conn = sqlite3.connect(CACHE_PATH, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS state (
+                    user_id      TEXT    NOT NULL,
+                    data_type    TEXT    NOT NULL,
+                    data         TEXT,
+                    rev          INTEGER NOT NULL DEFAULT 0,
+                    base_version INTEGER NOT NULL DEFAULT 0,
+                    dirty        INTEGER NOT NULL DEFAULT 0,
+                    synced_at    REAL    NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, data_type)
+                )
+            """)
+            _connection = conn
+        return _connection
+
+
+@contextmanager
+def _conn():
+    """The process's shared connection, held for the with-block (statements are all quick)."""
+    with _conn_lock:
+        yield _open()
+
+
+# === Reads / writes used by Firebase_Function ===
+
+def get(user_id: str, data_type: str):
+    """
+    (found, data, usable) for a cached value.
+    usable is True if the copy can be returned without asking Firestore
+    (it has unsent local changes, or it was synced recently).
+    """
+    with _conn() as conn:
+        row = conn.execute(
+            "SELECT data, dirty, synced_at FROM state WHERE user_id = ? AND data_type = ?",
+            (user_id, data_type)
+        ).fetchone()
+    if row is None:
+        return False, None, False
+
+    data, dirty, synced_at = row
+    usable = bool(dirty) or (time.time() - synced_at) < CACHE_MAX_AGE_SECONDS
+    return True, json.loads(data), usable
+
+
+def put(user_id: str, data_type: str, data):
+    """Local write. Marks the row dirty and wakes the sync thread."""
+    with _conn() as conn:
+        conn.execute("""
+            INSERT INTO state (user_id, data_type, data, rev, dirty) VALUES (?, ?, ?, 1, 1)
+            ON CONFLICT (user_id, data_type) DO UPDATE SET
+                data = excluded.data, rev = state.rev + 1, dirty = 1
+        """, (user_id, data_type, json.dumps(data)))
+    _sync_wakeup.set()
+
+
+def put_many(user_id: str, values: dict):
+    """put() for several data_types in one SQLite transaction, with one sync wakeup."""
+    rows = [(user_id, data_type, json.dumps(data)) for data_type, data in values.items()]
+    with _conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("""
+                INSERT INTO state (user_id, data_type, data, rev, dirty) VALUES (?, ?, ?, 1, 1)
+                ON CONFLICT (user_id, data_type) DO UPDATE SET
+                    data = excluded.data, rev = state.rev + 1, dirty = 1
+            """, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    _sync_wakeup.set()
+
+
+def store_remote(user_id: str, data_type: str, data, version: int):
+    """Remember a value just read from Firestore (never overwrites unsent local changes)."""
+    with _conn() as conn:
+        conn.execute("""
+            INSERT INTO state (user_id, data_type, data, base_version, synced_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, data_type) DO UPDATE SET
+                data = excluded.data, base_version = excluded.base_version, synced_at = excluded.synced_at
+            WHERE state.dirty = 0
+        """, (user_id, data_type, json.dumps(data), version, time.time()))
+
+
+def unsynced(user_id: str) -> int:
+    """How many of the user's values are still waiting to reach Firestore."""
+    with _conn() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM state WHERE user_id = ? AND dirty = 1", (user_id,)
+        ).fetchone()[0]
+
+
+def pop_conflicts(user_id: str) -> list:
+    """data_types that were reloaded from Firestore because of a conflict (clears the list)."""
+    with _conflicts_lock:
+        return _conflicts.pop(user_id, [])
+
+
+# === Background sync ===
+
+def _pending():
+    with _conn() as conn:
+        return conn.execute(
+            "SELECT user_id, data_type, data, rev, base_version FROM state WHERE dirty = 1"
+        ).fetchall()
+
+
+def _mark_synced(user_id, data_type, rev, new_version):
+    # Still dirty if the row was edited again while the push was in flight
+    with _conn() as conn:
+        conn.execute("""
+            UPDATE state SET base_version = ?, synced_at = ?,
+                             dirty = CASE WHEN rev = ? THEN 0 ELSE 1 END
+            WHERE user_id = ? AND data_type = ?
+        """, (new_version, time.time(), rev, user_id, data_type))
+
+
+def _resolve_conflict(user_id, data_type, rev, remote_data, remote_version):
+    """
+    The remote copy wins - unless the row was edited again while the push was in
+    flight (rev moved on). That newer edit is kept, rebased onto the remote
+    version, and goes out on the next push.
+    """
+    with _conn() as conn:
+        replaced = conn.execute("""
+            UPDATE state SET data = ?, base_version = ?, synced_at = ?, dirty = 0
+            WHERE user_id = ? AND data_type = ? AND rev = ?
+        """, (json.dumps(remote_data), remote_version, time.time(), user_id, data_type, rev)).rowcount
+        if not replaced:
+            conn.execute("""
+                UPDATE state SET base_version = ?, dirty = 1
+                WHERE user_id = ? AND data_type = ?
+            """, (remote_version, user_id, data_type))
+            return
+    with _conflicts_lock:
+        _conflicts.setdefault(user_id, []).append(data_type)
+
+
+def _sync_once(push):
+    for user_id, data_type, data, rev, base_version in _pending():
+        try:
+            ok, remote_data, remote_version = push(user_id, data_type, json.loads(data), base_version)
+        except Exception as e:
+            # offline / Firestore error - try everything again later
+            log.warning("Pushing %s/%s to Firestore failed, will retry: %s", user_id, data_type, e)
+            return
+        if ok:
+            _mark_synced(user_id, data_type, rev, remote_version)
+        else:
+            _resolve_conflict(user_id, data_type, rev, remote_data, remote_version)
+
+
+def _sync_loop(push):
+    while True:
+        _sync_wakeup.wait(timeout=SYNC_RETRY_SECONDS)
+        _sync_wakeup.clear()
+        try:
+            _sync_once(push)
+        except Exception:
+            log.exception("Local cache sync failed, will retry")  # the thread must outlive it
+
+
+def start_sync(push):
+    """
+    Start the background sync thread (once per process).
+    push(user_id, data_type, data, base_version) -> (ok, remote_data, remote_version)
+    """
+    global _sync_thread
+    with _init_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_loop, args=(push,),
+                                            name="nero-cache-sync", daemon=True)
+            _sync_thread.start()
+    _sync_wakeup.set()  # push anything left over from a previous run
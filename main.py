@@ -4,11 +4,10 @@ Where it all starts to tick.
 """
 
 import streamlit as st
-import secrets
-from datetime import datetime, timedelta
 
 from nero_logic import NeroTimeLogic
-from Firebase_Function import load_from_firebase, save_to_firebase, init_firebase
+from storage import get_storage
+import conflict_service
 
 from css_style import css_scheme
 from tabs.tab_dashboard     import ui_dashboard_tab
@@ -20,45 +19,19 @@ from tabs.tab_settings      import ui_settings_tab
 from tabs.tab_help          import ui_help_tab
 from nero_clock             import show_live_clock
 
-from cookie_manager import load_cookies, get_cookie, set_cookie, delete_cookie
-
-
-SESSION_TTL_DAYS = 30
+from cookie_manager import load_cookies, get_cookie, set_cookie
+from session_tokens import SESSION_TTL_DAYS, create_token, validate_token
 
 
 def _create_session_token(user_id: str) -> str:
-    token  = secrets.token_urlsafe(48)
-    from datetime import datetime, timezone, timedelta
-    expiry = (datetime.now(timezone.utc) + timedelta(days=SESSION_TTL_DAYS)).isoformat()
-    
-    save_to_firebase(user_id, f"session_token_{token}", {
-        "user_id": user_id,
-        "expires": expiry,
-    })
-    return token
+    return create_token(user_id, SESSION_TTL_DAYS)
 
 
 def _validate_session_token(user_id: str, token: str) -> bool:
+    # Checked locally (signature + expiry + revocation list), no database read
     if not user_id or not token:
         return False
-    data = load_from_firebase(user_id, f"session_token_{token}")
-    if not data:
-        return False
-    try:
-        return datetime.utcnow() < datetime.fromisoformat(data["expires"])
-    except Exception:
-        return False
-
-
-def _delete_session_token(user_id: str, token: str):
-    if not user_id or not token:
-        return
-    try:
-        db = init_firebase()
-        db.collection('users').document(user_id) \
-          .collection(f"session_token_{token}").document('current').delete()
-    except Exception:
-        pass
+    return validate_token(token) == user_id
 
 
 def _login_success(user_id: str, username: str):
@@ -69,27 +42,12 @@ def _login_success(user_id: str, username: str):
     st.session_state.username      = username
     st.session_state.session_token = token
 
-    save_to_firebase(user_id, 'username', username)
+    get_storage().save(user_id, 'username', username)
 
     set_cookie("nero_user_id", user_id, days=SESSION_TTL_DAYS)
     set_cookie("nero_token",   token,   days=SESSION_TTL_DAYS)
 
 
-def _logout():
-    """Clear cookies, invalidate Firebase token, wipe session state."""
-    _delete_session_token(
-        st.session_state.get("user_id"),
-        st.session_state.get("session_token"),
-    )
-    delete_cookie("nero_user_id")
-    delete_cookie("nero_token")
-
-    for key in list(st.session_state.keys()):
-        del st.session_state[key]
-
-    st.rerun()
-
-
 def _restore_session_from_cookie():
     """Silently re-authenticate from cookie if no active session."""
     if st.session_state.get("user_id"):
@@ -108,6 +66,10 @@ def _restore_session_from_cookie():
 st.set_page_config(page_title="NERO-TIME", page_icon="🕛", layout="wide")
 st.markdown(css_scheme, unsafe_allow_html=True)
 
+# Start building the shared Firestore client while the page renders
+# (runs on every rerun, but only the first call per process does anything)
+get_storage().warm_up()
+
 # Read browser cookies into session_state 
 load_cookies()
 
@@ -121,27 +83,34 @@ if 'event_filter' not in st.session_state:
 # Restore login from cookie before showing anything
 _restore_session_from_cookie()
 
+# Another device changed data we had unsent edits for -> theirs won, reload it
+if st.session_state.user_id and get_storage().pop_conflicts(st.session_state.user_id):
+    st.session_state.data_loaded = False
+    st.toast("⚠️ Your data was changed on another device, so it has been reloaded.")
+
 # Check for expired sessions on every render
 if st.session_state.user_id and st.session_state.data_loaded:
     NeroTimeLogic.check_expired_sessions()
 
-# === Load Firebase data (only once per session) ====
+# === Load saved data (only once per session) ====
 
 if not st.session_state.data_loaded and st.session_state.user_id:
     with st.spinner("Loading..."):
-        uid = st.session_state.user_id
-
-        loaded_activities  = load_from_firebase(uid, 'activities')
-        loaded_events      = load_from_firebase(uid, 'events')
-        loaded_school      = load_from_firebase(uid, 'school_schedule')
-        loaded_timetable   = load_from_firebase(uid, 'timetable')
-        loaded_sessions    = load_from_firebase(uid, 'sessions')
-        loaded_completed   = load_from_firebase(uid, 'completed_activities')
-        loaded_month       = load_from_firebase(uid, 'current_month')
-        loaded_year        = load_from_firebase(uid, 'current_year')
-        loaded_work_start  = load_from_firebase(uid, 'work_start_minutes')
-        loaded_work_end    = load_from_firebase(uid, 'work_end_minutes')
-        loaded_username    = load_from_firebase(uid, 'username')
+        uid  = st.session_state.user_id
+        load = get_storage().load
+
+        loaded_activities  = load(uid, 'activities')
+        loaded_events      = load(uid, 'events')
+        loaded_school      = load(uid, 'school_schedule')
+        loaded_timetable   = load(uid, 'timetable')
+        loaded_sessions    = load(uid, 'sessions')
+        loaded_completed   = load(uid, 'completed_activities')
+        loaded_month       = load(uid, 'current_month')
+        loaded_year        = load(uid, 'current_year')
+        loaded_work_start  = load(uid, 'work_start_minutes')
+        loaded_work_end    = load(uid, 'work_end_minutes')
+        loaded_username    = load(uid, 'username')
+        loaded_sharing     = load(uid, 'share_availability')
 
         if loaded_work_start is not None: st.session_state.work_start_minutes       = loaded_work_start
         if loaded_work_end   is not None: st.session_state.work_end_minutes         = loaded_work_end
@@ -153,8 +122,14 @@ if not st.session_state.data_loaded and st.session_state.user_id:
         if loaded_month:                  st.session_state.current_month            = loaded_month
         if loaded_year:                   st.session_state.current_year             = loaded_year
         if loaded_username:               st.session_state.username                 = loaded_username
+        if loaded_sharing is not None:    st.session_state.share_availability       = loaded_sharing
 
         st.session_state.data_loaded = True
+        conflict_service.invalidate()
+        NeroTimeLogic.ensure_event_ids()
+        NeroTimeLogic.refresh_availability(force=True)  # its days start from today
+
+NeroTimeLogic.refresh_availability()  # after edits, at most every few minutes
 
 
 # === LOGIN SCREEN ==============================================================
@@ -184,8 +159,7 @@ if not st.session_state.user_id:
             if st.button("Sign In", type="primary", use_container_width=True, key="btn_signin"):
                 if login_username and login_password:
                     with st.spinner("Signing in..."):
-                        from Firebase_Function import authenticate_user
-                        result = authenticate_user(login_username, login_password)
+                        result = get_storage().authenticate_user(login_username, login_password)
                     if result["success"]:
                         _login_success(result["user_id"], login_username)
                         st.success("✓ " + result["message"])
@@ -214,8 +188,7 @@ if not st.session_state.user_id:
                     st.error("Password must be at least 6 characters")
                 else:
                     with st.spinner("Creating account..."):
-                        from Firebase_Function import create_user
-                        result = create_user(reg_username, reg_password, reg_email)
+                        result = get_storage().create_user(reg_username, reg_password, reg_email)
                     if result["success"]:
                         _login_success(result["user_id"], reg_username)
                         st.success("✓ " + result["message"])
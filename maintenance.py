@@ -0,0 +1,40 @@
+"""
+NERO-Time maintenance jobs
+Run by hand (or from a cron job), NOT by the Streamlit app.
+
+    python maintenance.py backfill-usernames
+    python maintenance.py cleanup-tokens
+"""
+
+import sys
+from datetime import datetime, timezone
+
+from Firebase_Function import (
+    backfill_username_index,
+    delete_expired_session_tokens,
+    delete_legacy_session_tokens,
+)
+
+
+def cleanup_tokens():
+    expired = delete_expired_session_tokens(datetime.now(timezone.utc))
+    legacy  = delete_legacy_session_tokens()
+    print(f"Deleted {expired} expired token(s) and {legacy} old session_token_* doc(s)")
+
+
+def main(argv):
+    jobs = {
+        'backfill-usernames': lambda: print(f"Indexed {backfill_username_index()} username(s)"),
+        'cleanup-tokens':     cleanup_tokens,
+    }
+
+    if len(argv) != 1 or argv[0] not in jobs:
+        print(f"usage: python maintenance.py [{' | '.join(jobs)}]")
+        return 1
+
+    jobs[argv[0]]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
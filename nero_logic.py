@@ -5,9 +5,12 @@ timezone_str="Asia/Singapore"
 import pytz
 tz = pytz.timezone(timezone_str)
 import streamlit as st
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List
-from Firebase_Function import save_to_firebase
+from storage import get_storage
+import conflict_service
+import recurrence
 from Timetable_Generation import (
     time_str_to_minutes,
     minutes_to_time_str,
@@ -21,6 +24,11 @@ def round_to_15_minutes(minutes: int) -> int:
     return int(((int(minutes) + 7) // 15) * 15)
 
 
+def new_event_id(prefix: str = "evt") -> str:
+    """Stable id for a compulsory event or school_schedule entry."""
+    return f"{prefix}_{uuid.uuid4().hex[:10]}"
+
+
 class NeroTimeLogic:
     """Backend logic for NERO-Time."""
 
@@ -45,6 +53,7 @@ class NeroTimeLogic:
             'timetable_warnings':  [],
             'work_start_minutes':  7 * 60,        # 07:00
             'work_end_minutes':    22 * 60 + 30,  # 22:30
+            'share_availability':  False,
         }
 
         for key, value in defaults.items():
@@ -54,14 +63,62 @@ class NeroTimeLogic:
     # === Firebase load / Save ===
     @staticmethod
     def _save(data_type: str, data):
+        from group_availability import AVAILABILITY_INPUTS
+
+        if data_type in ('timetable', 'sessions'):
+            conflict_service.invalidate()
+        if data_type in AVAILABILITY_INPUTS:
+            st.session_state.availability_stale = True  # picked up by refresh_availability()
         if st.session_state.user_id:
-            save_to_firebase(st.session_state.user_id, data_type, data)
+            get_storage().save(st.session_state.user_id, data_type, data)
+
+    @staticmethod
+    def refresh_availability(force: bool = False):
+        """
+        Rebuild this user's availability summary (group_availability.py) and save it
+        if it changed. Without force, only when a save marked it stale and at most
+        every AVAILABILITY_REFRESH_SECONDS - main.py calls this on every rerun.
+        """
+        import time
+        from group_availability import AVAILABILITY_REFRESH_SECONDS, summary_if_changed
+
+        uid = st.session_state.user_id
+        if not uid or not st.session_state.get('share_availability'):
+            return
+        now = time.time()
+        if not force and (not st.session_state.get('availability_stale')
+                          or now - st.session_state.get('availability_refreshed_at', 0) < AVAILABILITY_REFRESH_SECONDS):
+            return
+
+        st.session_state.availability_stale      = False
+        st.session_state.availability_refreshed_at = now
+        summary = summary_if_changed(uid, st.session_state, datetime.now(tz).date())
+        if summary is not None:
+            get_storage().save(uid, 'availability', summary)
+
+    @staticmethod
+    def set_share_availability(share: bool) -> Dict:
+        """Turn sharing your free / busy times with group searches on or off."""
+        try:
+            from group_availability import forget_summary
+
+            st.session_state.share_availability = share
+            NeroTimeLogic._save('share_availability', share)
+            if share:
+                NeroTimeLogic.refresh_availability(force=True)
+            elif st.session_state.user_id:
+                get_storage().save(st.session_state.user_id, 'availability', {})  # nothing left to find
+                forget_summary(st.session_state.user_id)
+            return {"success": True, "message": "Sharing your availability" if share else "Availability no longer shared"}
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
 
     # === SESSION EXPIRY CHECK ===
     @staticmethod
     def check_expired_sessions():
         """Mark sessions as is_finished when their end time has passed."""
         now = datetime.now(tz)
+        changed = False
 
         for session in st.session_state.sessions.values():
             if session.get('is_completed', False):
@@ -80,11 +137,15 @@ class NeroTimeLogic:
                     datetime.strptime(scheduled_time_str, "%H:%M").time()
                 ))
                 end_dt = start_dt + timedelta(minutes=session.get('duration_minutes', 0))
-                session['is_finished'] = (end_dt <= now)
+                if session.get('is_finished', False) != (end_dt <= now):
+                    session['is_finished'] = (end_dt <= now)
+                    changed = True
             except Exception:
                 pass
 
-        NeroTimeLogic._save('sessions', st.session_state.sessions)
+        # Runs on every rerun - only write when a session actually just finished
+        if changed:
+            NeroTimeLogic._save('sessions', st.session_state.sessions)
 
     # === Conflict checking ===
 
@@ -96,61 +157,78 @@ class NeroTimeLogic:
         Return a list of human-readable conflict strings for the proposed window
         [start_time, start_time + duration_minutes) on day_display.
 
-        Checks:
+        Checks (via conflict_service, indexed per day and memoised):
           - Work-hour boundaries
           - Fixed timetable events (SCHOOL / COMPULSORY)
           - All other scheduled sessions (skipping exclude_session_id)
-          - Proposed slot is not in the past
         """
-        conflicts = []
-        s_min = time_str_to_minutes(start_time)
-        e_min = s_min + duration_minutes
-
-        work_start = st.session_state.get('work_start_minutes', 7 * 60)
-        work_end   = st.session_state.get('work_end_minutes', 22 * 60 + 30)
-
-        # Work boundary
-        if s_min < work_start:
-            conflicts.append(
-                f"Start time {start_time} is before your work start "
-                f"({minutes_to_time_str(work_start)})."
-            )
-        if e_min > work_end:
-            conflicts.append(
-                f"Session would end at {minutes_to_time_str(e_min)}, "
-                f"after your work end ({minutes_to_time_str(work_end)})."
+        return [
+            c['message'] for c in conflict_service.check_slot(
+                day_display, start_time, duration_minutes, exclude_session_id
             )
+        ]
 
-        # Fixed events
-        for event in st.session_state.timetable.get(day_display, []):
-            es = time_str_to_minutes(event["start"])
-            ee = time_str_to_minutes(event["end"])
-            if not (e_min <= es or s_min >= ee):
-                label = "Recurring schedule" if event.get("type") == "SCHOOL" else "Compulsory event"
-                conflicts.append(
-                    f"Overlaps with {label} '{event['name']}' "
-                    f"({event['start']}–{event['end']})."
-                )
+    @staticmethod
+    def suggest_slots(session_id: str, near_date: str = None, near_time: str = None,
+                      k: int = 3, duration_minutes: int = None) -> List[Dict]:
+        """
+        Up to k free slots for a session, closest to near_date / near_time first
+        (defaults: where it is now). A slot is inside work hours, after now, on or
+        before the activity deadline and clear of everything else, with the
+        generator's break after it (schedule_index.slot_starts). At most one
+        suggestion per free gap, so they aren't all 15 minutes apart.
 
-        # Other sessions
-        for sid, session in st.session_state.sessions.items():
-            if sid == exclude_session_id:
-                continue
-            if session.get('scheduled_day') != day_display:
-                continue
-            sched_time = session.get('scheduled_time')
-            if not sched_time:
-                continue
-            ss = time_str_to_minutes(sched_time)
-            se = ss + session.get('duration_minutes', 0)
-            if not (e_min <= ss or s_min >= se):
-                conflicts.append(
-                    f"Overlaps with '{session.get('activity_name', '?')}' "
-                    f"Session {session.get('session_num', '?')} "
-                    f"({sched_time}–{minutes_to_time_str(se)})."
-                )
+        Returns [{'date': 'YYYY-MM-DD', 'day': 'Tuesday 07/10', 'start': 'HH:MM'}]
+        """
+        from Timetable_Generation import get_work_end_minutes, get_work_start_minutes
+        from schedule_index import slot_starts
 
-        return conflicts
+        session = st.session_state.sessions.get(session_id)
+        if not session:
+            return []
+        activity = next((a for a in st.session_state.list_of_activities
+                         if a['activity'] == session['activity_name']), None)
+        if activity and activity['deadline'] < 0:
+            return []
+
+        duration   = int(duration_minutes or session.get('duration_minutes', 60))
+        work_start = get_work_start_minutes()
+        work_end   = get_work_end_minutes()
+        now        = datetime.now(tz)
+        today      = now.date()
+        last_day   = today + timedelta(days=activity['deadline'] if activity else 14)
+
+        near_day = datetime.fromisoformat(near_date or session.get('scheduled_date') or today.isoformat()).date()
+        near_day = min(max(near_day, today), last_day)
+        near_min = time_str_to_minutes(near_time or session.get('scheduled_time') or now.strftime("%H:%M"))
+
+        index = conflict_service.get_index()
+        found = []  # (distance in minutes, date, start)
+        for offset in range((last_day - today).days + 1):
+            # Nothing on a day this far away can beat what we already have
+            if len(found) >= k and (offset - 1) * 24 * 60 > found[k - 1][0]:
+                break
+            for day in {near_day + timedelta(days=offset), near_day - timedelta(days=offset)}:
+                if not today <= day <= last_day:
+                    continue
+                lo = work_start
+                if day == today:
+                    lo = max(lo, (now.hour * 60 + now.minute) // 15 * 15 + 15)
+                display = f"{WEEKDAY_NAMES[day.weekday()]} {day.strftime('%d/%m')}"
+                for gap in index.free_gaps(display, lo, work_end, session_id):
+                    starts = slot_starts([gap], duration, work_end)
+                    if not starts:
+                        continue
+                    start = min(starts, key=lambda s: abs(s - near_min))
+                    found.append((abs((day - near_day).days * 24 * 60 + start - near_min), day, start))
+            found.sort(key=lambda x: x[0])
+
+        return [
+            {'date':  day.isoformat(),
+             'day':   f"{WEEKDAY_NAMES[day.weekday()]} {day.strftime('%d/%m')}",
+             'start': minutes_to_time_str(start)}
+            for _, day, start in found[:k]
+        ]
 
     # === Dashboard data ===
     @staticmethod
@@ -163,6 +241,23 @@ class NeroTimeLogic:
         current_day, current_time = NeroTimeLogic._get_current_time_slot()
         timetable_view = get_timetable_view()
 
+        # Days that haven't been generated still show their recurring / compulsory events
+        missing = [d for d in month_days if d['display'] not in st.session_state.timetable]
+        if missing:
+            fixed = recurrence.fixed_events_between(
+                st.session_state, missing[0]['date'].date(), missing[-1]['date'].date()
+            )
+            for day_info in missing:
+                events = [
+                    {"start": start, "end": end, "name": name, "type": event_type,
+                     "is_completed": False, "is_skipped": False, "is_finished": False,
+                     "source_id": source_id}
+                    for name, start, end, event_type, source_id in fixed.get(day_info['date'].date(), [])
+                ]
+                if events:
+                    timetable_view.setdefault(day_info['display'], []).extend(events)
+                    timetable_view[day_info['display']].sort(key=lambda e: time_str_to_minutes(e['start']))
+
         return {
             "month_name":   datetime(st.session_state.current_year,
                                      st.session_state.current_month, 1).strftime("%B"),
@@ -270,31 +365,37 @@ class NeroTimeLogic:
                 if name in st.session_state.list_of_activities[i]['activity']:
                     return {"success": False, "message": "Activity name cannot be the same as a previous activity name"}
 
-            deadline_dt = tz.localize(datetime.fromisoformat(deadline_date))
-            today = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
-            days_left = (deadline_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today).days
-
-            min_session = int(round_to_15_minutes(min_session))
-            max_session = int(round_to_15_minutes(max_session))
-
-            new_activity = {
-                "activity":            name,
-                "priority":            priority,
-                "deadline":            days_left,
-                "timing":              total_hours,
-                "min_session_minutes": min_session,
-                "max_session_minutes": max_session,
-                "allowed_days":        allowed_days or WEEKDAY_NAMES,
-                "session_mode":        session_mode,
-                "num_sessions":        0,
-            }
-
+            new_activity = NeroTimeLogic.build_activity(
+                name, priority, deadline_date, total_hours,
+                min_session, max_session, allowed_days, session_mode
+            )
             st.session_state.list_of_activities.append(new_activity)
             NeroTimeLogic._save('activities', st.session_state.list_of_activities)
             return {"success": True, "message": f"Activity '{name}' added"}
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
 
+    @staticmethod
+    def build_activity(name: str, priority: int, deadline_date: str, total_hours: int,
+                      min_session: int = 30, max_session: int = 120,
+                      allowed_days: List[str] = None, session_mode: str = "automatic") -> Dict:
+        """The activity dict add_activity stores (also used for previews)."""
+        deadline_dt = tz.localize(datetime.fromisoformat(deadline_date))
+        today = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        days_left = (deadline_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today).days
+
+        return {
+            "activity":            name,
+            "priority":            priority,
+            "deadline":            days_left,
+            "timing":              total_hours,
+            "min_session_minutes": int(round_to_15_minutes(min_session)),
+            "max_session_minutes": int(round_to_15_minutes(max_session)),
+            "allowed_days":        allowed_days or WEEKDAY_NAMES,
+            "session_mode":        session_mode,
+            "num_sessions":        0,
+        }
+
     @staticmethod
     def delete_activity(index: int) -> Dict:
         """Deletes an activity at a certain index."""
@@ -523,6 +624,7 @@ class NeroTimeLogic:
                 "end_time":   end_time,
                 "day":        day_display,
                 "date":       event_dt.isoformat(),
+                "event_id":   new_event_id(),
             })
 
             NeroTimeLogic._save('events', st.session_state.list_of_compulsory_events)
@@ -555,6 +657,7 @@ class NeroTimeLogic:
                         'end_time':   end_time,
                         'recurrence': recurrence_type,
                         'start_date': start_date,
+                        'event_id':   new_event_id("rec"),
                     })
 
                     st.session_state.school_schedule[day_name].sort(
@@ -576,6 +679,7 @@ class NeroTimeLogic:
                     "day":        day_display,
                     "date":       event_dt.isoformat(),
                     "recurrence": "monthly",
+                    "event_id":   new_event_id(),
                 })
 
                 NeroTimeLogic._save('events', st.session_state.list_of_compulsory_events)
@@ -586,29 +690,56 @@ class NeroTimeLogic:
             return {"success": False, "message": f"Error: {e}"}
 
     @staticmethod
-    def delete_event(index: int) -> Dict:
-        """Deletes a one-time/monthly event by index."""
+    def ensure_event_ids() -> bool:
+        """Give events / schedule entries saved before event ids existed one. True if any changed."""
+        events  = [e for e in st.session_state.list_of_compulsory_events if not e.get('event_id')]
+        entries = [e for day in st.session_state.school_schedule.values() for e in day if not e.get('event_id')]
+        for evt in events:
+            evt['event_id'] = new_event_id()
+        for entry in entries:
+            entry['event_id'] = new_event_id("rec")
+
+        if events:
+            NeroTimeLogic._save('events', st.session_state.list_of_compulsory_events)
+        if entries:
+            NeroTimeLogic._save('school_schedule', st.session_state.school_schedule)
+        return bool(events or entries)
+
+    @staticmethod
+    def _remove_fixed_rows(event_id: str, legacy_days, legacy_match) -> None:
+        """
+        Drop the timetable rows placed for event_id, found through the conflict
+        index so only their own days are touched. Timetables generated before
+        rows had a source_id fall back to legacy_match(row) on legacy_days.
+        """
+        timetable = st.session_state.timetable
+        rows      = conflict_service.get_index().fixed_rows(event_id) if event_id else []
+
+        if rows:
+            for day, row in rows:
+                timetable[day] = [e for e in timetable[day] if e is not row]
+            return
+
+        for day in legacy_days:
+            timetable[day] = [e for e in timetable[day] if e.get('source_id') or not legacy_match(e)]
+
+    @staticmethod
+    def delete_event(event_id: str) -> Dict:
+        """Deletes a one-time/monthly event (and every occurrence of it in the timetable)."""
         try:
-            if not (0 <= index < len(st.session_state.list_of_compulsory_events)):
-                return {"success": False, "message": "Invalid event index"}
-
-            evt        = st.session_state.list_of_compulsory_events[index]
-            name       = evt['event']
-            day        = evt['day']
-            start_time = evt['start_time']
-            end_time   = evt['end_time']
-
-            st.session_state.list_of_compulsory_events.pop(index)
-
-            if day in st.session_state.timetable:
-                st.session_state.timetable[day] = [
-                    e for e in st.session_state.timetable[day]
-                    if not (
-                        e.get('name') == name
-                        and e.get('start') == start_time
-                        and e.get('end')   == end_time
-                    )
-                ]
+            events = st.session_state.list_of_compulsory_events
+            index  = next((i for i, e in enumerate(events) if e.get('event_id') == event_id), None)
+            if index is None:
+                return {"success": False, "message": "Event not found"}
+
+            evt  = events.pop(index)
+            name = evt['event']
+            NeroTimeLogic._remove_fixed_rows(
+                event_id,
+                [evt['day']] if evt['day'] in st.session_state.timetable else [],
+                lambda e: (e.get('name') == name and e.get('start') == evt['start_time']
+                           and e.get('end') == evt['end_time'])
+            )
 
             NeroTimeLogic._save('events',    st.session_state.list_of_compulsory_events)
             NeroTimeLogic._save('timetable', st.session_state.timetable)
@@ -625,27 +756,16 @@ class NeroTimeLogic:
             if day_name not in schedule or not (0 <= index < len(schedule[day_name])):
                 return {"success": False, "message": "Schedule not found"}
 
-            evt        = schedule[day_name][index]
-            subj       = evt['subject']
-            start_time = evt['start_time']
-            end_time   = evt['end_time']
-
-            schedule[day_name].pop(index)
+            evt = schedule[day_name].pop(index)
             if not schedule[day_name]:
                 del schedule[day_name]
 
-            for day_display, events in st.session_state.timetable.items():
-                if not day_display.startswith(day_name):
-                    continue
-                st.session_state.timetable[day_display] = [
-                    e for e in events
-                    if not (
-                        e.get('name')  == subj
-                        and e.get('start') == start_time
-                        and e.get('end')   == end_time
-                        and e.get('type')  == 'SCHOOL'
-                    )
-                ]
+            NeroTimeLogic._remove_fixed_rows(
+                evt.get('event_id'),
+                [d for d in st.session_state.timetable if d.startswith(day_name)],
+                lambda e: (e.get('name') == evt['subject'] and e.get('start') == evt['start_time']
+                           and e.get('end') == evt['end_time'] and e.get('type') == 'SCHOOL')
+            )
 
             NeroTimeLogic._save('school_schedule', schedule)
             NeroTimeLogic._save('timetable',       st.session_state.timetable)
@@ -673,6 +793,157 @@ class NeroTimeLogic:
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
 
+    @staticmethod
+    def start_generation() -> Dict:
+        """Start generating in the background (see generation_job.py). Poll with finish_generation()."""
+        from generation_job import GenerationJob
+
+        job = st.session_state.get('generation_job')
+        if job is not None and job.running:
+            return {"success": False, "message": "Already generating"}
+
+        st.session_state.generation_job = GenerationJob(
+            st.session_state,
+            st.session_state.current_year,
+            st.session_state.current_month
+        ).start()
+        return {"success": True, "message": "Generating..."}
+
+    @staticmethod
+    def clamp_to_loaded_month(first, last):
+        """(first, last) dates cut down to the month being viewed - the only one in the timetable document. None if none of it is."""
+        month_days = get_month_days(st.session_state.current_year, st.session_state.current_month)
+        first = max(first, month_days[0]['date'].date())
+        last  = min(last, month_days[-1]['date'].date())
+        return (first, last) if first <= last else None
+
+    @staticmethod
+    def regenerate_range(first_date: str, last_date: str) -> Dict:
+        """
+        Regenerate only first_date..last_date (ISO dates, inclusive), cut down to
+        the month being viewed. Sessions and events outside it stay exactly where
+        they are. Runs straight away - a few days is quick.
+        Returns {"success", "message", "warnings"} - the warnings also end up in
+        st.session_state.timetable_warnings, like a full generation's.
+        """
+        try:
+            from Timetable_Generation import generate_range_with_sessions
+
+            job = st.session_state.get('generation_job')
+            if job is not None and job.running:
+                return {"success": False, "message": "Already generating"}
+
+            first = datetime.fromisoformat(first_date).date()
+            last  = datetime.fromisoformat(last_date).date()
+            if last < max(first, datetime.now(tz).date()):
+                return {"success": False, "message": "That range is already over"}
+            clamped = NeroTimeLogic.clamp_to_loaded_month(first, last)
+            if clamped is None:
+                return {"success": False, "message": "Those days aren't in the month you're viewing"}
+
+            result = generate_range_with_sessions(*clamped)
+            message = f"Timetable regenerated for {clamped[0].strftime('%a %d/%m')} – {clamped[1].strftime('%a %d/%m')}"
+            if clamped != (first, last):
+                message += " (only the days in the month you're viewing)"
+            return {"success": True, "message": message, "warnings": result['warnings'] or []}
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
+
+    @staticmethod
+    def preview_generation(changes: Dict = None) -> Dict:
+        """
+        Dry run: what generating the current month would do with `changes`
+        applied (see timetable_preview.apply_changes). Writes nothing.
+        The last preview is cached in st.session_state.generation_preview,
+        so calling this on every rerun is cheap while nothing changes.
+
+        Returns {"success", "message", "added", "moved", "removed", "changed_days", "warnings", ...}
+        """
+        try:
+            from timetable_preview import preview
+
+            changes = changes or {}
+            key = repr((
+                changes, st.session_state.get('state_version', 0),
+                st.session_state.list_of_activities, st.session_state.list_of_compulsory_events,
+                st.session_state.school_schedule, st.session_state.current_year,
+                st.session_state.current_month, datetime.now(tz).strftime("%Y-%m-%d %H"),
+            ))
+            cached = st.session_state.get('generation_preview')
+            if cached and cached[0] == key:
+                return cached[1]
+
+            result = preview(st.session_state, st.session_state.current_year,
+                             st.session_state.current_month, changes)
+            result = {"success": True, "message": result['summary'], **result}
+            st.session_state.generation_preview = (key, result)
+            return result
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
+
+    @staticmethod
+    def repair_plan() -> Dict:
+        """
+        Move only the skipped, missed and clashing sessions (see repair_planner.py),
+        leaving the rest of the plan alone.
+        """
+        try:
+            from repair_planner import repair_timetable
+
+            job = st.session_state.get('generation_job')
+            if job is not None and job.running:
+                return {"success": False, "message": "Already generating"}
+
+            result = repair_timetable(st.session_state)
+            if result['fixed_added']:
+                NeroTimeLogic._save('timetable', st.session_state.timetable)
+            if result['moved']:
+                NeroTimeLogic._save('sessions', st.session_state.sessions)
+
+            if not result['moved'] and not result['unplaced'] and not result['fixed_added']:
+                message = "Nothing to repair"
+            else:
+                message = f"Moved {len(result['moved'])} session(s)"
+                if result['unplaced']:
+                    message += f", {len(result['unplaced'])} couldn't be moved"
+            return {"success": True, "message": message, "warnings": result['warnings']}
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
+
+    @staticmethod
+    def cancel_generation():
+        job = st.session_state.get('generation_job')
+        if job is not None:
+            job.cancel()
+
+    @staticmethod
+    def finish_generation():
+        """
+        None while nothing is running / still running. Otherwise clears the job and
+        returns its outcome - a finished timetable is swapped into session state
+        all at once and saved.
+        """
+        from Timetable_Generation import plan_snapshot, save_generated_timetable
+
+        job = st.session_state.get('generation_job')
+        if job is None or job.running:
+            return None
+        del st.session_state['generation_job']
+
+        if job.status == 'cancelled':
+            return {"success": False, "cancelled": True, "message": "Generation cancelled"}
+        if job.status == 'failed':
+            return {"success": False, "message": job.message}
+        if job.inputs_changed(st.session_state):
+            return {"success": False, "message": "Your activities or events changed while generating - please generate again"}
+
+        before = plan_snapshot()
+        for key, value in job.result.items():
+            st.session_state[key] = value
+        conflict_service.invalidate()
+        save_generated_timetable(job.year, job.month, before)
+        return {"success": True, "message": "Timetable generated successfully"}
+
     # === Month Navigation ===
 
     @staticmethod
@@ -702,6 +973,58 @@ class NeroTimeLogic:
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
 
+    # === Group availability ===
+
+    @staticmethod
+    def find_group_slots(usernames: List[str], first_date: str, last_date: str,
+                         duration_minutes: int, k: int = 5) -> Dict:
+        """
+        Times between first_date and last_date (ISO) when you and everyone in
+        `usernames` are free for duration_minutes (see group_availability.py).
+        Only works if you share your own availability; members who don't share
+        are listed in "missing" and left out.
+        Returns {"success", "message", "slots": [{'date', 'day', 'start', 'end', 'free_until'}],
+                 "missing": [username]}
+        """
+        try:
+            from group_availability import find_shared_slots, load_members
+
+            first = datetime.fromisoformat(first_date).date()
+            last  = datetime.fromisoformat(last_date).date()
+            if last < first:
+                return {"success": False, "message": "The end date is before the start date"}
+            if duration_minutes <= 0:
+                return {"success": False, "message": "Duration must be positive"}
+
+            if not st.session_state.get('share_availability'):
+                return {"success": False, "message": "Turn on sharing your availability in Settings first"}
+
+            storage = get_storage()
+            ids, unknown = {}, []
+            for name in dict.fromkeys(n.strip() for n in usernames if n.strip()):
+                user_id = storage.find_user_id(name)
+                if user_id is None:
+                    unknown.append(name)
+                elif user_id != st.session_state.user_id:
+                    ids[user_id] = name
+            if unknown:
+                return {"success": False, "message": f"No such user: {', '.join(unknown)}"}
+            if not ids:
+                return {"success": False, "message": "Add at least one other username"}
+
+            NeroTimeLogic.refresh_availability(force=True)
+            members = load_members(storage, [st.session_state.user_id, *ids])
+            missing = [ids[uid] for uid, member in members.items() if member is None and uid in ids]
+
+            now   = datetime.now(tz)
+            slots = find_shared_slots([m for m in members.values() if m is not None],
+                                      max(first, now.date()), last, duration_minutes, k, now)
+            message = (f"{len(slots)} time(s) everyone is free" if slots
+                       else "No time in that range when everyone is free")
+            return {"success": True, "message": message, "slots": slots, "missing": missing}
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
+
     # === Data management ===
 
     @staticmethod
@@ -0,0 +1,104 @@
+"""
+PASSWORD HASHING
+Hashes run in a small process pool so a burst of logins can't tie up the
+Streamlit server threads. The cost parameters used for each password are
+stored with the user, so they can be raised later and old hashes get
+upgraded the next time that user logs in.
+
+No streamlit in here on purpose - the pool workers import this module.
+"""
+
+import hashlib
+import hmac
+import multiprocessing
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# What new passwords get hashed with. Change this to raise the cost;
+# users on older params are rehashed on their next login.
+CURRENT_HASH_PARAMS = {'algorithm': 'scrypt', 'n': 2 ** 14, 'r': 8, 'p': 1}
+
+# Accounts created before params were stored with the user
+LEGACY_HASH_PARAMS = {'algorithm': 'pbkdf2_sha256', 'iterations': 100000}
+
+MAX_HASH_WORKERS      = 2   # processes doing the actual hashing
+MAX_CONCURRENT_HASHES = 8   # hashes running + queued before we turn people away
+HASH_WAIT_SECONDS     = 5   # how long a login waits for a free spot
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes in flight - try again in a moment."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT_HASHES)
+
+
+def _derive(password: str, salt: str, params: dict) -> str:
+    """The actual (slow) hash. Runs inside a pool worker."""
+    algorithm = params['algorithm']
+    if algorithm == 'pbkdf2_sha256':
+        hashed = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'),
+                                     params['iterations'])
+    elif algorithm == 'scrypt':
+        hashed = hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('utf-8'),
+                                n=params['n'], r=params['r'], p=params['p'],
+                                maxmem=256 * params['n'] * params['r'] * params['p'])
+    else:
+        raise ValueError(f"Unknown hash algorithm '{algorithm}'")
+    return hashed.hex()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking a process with gRPC / sync threads running can deadlock the child
+            _pool = ProcessPoolExecutor(max_workers=MAX_HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _run(password: str, salt: str, params: dict) -> str:
+    """Hash in the pool, waiting at most HASH_WAIT_SECONDS for a free spot."""
+    global _pool
+
+    if not _slots.acquire(timeout=HASH_WAIT_SECONDS):
+        raise PasswordHasherBusy("Too many sign-ins right now, please try again in a moment")
+    try:
+        try:
+            return _get_pool().submit(_derive, password, salt, params).result()
+        except BrokenProcessPool:
+            # A worker died - start a fresh pool next time, hash this one here
+            with _pool_lock:
+                _pool = None
+            return _derive(password, salt, params)
+    finally:
+        _slots.release()
+
+
+def hash_password(password: str, salt: str = None, params: dict = None):
+    """Password Hasher (for storage purposes). Returns (hash, salt, params)."""
+    if salt is None:
+        salt = secrets.token_hex(32)
+    if params is None:
+        params = CURRENT_HASH_PARAMS
+
+    return _run(password, salt, params), salt, dict(params)
+
+
+def verify_password(stored_hash: str, stored_salt: str, password: str, params: dict = None) -> bool:
+    """Verify a password against stored hash (params=None means a legacy account)"""
+    if not stored_hash or not stored_salt:
+        return False
+
+    hashed = _run(password, stored_salt, params or LEGACY_HASH_PARAMS)
+    return hmac.compare_digest(hashed, stored_hash)
+
+
+def needs_rehash(params: dict = None) -> bool:
+    """True if a hash made with `params` should be upgraded to CURRENT_HASH_PARAMS"""
+    return (params or LEGACY_HASH_PARAMS) != CURRENT_HASH_PARAMS
@@ -0,0 +1,138 @@
+"""
+RECURRENCE
+Turns recurring events into dated occurrences, a bit like iCal RRULEs.
+
+A rule is a plain tuple, so it can be a cache key:
+    (freq, weekday, start_date)
+    freq        'once' | 'weekly' | 'bi-weekly' | 'monthly'
+    weekday     0-6 (Monday = 0) for weekly / bi-weekly, None otherwise
+    start_date  a date, or None (a weekly rule with no start date always applies)
+
+    once       just start_date
+    weekly     every `weekday`, from start_date on
+    bi-weekly  every other `weekday`: only in weeks (Mon-Sun) an even number
+               of weeks after start_date's week, from start_date on
+    monthly    start_date's day of the month, every month from start_date on
+               (months without that day, e.g. the 31st, are skipped)
+
+iter_occurrences() is lazy - it jumps straight from one occurrence to the
+next and stops at the end of the range, so nothing is expanded ahead of
+time. occurrences() caches the result per (rule, range); the dashboard asks
+for the same month on every rerun.
+"""
+
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Timetable_Generation import WEEKDAY_NAMES
+
+Rule = Tuple[str, Optional[int], Optional[date]]
+
+
+def _to_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(value).date()
+
+
+# === Rules ===
+
+def school_rule(day_name: str, entry: dict) -> Rule:
+    """Rule for a school_schedule[day_name] entry (weekly or bi-weekly)."""
+    freq = entry.get('recurrence') or 'weekly'
+    if freq == 'bi-weekly' and not entry.get('start_date'):
+        freq = 'weekly'  # no start week to count from
+    return (freq, WEEKDAY_NAMES.index(day_name), _to_date(entry.get('start_date')))
+
+
+def event_rule(event: dict, year: int) -> Optional[Rule]:
+    """
+    Rule for a list_of_compulsory_events entry: 'monthly' or 'once'.
+    Older events have no 'date', only "Weekday DD/MM" - those are taken to
+    be in `year`. None if the date can't be worked out.
+    """
+    try:
+        start = _to_date(event.get('date'))
+        if start is None:
+            day_num, month_num = map(int, event['day'].split()[-1].split('/'))
+            start = date(year, month_num, day_num)
+    except (ValueError, KeyError, IndexError):
+        return None
+    return ('monthly' if event.get('recurrence') == 'monthly' else 'once', None, start)
+
+
+# === Expansion ===
+
+def iter_occurrences(rule: Rule, first: date, last: date) -> Iterator[date]:
+    """Dates of `rule` in [first, last], in order."""
+    freq, weekday, start = rule
+    if start is not None and start > first:
+        first = start
+    if first > last:
+        return
+
+    if freq == 'once':
+        if start is not None and first <= start <= last:
+            yield start
+
+    elif freq in ('weekly', 'bi-weekly'):
+        day = first + timedelta(days=(weekday - first.weekday()) % 7)
+        step = 7
+        if freq == 'bi-weekly':
+            start_week = start - timedelta(days=start.weekday())
+            if ((day - start_week).days // 7) % 2:
+                day += timedelta(days=7)
+            step = 14
+        while day <= last:
+            yield day
+            day += timedelta(days=step)
+
+    elif freq == 'monthly':
+        year, month = first.year, first.month
+        while date(year, month, 1) <= last:
+            try:
+                day = date(year, month, start.day)
+            except ValueError:
+                day = None  # this month is too short
+            if day is not None and first <= day <= last:
+                yield day
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+@lru_cache(maxsize=1024)
+def occurrences(rule: Rule, first: date, last: date) -> Tuple[date, ...]:
+    return tuple(iter_occurrences(rule, first, last))
+
+
+def fixed_events_between(state, first: date, last: date) -> Dict[date, List[tuple]]:
+    """
+    Every school_schedule and compulsory event occurrence in [first, last],
+    as {date: [(name, start, end, type, event_id)]} - type is SCHOOL or COMPULSORY.
+    Within a day: recurring entries first, each list in its stored order.
+    """
+    by_date: Dict[date, List[tuple]] = {}
+    for day_name, entries in state['school_schedule'].items():
+        for entry in entries:
+            for day in occurrences(school_rule(day_name, entry), first, last):
+                by_date.setdefault(day, []).append(
+                    (entry['subject'], entry['start_time'], entry['end_time'], "SCHOOL",
+                     entry.get('event_id')))
+
+    for event in state['list_of_compulsory_events']:
+        rule = event_rule(event, state.get('current_year', first.year))
+        if rule is None:
+            continue
+        for day in occurrences(rule, first, last):
+            by_date.setdefault(day, []).append(
+                (event['event'], event['start_time'], event['end_time'], "COMPULSORY",
+                     event.get('event_id')))
+    return by_date
+
+
+def day_display(day: date) -> str:
+    return f"{WEEKDAY_NAMES[day.weekday()]} {day.strftime('%d/%m')}"
@@ -0,0 +1,207 @@
+"""
+REPAIR PLANNER
+Fixes the plan without regenerating it - only broken sessions move:
+
+    skipped      marked ❌ in the Verification tab
+    missed       on an earlier day and never verified
+    conflicting  upcoming sessions that now overlap a fixed event or another
+                 session, or sit outside work hours
+
+Each goes to the free slot nearest where it was: its own day first
+(closest start time), then the nearest days either side, up to its
+activity's deadline and only on its allowed days. Skipped / missed ones
+start looking from today. Everything else stays exactly where it is.
+
+Completed, user-edited and manual sessions never move - a user-edited or
+manual one that clashes is only reported.
+
+Compulsory events / recurring entries added since the timetable was
+generated are put on it first (its days from today on), so the sessions
+they land on count as conflicting.
+"""
+
+from datetime import date, datetime, timedelta
+
+from Timetable_Generation import (
+    WEEKDAY_NAMES,
+    add_fixed_event_to_timetable,
+    get_work_end_minutes,
+    get_work_start_minutes,
+    minutes_to_time_str,
+    time_str_to_minutes,
+    tz,
+)
+from conflict_service import get_index, invalidate
+from recurrence import day_display, fixed_events_between
+
+
+def _key_date(key: str, year: int):
+    """Date of a "Weekday DD/MM" timetable key: the year around `year` whose weekday matches."""
+    try:
+        name, day_month = key.split()
+        day_num, month_num = map(int, day_month.split('/'))
+    except ValueError:
+        return None
+    for y in (year, year + 1, year - 1):
+        try:
+            day = date(y, month_num, day_num)
+        except ValueError:
+            continue
+        if WEEKDAY_NAMES[day.weekday()] == name:
+            return day
+    return None
+
+
+def place_new_fixed_events(state, today: date) -> int:
+    """Put events added since generation on the timetable's days from today on. Returns rows added."""
+    year = state.get('current_year', today.year)
+    days = {}
+    for key in state['timetable']:
+        day = _key_date(key, year)
+        if day is not None and day >= today:
+            days[day] = key
+    if not days:
+        return 0
+
+    added = 0
+    for day, events in fixed_events_between(state, min(days), max(days)).items():
+        key = days.get(day)
+        if key is None:
+            continue
+        rows = state['timetable'][key]
+        have = ({row.get('source_id') for row in rows}
+                | {(row['name'], row['start'], row['end']) for row in rows})  # rows from before ids
+        for name, start, end, event_type, source_id in events:
+            if not source_id or source_id in have or (name, start, end) in have:
+                continue
+            s, e = time_str_to_minutes(start), time_str_to_minutes(end)
+            # Generation skips fixed events that clash with each other - so does this
+            if any(time_str_to_minutes(r['start']) < e and time_str_to_minutes(r['end']) > s for r in rows):
+                continue
+            add_fixed_event_to_timetable(key, start, end, name, event_type, state, source_id)
+            added += 1
+    return added
+
+
+class _Repair:
+    def __init__(self, state, now: datetime):
+        self.state      = state
+        self.sessions   = state['sessions']
+        self.activities = {a['activity']: a for a in state['list_of_activities']}
+        self.now        = now
+        self.today      = now.date()
+        self.now_min    = now.hour * 60 + now.minute
+        self.work_start = get_work_start_minutes(state)
+        self.work_end   = get_work_end_minutes(state)
+        self.index      = get_index(state)
+
+    def _span(self, s):
+        start = time_str_to_minutes(s['scheduled_time'])
+        return datetime.fromisoformat(s['scheduled_date']).date(), start, start + s['duration_minutes']
+
+    def _clashes(self, sid) -> bool:
+        s = self.sessions[sid]
+        _, start, end = self._span(s)
+        return (start < self.work_start or end > self.work_end
+                or self.index.overlapping(s['scheduled_day'], start, end, exclude_id=sid))
+
+    def find_broken(self, include_missed: bool = True):
+        """([(session_id, reason)], [warning]) - reason is 'skipped', 'missed' or 'conflicting'."""
+        broken, warnings = [], []
+        for sid, s in self.sessions.items():
+            if s.get('is_completed') or not s.get('scheduled_day') or not s.get('scheduled_time'):
+                continue
+            day, start, _ = self._span(s)
+            if s.get('is_skipped'):
+                broken.append((sid, 'skipped'))
+            elif day < self.today:
+                if include_missed:
+                    broken.append((sid, 'missed'))
+            elif day == self.today and start < self.now_min:
+                continue  # already under way
+            elif self._clashes(sid):
+                if s.get('is_user_edited') or s.get('is_manual'):
+                    warnings.append(
+                        f"⚠️ '{s['activity_name']}' Session {s['session_num']} on {s['scheduled_day']} "
+                        f"clashes with something, but you placed it there - left alone."
+                    )
+                else:
+                    broken.append((sid, 'conflicting'))
+
+        def urgency(item):
+            s = self.sessions[item[0]]
+            a = self.activities.get(s['activity_name'], {})
+            return (a.get('deadline', 0), -a.get('priority', 0), s['scheduled_date'], s['scheduled_time'])
+        broken.sort(key=urgency)
+        return broken, warnings
+
+    def _nearest_slot(self, origin: date, last: date, allowed, duration: int, near: int):
+        """(date, start) of the free slot nearest origin / near, or None."""
+        for offset in range(max((last - self.today).days, (origin - self.today).days) + 1):
+            best = None
+            for day in (origin + timedelta(days=offset), origin - timedelta(days=offset)):
+                if not self.today <= day <= last or WEEKDAY_NAMES[day.weekday()] not in allowed:
+                    continue
+                earliest = self.work_start
+                if day == self.today:
+                    earliest = max(earliest, (self.now_min + 29) // 15 * 15)
+                for start in self.index.slot_candidates(day_display(day), duration, earliest, self.work_end):
+                    if best is None or abs(start - near) < abs(best[1] - near):
+                        best = (day, start)
+            if best is not None:
+                return best
+        return None
+
+    def repair(self, broken):
+        moved, unplaced = [], []
+        for sid, reason in broken:
+            s = self.sessions[sid]
+            if reason == 'conflicting' and not self._clashes(sid):
+                continue  # an earlier move already cleared it
+
+            activity = self.activities.get(s['activity_name'])
+            if activity is None or activity['deadline'] < 0:
+                unplaced.append(sid)
+                continue
+
+            day, start, end = self._span(s)
+            self.index.remove_session(s)
+            slot = self._nearest_slot(
+                max(day, self.today), self.today + timedelta(days=activity['deadline']),
+                activity.get('allowed_days', WEEKDAY_NAMES), s['duration_minutes'], start
+            )
+            if slot is None:
+                self.index.add_session(s)
+                unplaced.append(sid)
+                continue
+
+            new_day, new_start = slot
+            s['scheduled_day']  = day_display(new_day)
+            s['scheduled_date'] = datetime.combine(new_day, datetime.min.time()).isoformat()
+            s['scheduled_time'] = minutes_to_time_str(new_start)
+            s['is_skipped']     = False
+            s['is_finished']    = False
+            self.index.add_session(s)
+            moved.append((sid, reason))
+        return moved, unplaced
+
+
+def repair_timetable(state, now: datetime = None, include_missed: bool = True) -> dict:
+    """
+    Re-place only the broken sessions in `state` (see module docstring).
+    Returns {'fixed_added': int, 'moved': [(session_id, reason)],
+             'unplaced': [session_id], 'warnings': [str]}
+    """
+    now = now or datetime.now(tz)
+    fixed_added = place_new_fixed_events(state, now.date())
+
+    planner = _Repair(state, now)
+    broken, warnings = planner.find_broken(include_missed)
+    moved, unplaced = planner.repair(broken)
+
+    for sid in unplaced:
+        s = state['sessions'][sid]
+        warnings.append(f"❌ '{s['activity_name']}' Session {s['session_num']}: "
+                        f"no free slot before the deadline - left where it was.")
+    invalidate(state)
+    return {'fixed_added': fixed_added, 'moved': moved, 'unplaced': unplaced, 'warnings': warnings}
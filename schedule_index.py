@@ -0,0 +1,54 @@
+"""
+SCHEDULE INDEX
+Plain helpers over (start, end) intervals in minutes. The per-day index
+itself is conflict_service.ConflictIndex.
+
+slot_starts is the one definition of where a block may go (15-minute grid,
+plus the generator's break after it); ConflictIndex.slot_candidates /
+find_slot and NeroTimeLogic.suggest_slots all go through it.
+
+find_clashes is the sweep-line overlap check the Events tab uses to list
+every clashing pair of schedule entries / one-time events in one pass
+per day.
+"""
+
+import heapq
+from typing import List, Tuple
+
+from Timetable_Generation import BREAK_MINUTES
+
+
+def slot_starts(gaps, duration: int, work_end: int) -> List[int]:
+    """
+    Every start minute for a `duration`-long block in the free (start, end)
+    gaps (clipped to work_end), by the generator's rules: 15-minute grid,
+    and a free BREAK_MINUTES gap after it (unless that runs past work_end).
+    """
+    candidates = []
+    for gap_start, gap_end in gaps:
+        t = ((gap_start + 14) // 15) * 15
+        while t + duration <= gap_end:
+            break_end = t + duration + BREAK_MINUTES
+            if break_end <= gap_end or break_end > work_end:
+                candidates.append(t)
+            t += 15
+    return candidates
+
+
+# === Sweep-line overlap checks ===
+
+def find_clashes(intervals) -> List[Tuple[object, object]]:
+    """
+    Every overlapping pair among (start, end, item) intervals, as (item, item)
+    with the earlier-starting one first. Sort by start, then sweep keeping
+    a heap of the intervals still open: O(n log n + number of clashes).
+    """
+    pairs  = []
+    active = []  # (end, order, item) of intervals that haven't ended yet
+    for order, (start, end, item) in enumerate(sorted(intervals, key=lambda iv: (iv[0], iv[1]))):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            pairs.append((other, item))
+        heapq.heappush(active, (end, order, item))
+    return pairs
@@ -0,0 +1,161 @@
+"""
+SIGNED SESSION TOKENS (for "stay logged in")
+
+A token carries the user ID and its expiry, signed with HMAC-SHA256, so it
+can be checked without asking the database. Logging out puts the token's ID on a
+small revocation list. Tokens that already passed the check are kept in an
+LRU cache so a session restore normally does no work at all.
+
+Issued tokens are also recorded in users/{uid}/session_tokens (with their
+expiry) so they can be revoked, and cleaned up by `maintenance.py cleanup-tokens`.
+
+Token layout: base64("user_id:expires:token_id") + "." + base64(signature)
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from storage import get_storage
+from cookie_manager import delete_cookie
+
+SESSION_TTL_DAYS = 30
+
+VALIDATION_CACHE_SIZE      = 1024  # validated tokens kept in memory
+REVOCATION_REFRESH_SECONDS = 300   # how often the revocation list is re-read from storage
+
+_cache = OrderedDict()  # token -> (user_id, expires_ts, token_id)
+_cache_lock = threading.Lock()
+
+_revoked = None  # token_id -> expires (datetime), None until first loaded
+_revoked_loaded_at = 0.0
+_revoked_lock = threading.Lock()
+
+_secret = None
+
+
+def _get_secret() -> bytes:
+    """Signing key from st.secrets["session"]["secret"] or $NERO_SESSION_SECRET."""
+    global _secret
+    if _secret is None:
+        try:
+            key = st.secrets["session"]["secret"]
+        except Exception:
+            key = os.environ.get("NERO_SESSION_SECRET")
+        # No key configured: tokens only survive until the server restarts
+        _secret = (key or secrets.token_hex(32)).encode('utf-8')
+    return _secret
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_get_secret(), payload, hashlib.sha256).digest()
+
+
+def _parse(token: str):
+    """(user_id, expires_ts, token_id) if the signature checks out, else None"""
+    try:
+        payload_b64, sig_b64 = token.split('.')
+        payload = _b64decode(payload_b64)
+        if not hmac.compare_digest(_sign(payload), _b64decode(sig_b64)):
+            return None
+        user_id, expires_ts, token_id = payload.decode('utf-8').split(':')
+        return user_id, int(expires_ts), token_id
+    except Exception:
+        return None
+
+
+def _revoked_ids() -> dict:
+    """Revocation list, re-read from storage every REVOCATION_REFRESH_SECONDS"""
+    global _revoked, _revoked_loaded_at
+
+    if _revoked is not None and time.time() - _revoked_loaded_at < REVOCATION_REFRESH_SECONDS:
+        return _revoked
+
+    with _revoked_lock:
+        if _revoked is None or time.time() - _revoked_loaded_at >= REVOCATION_REFRESH_SECONDS:
+            now    = datetime.now(timezone.utc)
+            loaded = get_storage().load_revoked_tokens(now)
+            if _revoked:
+                # keep local revocations that might not have reached Firebase yet
+                loaded.update({tid: exp for tid, exp in _revoked.items() if exp > now})
+            _revoked = loaded
+            _revoked_loaded_at = time.time()
+    return _revoked
+
+
+def create_token(user_id: str, ttl_days: int = SESSION_TTL_DAYS) -> str:
+    """Make a new signed token for user_id."""
+    expires_ts = int(time.time()) + ttl_days * 24 * 60 * 60
+    token_id   = secrets.token_urlsafe(12)
+    payload    = f"{user_id}:{expires_ts}:{token_id}".encode('utf-8')
+
+    get_storage().save_session_token(user_id, token_id, datetime.fromtimestamp(expires_ts, timezone.utc))
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def validate_token(token: str):
+    """Return the user ID the token belongs to, or None if it's invalid, expired or revoked."""
+    if not token:
+        return None
+
+    with _cache_lock:
+        parsed = _cache.get(token)
+        if parsed is not None:
+            _cache.move_to_end(token)
+
+    if parsed is None:
+        parsed = _parse(token)
+        if parsed is None:
+            return None
+        with _cache_lock:
+            _cache[token] = parsed
+            if len(_cache) > VALIDATION_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    user_id, expires_ts, token_id = parsed
+    if time.time() >= expires_ts or token_id in _revoked_ids():
+        return None
+    return user_id
+
+
+def revoke_token(token: str):
+    """Log a token out everywhere. Safe to call with junk / empty tokens."""
+    parsed = _parse(token) if token else None
+    if parsed is None:
+        return
+
+    user_id, expires_ts, token_id = parsed
+    expires = datetime.fromtimestamp(expires_ts, timezone.utc)
+
+    _revoked_ids()[token_id] = expires
+    with _cache_lock:
+        _cache.pop(token, None)
+    get_storage().revoke_session_token(user_id, token_id, expires)
+
+
+def logout():
+    """Revoke this browser's token, clear the login cookies and wipe session state."""
+    revoke_token(st.session_state.get("session_token"))
+    delete_cookie("nero_user_id")
+    delete_cookie("nero_token")
+
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+
+    st.rerun()
@@ -0,0 +1,418 @@
+"""
+STORAGE BACKENDS
+Everything the app keeps (per-user state, timetable history, accounts and
+session tokens) goes through get_storage(), so it can run without Firebase.
+
+    firestore  (default) the real thing - Firebase_Function.py
+    memory     plain dicts, gone when the process exits (benchmarks, CI)
+    file       the memory backend saved to a JSON file after every write
+
+Pick one with the NERO_STORAGE_BACKEND env var or st.secrets["storage"]["backend"].
+The file backend writes to NERO_STORAGE_PATH (default .nero_data/store.json).
+"""
+
+import copy
+import json
+import os
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from password_hasher import hash_password, verify_password, needs_rehash, PasswordHasherBusy
+from storage_codecs import encode_value, decode_value
+
+
+class StorageBackend(ABC):
+    """Interface every backend implements. Results match Firebase_Function's.
+    A backend missing one of the abstract methods can't be constructed."""
+
+    # === lifecycle ===
+    def warm_up(self):
+        """Get connections ready before the first request (optional)."""
+
+    def pop_conflicts(self, user_id):
+        """data_types reloaded because another device changed them first (optional)."""
+        return []
+
+    # === per-user state ===
+    @abstractmethod
+    def load(self, user_id, data_type):
+        ...
+
+    @abstractmethod
+    def save(self, user_id, data_type, data):
+        ...
+
+    def save_many(self, user_id, values):
+        """Save several {data_type: data} at once (backends that can, do it as one write)."""
+        for data_type, data in values.items():
+            self.save(user_id, data_type, data)
+        return True
+
+    # === timetable history ===
+    @abstractmethod
+    def save_snapshot(self, user_id, timetable, activities, events):
+        ...
+
+    @abstractmethod
+    def list_history(self, user_id, page_size=10, start_after=None):
+        ...
+
+    @abstractmethod
+    def get_snapshot(self, user_id, seq):
+        ...
+
+    # === accounts ===
+    @abstractmethod
+    def create_user(self, username, password, email=None):
+        ...
+
+    @abstractmethod
+    def authenticate_user(self, username, password):
+        ...
+
+    @abstractmethod
+    def check_username_exists(self, username):
+        ...
+
+    @abstractmethod
+    def find_user_id(self, username):
+        """user_id for a username, or None."""
+
+    @abstractmethod
+    def update_user_email(self, user_id, new_email):
+        ...
+
+    @abstractmethod
+    def change_password(self, user_id, old_password, new_password):
+        ...
+
+    # === session tokens ===
+    @abstractmethod
+    def save_session_token(self, user_id, token_id, expires):
+        ...
+
+    @abstractmethod
+    def revoke_session_token(self, user_id, token_id, expires):
+        ...
+
+    @abstractmethod
+    def load_revoked_tokens(self, now):
+        ...
+
+
+# ==================== FIRESTORE ====================
+
+class FirestoreBackend(StorageBackend):
+    """Thin wrapper over Firebase_Function (imported lazily so the others work without firebase_admin)."""
+
+    def __init__(self):
+        import Firebase_Function
+        import local_cache
+        self._fb = Firebase_Function
+        self._cache = local_cache
+
+    def warm_up(self):
+        self._fb.warm_up_firebase()
+
+    def pop_conflicts(self, user_id):
+        return self._cache.pop_conflicts(user_id)
+
+    def load(self, user_id, data_type):
+        return self._fb.load_from_firebase(user_id, data_type)
+
+    def save(self, user_id, data_type, data):
+        return self._fb.save_to_firebase(user_id, data_type, data)
+
+    def save_many(self, user_id, values):
+        return self._fb.save_many_to_firebase(user_id, values)
+
+    def save_snapshot(self, user_id, timetable, activities, events):
+        return self._fb.save_timetable_snapshot(user_id, timetable, activities, events)
+
+    def list_history(self, user_id, page_size=10, start_after=None):
+        return self._fb.list_timetable_history(user_id, page_size, start_after)
+
+    def get_snapshot(self, user_id, seq):
+        return self._fb.get_timetable_snapshot(user_id, seq)
+
+    def create_user(self, username, password, email=None):
+        return self._fb.create_user(username, password, email)
+
+    def authenticate_user(self, username, password):
+        return self._fb.authenticate_user(username, password)
+
+    def check_username_exists(self, username):
+        return self._fb.check_username_exists(username)
+
+    def find_user_id(self, username):
+        return self._fb.find_user_id(username)
+
+    def update_user_email(self, user_id, new_email):
+        return self._fb.update_user_email(user_id, new_email)
+
+    def change_password(self, user_id, old_password, new_password):
+        return self._fb.change_password(user_id, old_password, new_password)
+
+    def save_session_token(self, user_id, token_id, expires):
+        return self._fb.save_session_token(user_id, token_id, expires)
+
+    def revoke_session_token(self, user_id, token_id, expires):
+        return self._fb.revoke_session_token(user_id, token_id, expires)
+
+    def load_revoked_tokens(self, now):
+        return self._fb.load_revoked_tokens(now)
+
+
+# ==================== IN-MEMORY ====================
+
+class MemoryBackend(StorageBackend):
+    """
+    Everything in one dict:
+        users     {user_id: user doc}
+        usernames {username: user_id}
+        state     {user_id: {data_type: data}}    (encoded with storage_codecs)
+        history   {user_id: [snapshot, ...]}   (full copies, oldest first)
+        tokens    {token_id: {'user_id', 'expires' (iso), 'revoked'}}
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {'users': {}, 'usernames': {}, 'state': {}, 'history': {}, 'tokens': {}}
+
+    def _changed(self):
+        """Called after every write (the file backend saves here)."""
+
+    # === per-user state ===
+    def load(self, user_id, data_type):
+        with self._lock:
+            stored = copy.deepcopy(self._data['state'].get(user_id, {}).get(data_type))
+        return decode_value(data_type, stored)
+
+    def save(self, user_id, data_type, data):
+        stored = copy.deepcopy(encode_value(data_type, data))
+        with self._lock:
+            self._data['state'].setdefault(user_id, {})[data_type] = stored
+            self._changed()
+        return True
+
+    def save_many(self, user_id, values):
+        stored = {data_type: copy.deepcopy(encode_value(data_type, data)) for data_type, data in values.items()}
+        with self._lock:
+            self._data['state'].setdefault(user_id, {}).update(stored)
+            self._changed()  # once for the whole batch
+        return True
+
+    # === timetable history ===
+    def save_snapshot(self, user_id, timetable, activities, events):
+        with self._lock:
+            history = self._data['history'].setdefault(user_id, [])
+            state = copy.deepcopy({'timetable': timetable, 'activities': activities, 'events': events})
+            if history and history[-1]['state'] == state:
+                return True
+            num_fixed = sum(len(day_events) for day_events in timetable.values())
+            history.append({
+                'seq': history[-1]['seq'] + 1 if history else 0,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'num_activities': len(activities),
+                'num_events': len(events),
+                'num_fixed_events': num_fixed,
+                'summary': f"{len(activities)} activities, {len(events)} events, {num_fixed} fixed blocks",
+                'state': state,
+            })
+            self._changed()
+        return True
+
+    def list_history(self, user_id, page_size=10, start_after=None):
+        with self._lock:
+            newest_first = [
+                {k: v for k, v in snap.items() if k != 'state'}
+                for snap in reversed(self._data['history'].get(user_id, []))
+                if start_after is None or snap['seq'] < start_after
+            ]
+        for item in newest_first:
+            item['id'] = f"{item['seq']:08d}"
+            item['created_at'] = datetime.fromisoformat(item['created_at'])
+        items = newest_first[:page_size]
+        next_cursor = items[-1]['seq'] if len(newest_first) > page_size else None
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def get_snapshot(self, user_id, seq):
+        with self._lock:
+            for snap in self._data['history'].get(user_id, []):
+                if snap['seq'] == seq:
+                    return copy.deepcopy(snap['state'])
+        return None
+
+    # === accounts ===
+    def create_user(self, username, password, email=None):
+        try:
+            password_hash, salt, hash_params = hash_password(password)
+        except PasswordHasherBusy as e:
+            return {"success": False, "message": str(e)}
+
+        with self._lock:
+            if username in self._data['usernames']:
+                return {"success": False, "message": "Username already exists"}
+            user_id = secrets.token_hex(10)
+            self._data['usernames'][username] = user_id
+            self._data['users'][user_id] = {
+                'username': username,
+                'email': email,
+                'password_hash': password_hash,
+                'salt': salt,
+                'hash_params': hash_params,
+                'tutorial_completed': False,
+            }
+            self._changed()
+        return {"success": True, "message": "Account created successfully!", "user_id": user_id}
+
+    def authenticate_user(self, username, password):
+        with self._lock:
+            user_id = self._data['usernames'].get(username)
+            user = dict(self._data['users'].get(user_id) or {})
+        if not user:
+            return {"success": False, "message": "Invalid username or password"}
+
+        try:
+            if not verify_password(user['password_hash'], user['salt'], password, user.get('hash_params')):
+                return {"success": False, "message": "Invalid username or password"}
+            if needs_rehash(user.get('hash_params')):
+                self._set_password(user_id, password)
+        except PasswordHasherBusy as e:
+            return {"success": False, "message": str(e)}
+
+        return {
+            "success": True,
+            "message": "Login successful!",
+            "user_id": user_id,
+            "username": user['username'],
+            "email": user.get('email'),
+            "tutorial_completed": user.get("tutorial_completed", False)
+        }
+
+    def check_username_exists(self, username):
+        with self._lock:
+            return username in self._data['usernames']
+
+    def find_user_id(self, username):
+        with self._lock:
+            return self._data['usernames'].get(username)
+
+    def update_user_email(self, user_id, new_email):
+        with self._lock:
+            if user_id not in self._data['users']:
+                return {"success": False, "message": "User not found"}
+            self._data['users'][user_id]['email'] = new_email
+            self._changed()
+        return {"success": True, "message": "Email updated successfully!"}
+
+    def change_password(self, user_id, old_password, new_password):
+        with self._lock:
+            user = dict(self._data['users'].get(user_id) or {})
+        if not user:
+            return {"success": False, "message": "User not found"}
+
+        try:
+            if not verify_password(user['password_hash'], user['salt'], old_password, user.get('hash_params')):
+                return {"success": False, "message": "Incorrect current password"}
+            self._set_password(user_id, new_password)
+        except PasswordHasherBusy as e:
+            return {"success": False, "message": str(e)}
+        return {"success": True, "message": "Password changed successfully!"}
+
+    def _set_password(self, user_id, password):
+        new_hash, new_salt, new_params = hash_password(password)
+        with self._lock:
+            self._data['users'][user_id].update({
+                'password_hash': new_hash, 'salt': new_salt, 'hash_params': new_params
+            })
+            self._changed()
+
+    # === session tokens ===
+    def save_session_token(self, user_id, token_id, expires):
+        with self._lock:
+            self._data['tokens'][token_id] = {
+                'user_id': user_id, 'expires': expires.isoformat(), 'revoked': False
+            }
+            self._changed()
+        return True
+
+    def revoke_session_token(self, user_id, token_id, expires):
+        with self._lock:
+            self._data['tokens'][token_id] = {
+                'user_id': user_id, 'expires': expires.isoformat(), 'revoked': True
+            }
+            self._changed()
+        return True
+
+    def load_revoked_tokens(self, now):
+        with self._lock:
+            tokens = list(self._data['tokens'].items())
+        revoked = {}
+        for token_id, token in tokens:
+            expires = datetime.fromisoformat(token['expires'])
+            if token['revoked'] and expires > now:
+                revoked[token_id] = expires
+        return revoked
+
+
+# ==================== JSON FILE ====================
+
+class FileBackend(MemoryBackend):
+    """MemoryBackend that survives restarts by rewriting one JSON file after each change."""
+
+    def __init__(self, path):
+        super().__init__()
+        self._path = path
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._data.update(json.load(f))
+
+    def _changed(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self._path)  # never leaves a half-written file behind
+
+
+# ==================== SELECTION ====================
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def _configured_backend() -> str:
+    backend = os.environ.get("NERO_STORAGE_BACKEND")
+    if not backend:
+        try:
+            backend = st.secrets["storage"]["backend"]
+        except Exception:
+            backend = "firestore"
+    return backend.lower()
+
+
+def get_storage() -> StorageBackend:
+    """The storage backend for this process (picked once, on first use)."""
+    global _storage
+
+    if _storage is not None:
+        return _storage
+
+    with _storage_lock:
+        if _storage is None:
+            backend = _configured_backend()
+            if backend == "memory":
+                _storage = MemoryBackend()
+            elif backend == "file":
+                _storage = FileBackend(os.environ.get("NERO_STORAGE_PATH",
+                                                      os.path.join(".nero_data", "store.json")))
+            elif backend == "firestore":
+                _storage = FirestoreBackend()
+            else:
+                raise ValueError(f"Unknown storage backend '{backend}' (firestore | memory | file)")
+    return _storage
@@ -0,0 +1,218 @@
+"""
+STORAGE CODECS
+How values look when they're written out by a storage backend. The app
+never sees any of this - encode on the way out, decode on the way in, and
+anything written before a codec existed still decodes as itself.
+
+SESSIONS (columnar)
+The sessions dict repeats the same dozen keys for every session, and the
+session ID / day label can usually be worked out from other fields. The
+compact form stores one array per field instead:
+
+    {
+      "_format": "sessions-columnar-v1",
+      "names":  ["Math Revision", ...],   activity names, each stored once
+      "act":    [0, 0, 1, ...],           index into names
+      "num":    [1, 2, 1, ...],           session_num
+      "date":   ["2026-02-17", ...],      scheduled_date (None if unscheduled)
+      "time":   [840, ...],               scheduled_time in minutes (None if unscheduled)
+      "dur":    [60, ...],                duration_minutes
+      "status": [5, ...],                 bit flags, see STATUS_BITS
+      "id":     [None, ...],              only set when it isn't the usual "{name}_session_{n}"
+      "day":    [None, ...],              only set when it doesn't match scheduled_date
+      "dow":    [None, ...],              day_of_week (manual sessions)
+      "extra":  {"3": {...}}              any other keys, by position
+    }
+
+COMPRESSION
+Big values (over COMPRESS_THRESHOLD_BYTES of JSON) are stored as a
+compressed blob next to a small header instead of as a nested map:
+
+    {"<field>": value}                                          small
+    {"<field>_z": {"codec": "zlib", "v": 1, "blob": b"..."}}    big
+
+zstd is used if the optional `zstandard` package is installed, zlib otherwise.
+"""
+
+import json
+import os
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+SESSIONS_FORMAT = "sessions-columnar-v1"
+
+# Turn off with NERO_COMPACT_SESSIONS=0 (old docs still decode either way)
+COMPACT_SESSIONS = os.environ.get("NERO_COMPACT_SESSIONS", "1") != "0"
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Bit positions in the "status" byte
+STATUS_BITS = ['is_completed', 'is_skipped', 'is_finished', 'is_user_edited', 'is_manual']
+_DATE_HAS_TIME = 1 << len(STATUS_BITS)  # scheduled_date was "YYYY-MM-DDT00:00:00", not "YYYY-MM-DD"
+
+_KNOWN_KEYS = set(STATUS_BITS) | {
+    'session_id', 'session_num', 'activity_name', 'scheduled_day', 'scheduled_date',
+    'scheduled_time', 'duration_minutes', 'duration_hours', 'day_of_week',
+}
+
+
+def _default_session_id(activity_name: str, session_num: int, is_manual: bool) -> str:
+    return f"{activity_name.replace(' ', '_')}_{'manual' if is_manual else 'session'}_{session_num}"
+
+
+def _day_display(date_str: str) -> str:
+    date_obj = datetime.fromisoformat(date_str)
+    return f"{WEEKDAY_NAMES[date_obj.weekday()]} {date_obj.strftime('%d/%m')}"
+
+
+def encode_sessions(sessions: dict) -> dict:
+    """sessions dict -> columnar form"""
+    encoded = {
+        '_format': SESSIONS_FORMAT,
+        'names': [], 'act': [], 'num': [], 'date': [], 'time': [], 'dur': [],
+        'status': [], 'id': [], 'day': [], 'dow': [], 'extra': {},
+    }
+    name_index = {}
+
+    for i, (session_id, s) in enumerate(sessions.items()):
+        name = s['activity_name']
+        if name not in name_index:
+            name_index[name] = len(encoded['names'])
+            encoded['names'].append(name)
+
+        status = 0
+        for bit, key in enumerate(STATUS_BITS):
+            if s.get(key, False):
+                status |= 1 << bit
+
+        date_str = s.get('scheduled_date')
+        if date_str and date_str.endswith('T00:00:00'):
+            date_str = date_str[:-len('T00:00:00')]
+            status |= _DATE_HAS_TIME
+
+        time_str = s.get('scheduled_time')
+        day      = s.get('scheduled_day')
+        default_id = _default_session_id(name, s['session_num'], s.get('is_manual', False))
+
+        encoded['act'].append(name_index[name])
+        encoded['num'].append(s['session_num'])
+        encoded['date'].append(date_str)
+        encoded['time'].append(
+            int(time_str[:2]) * 60 + int(time_str[3:5]) if time_str else None
+        )
+        encoded['dur'].append(s['duration_minutes'])
+        encoded['status'].append(status)
+        encoded['id'].append(None if session_id == default_id else session_id)
+        encoded['day'].append(None if date_str and day == _day_display(date_str) else day)
+        encoded['dow'].append(s.get('day_of_week'))
+
+        extra = {k: v for k, v in s.items() if k not in _KNOWN_KEYS}
+        if s.get('session_id', session_id) != session_id:
+            extra['session_id'] = s['session_id']
+        if s.get('duration_hours') != round(s['duration_minutes'] / 60, 2):
+            extra['duration_hours'] = s.get('duration_hours')
+        if extra:
+            encoded['extra'][str(i)] = extra
+
+    return encoded
+
+
+def decode_sessions(encoded: dict) -> dict:
+    """columnar form -> sessions dict"""
+    sessions = {}
+    names = encoded['names']
+
+    for i, act in enumerate(encoded['act']):
+        name   = names[act]
+        num    = encoded['num'][i]
+        status = encoded['status'][i]
+        minutes  = encoded['time'][i]
+        date_str = encoded['date'][i]
+        if date_str and status & _DATE_HAS_TIME:
+            date_str += 'T00:00:00'
+
+        session = {
+            'session_id':       None,
+            'session_num':      num,
+            'activity_name':    name,
+            'scheduled_day':    encoded['day'][i] if encoded['day'][i] is not None
+                                else (_day_display(date_str) if date_str else None),
+            'scheduled_date':   date_str,
+            'scheduled_time':   f"{minutes // 60:02d}:{minutes % 60:02d}" if minutes is not None else None,
+            'duration_minutes': encoded['dur'][i],
+            'duration_hours':   round(encoded['dur'][i] / 60, 2),
+        }
+        for bit, key in enumerate(STATUS_BITS):
+            session[key] = bool(status & (1 << bit))
+        if encoded['dow'][i] is not None or session['is_manual']:
+            session['day_of_week'] = encoded['dow'][i]
+        session_id = encoded['id'][i] or _default_session_id(name, num, session['is_manual'])
+        session['session_id'] = session_id
+        session.update(encoded['extra'].get(str(i), {}))
+        sessions[session_id] = session
+
+    return sessions
+
+
+def encode_value(data_type: str, data):
+    """What actually gets stored for a (data_type, data) pair."""
+    if data_type == 'sessions' and COMPACT_SESSIONS and isinstance(data, dict):
+        return encode_sessions(data)
+    return data
+
+
+def decode_value(data_type: str, stored):
+    """Undo encode_value. Values stored before encoding existed come back unchanged."""
+    if isinstance(stored, dict) and stored.get('_format') == SESSIONS_FORMAT:
+        return decode_sessions(stored)
+    return stored
+
+
+# === Compression ===
+
+COMPRESS_THRESHOLD_BYTES = 16 * 1024
+CODEC_VERSION = 1
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+
+
+def _compress(codec: str, raw: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This value was stored with zstd - pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    raise ValueError(f"Unknown codec '{codec}'")
+
+
+def pack(field: str, value, threshold: int = COMPRESS_THRESHOLD_BYTES) -> dict:
+    """Doc fields for storing `value` under `field` - compressed if it's big."""
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    if len(raw) < threshold:
+        return {field: value}
+    return {f"{field}_z": {'codec': DEFAULT_CODEC, 'v': CODEC_VERSION, 'blob': _compress(DEFAULT_CODEC, raw)}}
+
+
+def unpack(doc: dict, field: str):
+    """Read back a field written by pack() (or a plain field from before compression)."""
+    packed = doc.get(f"{field}_z")
+    if packed is None:
+        return doc.get(field)
+    if packed.get('v', 1) > CODEC_VERSION:
+        raise ValueError(f"'{field}' was stored by a newer version (codec v{packed['v']})")
+    return json.loads(_decompress(packed['codec'], packed['blob']).decode('utf-8'))
+
+
+def has_field(doc: dict, field: str) -> bool:
+    return field in doc or f"{field}_z" in doc
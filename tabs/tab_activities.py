@@ -8,7 +8,8 @@ Activities are read from NeroTimeLogic.get_activities_data(), which returns a di
 import streamlit as st
 from datetime import datetime, timedelta
 from nero_logic import NeroTimeLogic
-from Timetable_Generation import WEEKDAY_NAMES, minutes_to_time_str, time_str_to_minutes
+from Timetable_Generation import WEEKDAY_NAMES
+import conflict_service
 import pytz
 tz = pytz.timezone("Asia/Singapore")
 
@@ -123,6 +124,13 @@ def _add_activity_form():
                     max_s = min_s
 
             days = st.multiselect("Days to schedule in:", WEEKDAY_NAMES, WEEKDAY_NAMES, key="activity_days")
+
+            if name and st.toggle("👀 Preview the effect on this month's timetable", key="activity_preview"):
+                _render_generation_preview(NeroTimeLogic.preview_generation({
+                    'add_activities': [NeroTimeLogic.build_activity(
+                        name, 3, deadline.isoformat(), hours, min_s, max_s, days
+                    )]
+                }))
         else:
             min_s, max_s, days = 30, 120, None
 
@@ -140,6 +148,28 @@ def _add_activity_form():
                     st.error(result["message"])
 
 
+def _render_generation_preview(preview, limit=8):
+    """What a regeneration would change (NeroTimeLogic.preview_generation) - nothing has been saved."""
+    if not preview["success"]:
+        st.error(preview["message"])
+        return
+
+    st.caption(f"If you add this and regenerate — {preview['message']} (nothing is saved yet)")
+    for s in preview['added'][:limit]:
+        st.markdown(f"➕ {s['activity_name']} · {s['day']} {s['time']} ({s['duration']} min)")
+    for m in preview['moved'][:limit]:
+        st.markdown(f"↔️ {m['activity_name']} · {m['from']['day']} {m['from']['time']} → {m['to']['day']} {m['to']['time']}")
+    for s in preview['removed'][:limit]:
+        st.markdown(f"➖ {s['activity_name']} · {s['day']} {s['time']}")
+
+    hidden = sum(max(0, len(preview[k]) - limit) for k in ('added', 'moved', 'removed'))
+    if hidden:
+        st.caption(f"...and {hidden} more")
+    for warning in preview['warnings']:
+        if not warning.startswith('✓'):
+            st.warning(warning)
+
+
 def _manual_session_form(act, idx):
     """Manual Session form for manual-mode activities."""
     existing_sessions     = [s for s in st.session_state.sessions.values() if s['activity_name'] == act['activity']]
@@ -232,66 +262,6 @@ def _sessions_list(act):
         st.info("No sessions yet — generate a timetable to create sessions")
 
 
-def _get_conflicts_for_proposed_slot(day_display: str, start_time_str: str,
-                                     duration_minutes: int, exclude_session_id: str) -> list:
-    """
-    Return conflict strings for the proposed slot, checking:
-      - Work-hour boundaries
-      - Fixed timetable events (SCHOOL / COMPULSORY)
-      - Other sessions (excluding the one being edited)
-    Runs entirely client-side against session_state so no backend round-trip needed.
-    """
-    conflicts = []
-    s_min = time_str_to_minutes(start_time_str)
-    e_min = s_min + duration_minutes
-
-    work_start = st.session_state.get('work_start_minutes', 7 * 60)
-    work_end   = st.session_state.get('work_end_minutes', 22 * 60 + 30)
-
-    # Work boundary checks
-    if s_min < work_start:
-        conflicts.append(
-            f"Start time {start_time_str} is before your work start "
-            f"({minutes_to_time_str(work_start)})."
-        )
-    if e_min > work_end:
-        conflicts.append(
-            f"Session would end at {minutes_to_time_str(e_min)}, "
-            f"after your work end ({minutes_to_time_str(work_end)})."
-        )
-
-    # Fixed events on that day
-    for event in st.session_state.timetable.get(day_display, []):
-        es = time_str_to_minutes(event["start"])
-        ee = time_str_to_minutes(event["end"])
-        if not (e_min <= es or s_min >= ee):
-            label = "Recurring schedule" if event.get("type") == "SCHOOL" else "Compulsory event"
-            conflicts.append(
-                f"Overlaps with {label} '{event['name']}' "
-                f"({event['start']}–{event['end']})."
-            )
-
-    # Other sessions on that day
-    for sid, session in st.session_state.sessions.items():
-        if sid == exclude_session_id:
-            continue
-        if session.get('scheduled_day') != day_display:
-            continue
-        sched_time = session.get('scheduled_time')
-        if not sched_time:
-            continue
-        ss = time_str_to_minutes(sched_time)
-        se = ss + session.get('duration_minutes', 0)
-        if not (e_min <= ss or s_min >= se):
-            conflicts.append(
-                f"Overlaps with '{session.get('activity_name', '?')}' "
-                f"Session {session.get('session_num', '?')} "
-                f"({sched_time}–{minutes_to_time_str(se)})."
-            )
-
-    return conflicts
-
-
 def _session_edit_form(act, session_id, scheduled_time, duration_minutes, edit_state_key):
     """Render the session edit form with deadline and conflict validation."""
 
@@ -358,9 +328,13 @@ def _session_edit_form(act, session_id, scheduled_time, duration_minutes, edit_s
             )
 
         # Conflict check against existing events/sessions
-        slot_conflicts = _get_conflicts_for_proposed_slot(
-            proposed_day_display, proposed_start, new_duration, session_id
-        )
+        # Checked once per rerun (and memoised by the conflict service);
+        # on submit these already are the submitted values
+        slot_conflicts = [
+            c['message'] for c in conflict_service.check_slot(
+                proposed_day_display, proposed_start, new_duration, session_id
+            )
+        ]
 
         all_issues = inline_errors + slot_conflicts
 
@@ -368,6 +342,19 @@ def _session_edit_form(act, session_id, scheduled_time, duration_minutes, edit_s
             for issue in all_issues:
                 st.warning(f"⚠️ {issue}")
 
+        # Nearest free slots for this length - one click moves the session there
+        picked = None
+        if all_issues and act['deadline'] >= 0:
+            suggestions = NeroTimeLogic.suggest_slots(
+                session_id, new_date.isoformat(), proposed_start, k=3, duration_minutes=new_duration
+            )
+            if suggestions:
+                st.caption("Free slots nearby:")
+                for col, slot in zip(st.columns(len(suggestions)), suggestions):
+                    with col:
+                        if st.form_submit_button(f"📅 {slot['day']} {slot['start']}", use_container_width=True):
+                            picked = slot
+
         col_btn1, col_btn2 = st.columns(2)
         with col_btn1:
             submitted = st.form_submit_button(
@@ -378,12 +365,8 @@ def _session_edit_form(act, session_id, scheduled_time, duration_minutes, edit_s
             cancelled = st.form_submit_button("❌ Cancel", use_container_width=True)
 
         if submitted:
-            # Re-run conflict check on submit (widget values may differ from preview)
-            final_conflicts = _get_conflicts_for_proposed_slot(
-                proposed_day_display, proposed_start, new_duration, session_id
-            )
-            if final_conflicts:
-                for c in final_conflicts:
+            if slot_conflicts:
+                for c in slot_conflicts:
                     st.error(f"❌ {c}")
             else:
                 time_display = new_time.strftime("%H:%M")
@@ -403,6 +386,21 @@ def _session_edit_form(act, session_id, scheduled_time, duration_minutes, edit_s
                 else:
                     st.error(result["message"])
 
+        if picked:
+            result = NeroTimeLogic.edit_session(
+                act['activity'], session_id,
+                new_day=picked['day'],
+                new_start_time=picked['start'],
+                new_duration=new_duration,
+                new_date=picked['date']
+            )
+            if result["success"]:
+                st.session_state[edit_state_key] = False
+                st.success(f"✓ Session moved to {picked['day']} at {picked['start']}")
+                st.rerun()
+            else:
+                st.error(result["message"])
+
         if cancelled:
             st.session_state[edit_state_key] = False
             st.rerun()
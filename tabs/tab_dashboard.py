@@ -4,7 +4,7 @@ NERO-Time - DASHBOARD / TIMETABLE TAB
 
 import streamlit as st
 from datetime import datetime, timedelta
-from nero_logic import NeroTimeLogic
+from nero_logic import NeroTimeLogic, tz
 
 
 def filter_events_by_period(month_days, filter_type):
@@ -22,6 +22,91 @@ def filter_events_by_period(month_days, filter_type):
         return [d for d in month_days if d['date'].year == today.year]
 
 
+def _render_regenerate_range():
+    """Regenerate just this week / the next N days / one day, leaving the rest alone."""
+    # Shown after the rerun that picks up the new timetable
+    result = st.session_state.pop('regen_result', None)
+    if result is not None:
+        st.success(f"✓ {result['message']}")
+        errors   = sum(1 for w in result['warnings'] if w.startswith('❌'))
+        warnings = sum(1 for w in result['warnings'] if w.startswith('⚠️'))
+        if errors or warnings:
+            st.warning(f"⚠️ {errors} error(s), {warnings} warning(s) - see Timetable Warnings above")
+
+    with st.expander("🔁 Regenerate part of the timetable", expanded=False):
+        today = datetime.now(tz).date()
+        mode  = st.radio("Regenerate", ["This week", "Next few days", "One day"],
+                         horizontal=True, key="regen_mode")
+
+        if mode == "This week":
+            first, last = today, today + timedelta(days=6 - today.weekday())
+        elif mode == "Next few days":
+            n_days = st.number_input("Days", min_value=1, max_value=31, value=3, key="regen_days")
+            first, last = today, today + timedelta(days=int(n_days) - 1)
+        else:
+            first = last = st.date_input("Day", value=today, min_value=today, key="regen_date")
+
+        clamped = NeroTimeLogic.clamp_to_loaded_month(first, last)
+        if clamped is None:
+            st.caption("None of those days are in the month you're viewing.")
+        else:
+            if clamped != (first, last):
+                st.caption("Only the days in the month you're viewing get regenerated.")
+            first, last = clamped
+            st.caption(f"Sessions outside {first.strftime('%a %-d/%m')} – {last.strftime('%a %-d/%m')} stay where they are.")
+        if st.button("Regenerate", use_container_width=True, key="btn_regenerate_range"):
+            result = NeroTimeLogic.regenerate_range(first.isoformat(), last.isoformat())
+            if result["success"]:
+                st.session_state.regen_result = result
+                st.rerun()
+            else:
+                st.error(result["message"])
+
+        st.caption("Or only move what's broken - skipped, missed and clashing sessions:")
+        if st.button("🩹 Repair plan", use_container_width=True, key="btn_repair_plan"):
+            result = NeroTimeLogic.repair_plan()
+            if result["success"]:
+                st.success(f"✓ {result['message']}")
+                for warning in result["warnings"]:
+                    st.warning(warning)
+            else:
+                st.error(result["message"])
+
+
+def _render_group_availability():
+    """Find times you and your study group are all free."""
+    with st.expander("👥 Find a time with your group", expanded=False):
+        today = datetime.now(tz).date()
+        names = st.text_input("Usernames (comma separated)", key="group_usernames")
+        col1, col2 = st.columns(2)
+        with col1:
+            days = st.date_input("Between", value=(today, today + timedelta(days=6)),
+                                 min_value=today, key="group_dates")
+        with col2:
+            duration = st.number_input("Minutes", min_value=15, max_value=480, value=60, step=15,
+                                       key="group_duration")
+
+        if st.button("Search", use_container_width=True, key="btn_group_search"):
+            first, last = (days[0], days[-1]) if isinstance(days, (list, tuple)) else (days, days)
+            st.session_state.group_slots = NeroTimeLogic.find_group_slots(
+                names.split(","), first.isoformat(), last.isoformat(), int(duration)
+            )
+
+        result = st.session_state.get('group_slots')
+        if result is None:
+            return
+        if not result["success"]:
+            st.error(result["message"])
+            return
+        if result["missing"]:
+            st.warning(f"{', '.join(result['missing'])} don't share their availability - left out.")
+        st.info(result["message"])
+        for slot in result["slots"]:
+            st.markdown(f"- **{slot['day']}** {slot['start']} — {slot['end']} "
+                        f"<span style='opacity:0.6'>(free until {slot['free_until']})</span>",
+                        unsafe_allow_html=True)
+
+
 def ui_dashboard_tab():
     """Dashboard / Timetable / Home Screen content"""
 
@@ -58,7 +143,7 @@ def ui_dashboard_tab():
     if 'timetable_warnings' in st.session_state and st.session_state.timetable_warnings:
         errors        = sum(1 for w in st.session_state.timetable_warnings if w.startswith('❌')) # literally cannot be put in before the deadline
         warnings_count = sum(1 for w in st.session_state.timetable_warnings if w.startswith('⚠️')) # only a certain amount of hours cannot be put in before the deadline
-        success_count  = sum(1 for w in st.session_state.timetable_warnings if w.startswith('✓')) # nice
+        success_count  = sum(1 for w in st.session_state.timetable_warnings if w.startswith("✓ '")) # nice (per-activity lines only)
 
         if errors > 0:
             header   = f"⚠️ Timetable Warnings ({errors} error(s), {warnings_count} warning(s))"
@@ -83,21 +168,40 @@ def ui_dashboard_tab():
         st.divider()
 
     # === Generate button ===
-    if st.button("✨ **GENERATE TIMETABLE** ✨", type="primary", use_container_width=True,
-                 key="btn_generate_timetable"):
+    # Generation runs in the background; the clock's 1s rerun refreshes the progress bar
+    result = NeroTimeLogic.finish_generation()
+    if result is not None:
+        if result["success"]:
+            st.success("✓ Timetable generated successfully!")
+            st.rerun()
+        elif result.get("cancelled"):
+            st.info(result["message"])
+        else:
+            st.error(result["message"])
+
+    job = st.session_state.get('generation_job')
+    if job is not None and job.running:
+        st.progress(job.progress, text=f"Generating your perfect schedule... {job.message}")
+        if st.button("✖ Cancel", use_container_width=True, key="btn_cancel_generation"):
+            NeroTimeLogic.cancel_generation()
+            st.rerun()
+    elif st.button("✨ **GENERATE TIMETABLE** ✨", type="primary", use_container_width=True,
+                   key="btn_generate_timetable"):
         if (st.session_state.list_of_activities
                 or st.session_state.list_of_compulsory_events
                 or st.session_state.school_schedule):
-            with st.spinner("Generating your perfect schedule..."):
-                result = NeroTimeLogic.generate_timetable()
+            result = NeroTimeLogic.start_generation()
             if result["success"]:
-                st.success("✓ Timetable generated successfully!")
                 st.rerun()
             else:
                 st.error(result["message"])
         else:
             st.warning("⚠️ Please add activities, events, or school schedule first")
 
+    if job is None or not job.running:
+        _render_regenerate_range()
+    _render_group_availability()
+
     st.divider()
 
     # ==== Event filter buttons ===
@@ -128,6 +232,7 @@ def ui_dashboard_tab():
     filtered_days = filter_events_by_period(dashboard_data['month_days'], st.session_state.event_filter) # filtered events using fun
 
     if dashboard_data['timetable'] and filtered_days:
+        progress = _activity_progress()
         for day_info in filtered_days: # for each DAY, display the events.
             day_display    = day_info['display']
             date_obj       = day_info['date']
@@ -151,40 +256,53 @@ def ui_dashboard_tab():
                 expanded=is_current_day
             ):
                 for event in visible_events:
-                    _render_event_row(event, is_current_day, dashboard_data) # each event uses this
+                    html = _event_row_html(event, _is_current_slot(event, is_current_day, dashboard_data), progress)
+                    st.markdown(html, unsafe_allow_html=True)
     else:
         st.info("No events for this period.")
         st.info("Add activities, and events to start generating!")
 
 
-def _render_event_row(event, is_current_day, dashboard_data):
-    """Logic for one event"""
-    from Timetable_Generation import time_str_to_minutes # makes string-stored time to minutes for computations
+def _activity_progress():
+    """{activity name: (completed hours, total hours)} - one pass over the sessions per rerun."""
+    completed = {}
+    for s in st.session_state.sessions.values():
+        if s.get('is_completed', False):
+            completed[s['activity_name']] = completed.get(s['activity_name'], 0) + s.get('duration_hours', 0)
+    return {
+        a['activity']: (completed.get(a['activity'], 0), a['timing'])
+        for a in st.session_state.list_of_activities
+    }
 
-    is_current_slot = False
-    is_finished     = event.get('is_finished', False)
 
-    if is_current_day and dashboard_data['current_time']: # this is to check if the event is happening AT THE CURRENT TIME.
-        current_minutes = time_str_to_minutes(dashboard_data['current_time'])
+def _activity_name(event):
+    return event.get('activity_name', event['name'].split(' (Session')[0])
 
-        is_current_slot = (
-            time_str_to_minutes(event['start']) <= current_minutes < time_str_to_minutes(event['end'])
-        )
 
+def _is_current_slot(event, is_current_day, dashboard_data):
+    """Is the event happening AT THE CURRENT TIME."""
+    from Timetable_Generation import time_str_to_minutes # makes string-stored time to minutes for computations
+
+    if not (is_current_day and dashboard_data['current_time']):
+        return False
+    current_minutes = time_str_to_minutes(dashboard_data['current_time'])
+    return time_str_to_minutes(event['start']) <= current_minutes < time_str_to_minutes(event['end'])
+
+
+def _event_row_html(event, is_current_slot, progress):
+    """Logic for one event"""
     event_type = event["type"] 
 
     # different UI for different schedule objects.
     if event_type == "ACTIVITY":
-        _render_activity_event(event, is_current_slot, is_finished)
-    else :
-        _render_compulsory_event(event, is_current_slot, event_type == "SCHOOL") # "SCHOOL" is just all repeated events currently. One-time events are regular compulsory events
+        return _activity_event_html(event, is_current_slot, event.get('is_finished', False), progress)
+    return _compulsory_event_html(event, is_current_slot, event_type == "SCHOOL") # "SCHOOL" is just all repeated events currently. One-time events are regular compulsory events
 
 
-def _render_activity_event(event, is_current_slot, is_finished):
+def _activity_event_html(event, is_current_slot, is_finished, progress):
     """UI for one timetable ACTIVITY event."""
-    activity_name = event.get('activity_name', event['name'].split(' (Session')[0])
+    activity_name = _activity_name(event)
     session_num   = event.get('session_num', 1)
-    session_id    = event.get('session_id')
 
     is_completed   = event.get('is_completed', False)
     is_skipped     = event.get('is_skipped', False) and is_finished
@@ -209,21 +327,11 @@ def _render_activity_event(event, is_current_slot, is_finished):
     # PROGRESS (for html ui)
     progress_html = "" 
 
-    # filters the list, and gets the activity needed, and then goes to the next one for the next iteration.
-    activity_obj = next( 
-        (a for a in st.session_state.list_of_activities if a['activity'] == activity_name), None 
-    )
-
-    if activity_obj: # this gets all the other variables needed for the event UI.
-        act_sessions    = [
-            s for s in st.session_state.sessions.values()
-            if s['activity_name'] == activity_name
-        ]
-        completed_hours = sum(s.get('duration_hours', 0) for s in act_sessions if s.get('is_completed', False))
-        total_hours     = activity_obj['timing']
-        progress_html   = f'📊 {completed_hours:.1f}h / {total_hours:.1f}h completed'
-
-    html = f"""
+    if activity_name in progress:
+        completed_hours, total_hours = progress[activity_name]
+        progress_html = f'📊 {completed_hours:.1f}h / {total_hours:.1f}h completed'
+
+    return f"""
     <div class="{css_class}">
         <div class="event-info">
             <div style="font-size:22px; margin-top:2px;">{status_icon}</div>
@@ -240,14 +348,13 @@ def _render_activity_event(event, is_current_slot, is_finished):
         </div>
     </div>
     """
-    st.markdown(html, unsafe_allow_html=True)
 
 
-def _render_compulsory_event(event, is_current_slot, is_school = False):
+def _compulsory_event_html(event, is_current_slot, is_school = False):
     """Render a compulsory event"""
 
     badge_html = '<span class="happening-now">● LIVE NOW</span> ' if is_current_slot else ""
-    html = f"""
+    return f"""
     <div class="timetable-row school">
         <div class="event-info">
             <div style="font-size:22px; margin-top:2px;">{"🏫" if is_school else "🔴"}</div>
@@ -261,6 +368,5 @@ def _render_compulsory_event(event, is_current_slot, is_school = False):
         </div>
     </div>
     """
-    st.markdown(html, unsafe_allow_html=True)
 
 
@@ -6,66 +6,73 @@ import streamlit as st
 from datetime import datetime
 from nero_logic import NeroTimeLogic
 from Timetable_Generation import WEEKDAY_NAMES, time_str_to_minutes
+from schedule_index import find_clashes
 
 
-def _times_overlap(start1: str, end1: str, start2: str, end2: str) -> bool:
-    """Return True if two time ranges overlap."""
-    s1, e1 = time_str_to_minutes(start1), time_str_to_minutes(end1)
-    s2, e2 = time_str_to_minutes(start2), time_str_to_minutes(end2)
-    return not (e1 <= s2 or s1 >= e2)
-
-
-def _get_clashes() -> list:
+def _find_clash_pairs(schedule: dict, one_time: list) -> list:
     """
-    Check all recurring schedules and one-time events for time clashes
-    on the same day. Returns a list of human-readable clash descriptions.
+    All clashing pairs in one sweep per day (see schedule_index.find_clashes).
+    Items are ('R', weekday, index) for recurring schedules and ('E', index)
+    for one-time events.
     """
-    clashes = []
+    # Parse every "HH:MM" once
+    recurring = {
+        day_name: [(time_str_to_minutes(e['start_time']), time_str_to_minutes(e['end_time']), ('R', day_name, i))
+                   for i, e in enumerate(events)]
+        for day_name, events in schedule.items()
+    }
+    by_day = {}
+    for i, e in enumerate(one_time):
+        by_day.setdefault(e['day'], []).append(
+            (time_str_to_minutes(e['start_time']), time_str_to_minutes(e['end_time']), ('E', i))
+        )
+
+    pairs = []
+    # ── Within recurring schedules (same weekday) ──────────────────────────────
+    for intervals in recurring.values():
+        pairs.extend(find_clashes(intervals))
+    # ── One-time events against each other and that weekday's recurring ones ──
+    for day, intervals in by_day.items():
+        pairs.extend(
+            (a, b) for a, b in find_clashes(intervals + recurring.get(day.split()[0], []))
+            if a[0] == 'E' or b[0] == 'E'
+        )
+    return pairs
 
-    # ── Clashes within recurring schedules (same weekday) ──────────────────────
-    schedule = st.session_state.school_schedule
-    for day_name, events in schedule.items():
-        for i in range(len(events)):
-            for j in range(i + 1, len(events)):
-                a, b = events[i], events[j]
-                if _times_overlap(a['start_time'], a['end_time'],
-                                  b['start_time'], b['end_time']):
-                    clashes.append(
-                        f"**{day_name}** — "
-                        f"'{a['subject']}' ({a['start_time']}–{a['end_time']}) "
-                        f"clashes with "
-                        f"'{b['subject']}' ({b['start_time']}–{b['end_time']})"
-                    )
 
-    # ── Clashes within one-time events (same day display) ──────────────────────
+def _get_clashes(pairs: list) -> list:
+    """Human-readable descriptions of the clashing pairs from _find_clash_pairs."""
+    schedule = st.session_state.school_schedule
     one_time = st.session_state.list_of_compulsory_events
-    for i in range(len(one_time)):
-        for j in range(i + 1, len(one_time)):
-            a, b = one_time[i], one_time[j]
-            if a['day'] == b['day'] and _times_overlap(
-                a['start_time'], a['end_time'],
-                b['start_time'], b['end_time']
-            ):
-                clashes.append(
-                    f"**{a['day']}** — "
-                    f"'{a['event']}' ({a['start_time']}–{a['end_time']}) "
-                    f"clashes with "
-                    f"'{b['event']}' ({b['start_time']}–{b['end_time']})"
-                )
-
-    # ── Clashes between recurring schedules and one-time events ────────────────
-    for evt in one_time:
-        day_name = evt['day'].split()[0]
-        if day_name in schedule:
-            for recurring in schedule[day_name]:
-                if _times_overlap(evt['start_time'], evt['end_time'],
-                                  recurring['start_time'], recurring['end_time']):
-                    clashes.append(
-                        f"**{evt['day']}** — "
-                        f"One-time '{evt['event']}' ({evt['start_time']}–{evt['end_time']}) "
-                        f"clashes with recurring "
-                        f"'{recurring['subject']}' ({recurring['start_time']}–{recurring['end_time']})"
-                    )
+    clashes  = []
+
+    for a, b in pairs:
+        if a[0] == 'R' and b[0] == 'R':
+            ra, rb = schedule[a[1]][a[2]], schedule[b[1]][b[2]]
+            clashes.append(
+                f"**{a[1]}** — "
+                f"'{ra['subject']}' ({ra['start_time']}–{ra['end_time']}) "
+                f"clashes with "
+                f"'{rb['subject']}' ({rb['start_time']}–{rb['end_time']})"
+            )
+        elif a[0] == 'E' and b[0] == 'E':
+            ea, eb = one_time[a[1]], one_time[b[1]]
+            clashes.append(
+                f"**{ea['day']}** — "
+                f"'{ea['event']}' ({ea['start_time']}–{ea['end_time']}) "
+                f"clashes with "
+                f"'{eb['event']}' ({eb['start_time']}–{eb['end_time']})"
+            )
+        else:
+            evt_item, rec_item = (a, b) if a[0] == 'E' else (b, a)
+            evt       = one_time[evt_item[1]]
+            recurring = schedule[rec_item[1]][rec_item[2]]
+            clashes.append(
+                f"**{evt['day']}** — "
+                f"One-time '{evt['event']}' ({evt['start_time']}–{evt['end_time']}) "
+                f"clashes with recurring "
+                f"'{recurring['subject']}' ({recurring['start_time']}–{recurring['end_time']})"
+            )
 
     return clashes
 
@@ -81,7 +88,12 @@ def ui_events_tab():
 
     st.divider()
 
-    clashes = _get_clashes()
+    pairs = _find_clash_pairs(st.session_state.school_schedule,
+                              st.session_state.list_of_compulsory_events)
+    # Per-item ⚠️ markers only count clashes with the same kind of event
+    clashing = {item for a, b in pairs if a[0] == b[0] for item in (a, b)}
+
+    clashes = _get_clashes(pairs)
     if clashes:
         with st.expander(
             f"⚠️ {len(clashes)} scheduling clash{'es' if len(clashes) != 1 else ''} detected",
@@ -94,11 +106,11 @@ def ui_events_tab():
             for clash in clashes:
                 st.markdown(f"- {clash}")
 
-    _render_recurring_schedules()
+    _render_recurring_schedules(clashing)
 
     st.divider()
 
-    _render_one_time_events()
+    _render_one_time_events(clashing)
 
 
 def _render_add_event_form():
@@ -178,8 +190,8 @@ def _render_add_event_form():
                 st.error("Please enter an event name")
 
 
-def _render_recurring_schedules():
-    """Recurring schedules section."""
+def _render_recurring_schedules(clashing: set):
+    """Recurring schedules section. `clashing` holds the items from _find_clash_pairs."""
 
     st.markdown("### 📅 Recurring Schedules")
     school_data = NeroTimeLogic.get_school_schedule()
@@ -192,11 +204,7 @@ def _render_recurring_schedules():
             events = schedule[day]
             count  = len(events)
 
-            day_has_clash = any(
-                _times_overlap(events[i]['start_time'], events[i]['end_time'],
-                               events[j]['start_time'], events[j]['end_time'])
-                for i in range(count) for j in range(i + 1, count)
-            )
+            day_has_clash = any(('R', day, i) in clashing for i in range(count))
             label = f"{'⚠️ ' if day_has_clash else ''}{day} ({count} event{'s' if count != 1 else ''})"
 
             with st.expander(label):
@@ -209,14 +217,7 @@ def _render_recurring_schedules():
                         if start_label:
                             caption += f"  ·  from {start_label}"
 
-                        event_clashes = any(
-                            idx != k and _times_overlap(
-                                cls['start_time'], cls['end_time'],
-                                events[k]['start_time'], events[k]['end_time']
-                            )
-                            for k in range(count)
-                        )
-                        prefix = "⚠️ " if event_clashes else ""
+                        prefix = "⚠️ " if ('R', day, idx) in clashing else ""
                         st.write(f"{prefix}**{cls['subject']}** ({recurrence_badge})")
                         st.caption(caption)
                     with col2:
@@ -228,33 +229,27 @@ def _render_recurring_schedules():
         st.info("No recurring schedules")
 
 
-def _render_one_time_events():
-    """Render the One-time Events section."""
+def _render_one_time_events(clashing: set):
+    """Render the One-time Events section. `clashing` holds the items from _find_clash_pairs."""
 
     st.markdown("### 📌 One-time Events")
     events_data = NeroTimeLogic.get_events_data()
     events      = events_data['events']
 
     if events:
-        clashing_indices = set()
-        for i in range(len(events)):
-            for j in range(i + 1, len(events)):
-                a, b = events[i], events[j]
-                if a['day'] == b['day'] and _times_overlap(
-                    a['start_time'], a['end_time'],
-                    b['start_time'], b['end_time']
-                ):
-                    clashing_indices.add(i)
-                    clashing_indices.add(j)
+        # `events` is sorted by date; the clash items index the stored list
+        one_time     = st.session_state.list_of_compulsory_events
+        clashing_ids = {one_time[item[1]].get('event_id') for item in clashing if item[0] == 'E'}
 
         for idx, evt in enumerate(events):
-            clash_prefix = "⚠️ " if idx in clashing_indices else ""
+            is_clashing  = evt.get('event_id') in clashing_ids
+            clash_prefix = "⚠️ " if is_clashing else ""
             with st.expander(f"{idx+1}. {clash_prefix}{evt['event']} — {evt['day']}"):
                 st.write(f"{evt['start_time']} — {evt['end_time']}")
-                if idx in clashing_indices:
+                if is_clashing:
                     st.warning("This event clashes with another event on the same day.")
-                if st.button("Delete", key=f"del_event_{idx}_{evt['event']}"):
-                    result = NeroTimeLogic.delete_event(idx)
+                if st.button("Delete", key=f"del_event_{evt.get('event_id', idx)}"):
+                    result = NeroTimeLogic.delete_event(evt.get('event_id'))
                     if result["success"]:
                         st.rerun()
     else:
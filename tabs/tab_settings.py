@@ -22,9 +22,15 @@ def ui_settings_tab():
     _render_schedule_hours()
     st.divider()
 
+    _render_group_sharing()
+    st.divider()
+
     _render_change_password()
     st.divider()
 
+    _render_timetable_history()
+    st.divider()
+
     _render_data_management()
 
 
@@ -124,9 +130,9 @@ def _render_schedule_hours():
 
         # send to firebase
         if st.session_state.user_id:
-            from Firebase_Function import save_to_firebase
-            save_to_firebase(st.session_state.user_id, 'work_start_minutes', wake_minutes)
-            save_to_firebase(st.session_state.user_id, 'work_end_minutes',   sleep_minutes)
+            from storage import get_storage
+            get_storage().save(st.session_state.user_id, 'work_start_minutes', wake_minutes)
+            get_storage().save(st.session_state.user_id, 'work_end_minutes',   sleep_minutes)
 
         st.success(
             f"✓ Saved — timetable will run "
@@ -161,14 +167,81 @@ def _render_change_password():
                     st.warning("Password must be at least 6 characters")
                 else:
                     with st.spinner("Changing password..."):
-                        from Firebase_Function import change_password
-                        result = change_password(st.session_state.user_id, old_password, new_password)
+                        from storage import get_storage
+                        result = get_storage().change_password(st.session_state.user_id, old_password, new_password)
                     if result["success"]:
                         st.success("✓ " + result["message"])
                     else:
                         st.error("✗ " + result["message"])
 
 
+# === TIMETABLE HISTORY ===
+
+def _render_timetable_history():
+    """Past generated timetables. The list only has summaries; a snapshot is loaded when opened."""
+    with st.expander("🕘 Timetable History", expanded=False):
+        from storage import get_storage
+        storage = get_storage()
+
+        if 'history_items' not in st.session_state:
+            page = storage.list_history(st.session_state.user_id)
+            st.session_state.history_items  = page['items']
+            st.session_state.history_cursor = page['next_cursor']
+
+        if not st.session_state.history_items:
+            st.info("No timetable history yet. Generate a timetable to start one.")
+            return
+
+        for item in st.session_state.history_items:
+            created = item.get('created_at')
+            label   = created.strftime('%d/%m/%Y %H:%M') if created else f"#{item['seq']}"
+
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.write(f"**{label}**")
+                st.caption(item.get('summary', ''))
+            with col2:
+                if st.button("View", key=f"history_view_{item['seq']}", use_container_width=True):
+                    st.session_state.history_open          = item['seq']
+                    st.session_state.history_open_snapshot = storage.get_snapshot(
+                        st.session_state.user_id, item['seq']
+                    )
+
+            if st.session_state.get('history_open') == item['seq']:
+                snapshot = st.session_state.history_open_snapshot
+                if snapshot is None:
+                    st.warning("This snapshot is no longer available.")
+                else:
+                    for act in snapshot['activities']:
+                        st.write(f"• {act['activity']} — {act['timing']}h ({act.get('num_sessions', 0)} sessions)")
+                    for evt in snapshot['events']:
+                        st.write(f"• {evt['event']} — {evt['day']} {evt['start_time']}–{evt['end_time']}")
+
+        if st.session_state.history_cursor is not None:
+            if st.button("Load more", key="btn_history_more"):
+                page = storage.list_history(st.session_state.user_id,
+                                              start_after=st.session_state.history_cursor)
+                st.session_state.history_items  += page['items']
+                st.session_state.history_cursor = page['next_cursor']
+                st.rerun()
+
+
+# === Group availability sharing ===
+
+def _render_group_sharing():
+    st.markdown("### 👥 Group Availability")
+    st.caption("Lets people you study with find times you're both free. They only ever see "
+               "shared free slots, never your timetable. You need this on to search too.")
+    share = st.toggle("Share my free / busy times", value=st.session_state.share_availability,
+                      key="toggle_share_availability")
+    if share != st.session_state.share_availability:
+        result = NeroTimeLogic.set_share_availability(share)
+        if result["success"]:
+            st.success(f"✓ {result['message']}")
+        else:
+            st.error(result["message"])
+
+
 # ===== Data management =====
 
 def _render_data_management():
@@ -183,8 +256,5 @@ def _render_data_management():
                 st.rerun()
     with col2:
         if st.button("Logout", type="primary", use_container_width=True, key="btn_logout"):
-            st.session_state.user_id    = None
-            st.session_state.username   = None
-            st.session_state.user_email = None
-            st.session_state.data_loaded = False
-            st.rerun()
\ No newline at end of file
+            from session_tokens import logout
+            logout()
\ No newline at end of file
@@ -16,7 +16,8 @@ def ui_verification_tab():
     st.header("✅ Session Verification")
     st.caption(
         "Mark each finished session as **done** or **not done**. "
-        "Sessions marked ❌ (skipped) will be rescheduled again next time you generate the timetable."
+        "Sessions marked ❌ (skipped) will be rescheduled again next time you generate the timetable, "
+        "or straight away with **Reschedule skipped sessions**."
     )
 
     finished = NeroTimeLogic.get_finished_sessions()
@@ -35,11 +36,26 @@ def ui_verification_tab():
     else:
         st.success("✓ All finished sessions have been reviewed!")
 
+    if any(s.get('is_skipped', False) for s in reviewed):
+        if st.button("🩹 Reschedule skipped sessions", use_container_width=True, key="btn_repair_skipped",
+                     help="Moves only skipped, missed and clashing sessions to the nearest free slot. "
+                          "Everything else stays where it is."):
+            _show_repair_result(NeroTimeLogic.repair_plan())
+
     if reviewed:
         with st.expander(f"📋 Reviewed ({len(reviewed)})", expanded=False):
             _render_session_group(reviewed)
 
 
+def _show_repair_result(result):
+    if not result["success"]:
+        st.error(result["message"])
+        return
+    st.success(f"✓ {result['message']}")
+    for warning in result.get("warnings", []):
+        st.warning(warning)
+
+
 def _render_session_group(sessions: list):
     """finished sessions grouped by activity"""
     by_activity: dict = {}
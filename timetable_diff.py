@@ -0,0 +1,88 @@
+"""
+TIMETABLE DIFF
+What changed between two plans, matched by stable ID:
+sessions by session_id, fixed timetable rows by source_id (rows from
+before event ids existed by name + time).
+
+    diff_sessions(old, new)
+        {'added':   [slot],                       in new only
+         'removed': [slot],                       in old only
+         'moved':   [{'session_id', 'activity_name', 'from': slot, 'to': slot}],
+         'unchanged': int}
+        slot = {'session_id', 'activity_name', 'day', 'time', 'duration'}
+
+    diff_timetable(old, new)
+        {'changed_days': [day display]}           days whose fixed rows differ
+
+    diff_plan(old_state, new_state)   both of the above, plus 'summary'
+
+    changed_documents(old_docs, new_docs)
+        [data_type] of the documents in new_docs that differ from old_docs -
+        storage writes whole documents, so that's all a save needs to know
+"""
+
+from typing import Dict, List
+
+
+def _slot(session: dict) -> dict:
+    return {
+        'session_id':    session['session_id'],
+        'activity_name': session['activity_name'],
+        'day':           session.get('scheduled_day'),
+        'time':          session.get('scheduled_time'),
+        'duration':      session.get('duration_minutes'),
+    }
+
+
+def diff_sessions(old: Dict[str, dict], new: Dict[str, dict]) -> dict:
+    added   = [_slot(s) for sid, s in new.items() if sid not in old]
+    removed = [_slot(s) for sid, s in old.items() if sid not in new]
+    moved   = []
+    unchanged = 0
+    for sid, s in new.items():
+        if sid not in old:
+            continue
+        before, after = _slot(old[sid]), _slot(s)
+        if (before['day'], before['time'], before['duration']) != (after['day'], after['time'], after['duration']):
+            moved.append({'session_id': sid, 'activity_name': s['activity_name'], 'from': before, 'to': after})
+        else:
+            unchanged += 1
+
+    by_time = lambda slot: (slot['day'] or '', slot['time'] or '')
+    added.sort(key=by_time)
+    removed.sort(key=by_time)
+    moved.sort(key=lambda m: by_time(m['to']))
+    return {'added': added, 'removed': removed, 'moved': moved, 'unchanged': unchanged}
+
+
+def _row_keys(rows: List[dict]) -> list:
+    return sorted((row.get('source_id') or row['name'], row['start'], row['end'], row.get('type'))
+                  for row in rows)
+
+
+def diff_timetable(old: Dict[str, list], new: Dict[str, list]) -> dict:
+    changed = [
+        day for day in {**old, **new}
+        if _row_keys(old.get(day, [])) != _row_keys(new.get(day, []))
+    ]
+    return {'changed_days': changed}
+
+
+def diff_plan(old_state, new_state) -> dict:
+    sessions  = diff_sessions(old_state['sessions'], new_state['sessions'])
+    timetable = diff_timetable(old_state['timetable'], new_state['timetable'])
+
+    parts = []
+    if sessions['added']:
+        parts.append(f"{len(sessions['added'])} added")
+    if sessions['moved']:
+        parts.append(f"{len(sessions['moved'])} moved")
+    if sessions['removed']:
+        parts.append(f"{len(sessions['removed'])} removed")
+    summary = f"Sessions: {', '.join(parts)}" if parts else "No session changes"
+
+    return {**sessions, **timetable, 'summary': summary}
+
+
+def changed_documents(old_docs: dict, new_docs: dict) -> List[str]:
+    return [data_type for data_type, value in new_docs.items() if old_docs.get(data_type) != value]
@@ -0,0 +1,180 @@
+"""
+LOCAL SEARCH (runs after the greedy placement)
+Greedy placement can leave hours unscheduled ("could not fit before the
+deadline") even though they'd fit if some earlier sessions sat elsewhere.
+This pass keeps trying, until its time budget runs out, to:
+
+    insert    a chunk of a short activity straight into a free slot
+    eject     move one session that's in the way to another day/slot in its
+              own window, then insert the chunk where it was
+    swap      exchange two equal-length sessions on different days
+              (doesn't change the score, just shakes things up)
+
+Recently moved sessions are tabu for TABU_TENURE iterations so the search
+doesn't keep undoing itself. Nothing is ever unscheduled, so the current
+solution is always the best one found.
+
+Never touched: completed, user-edited and manual sessions, and anything
+before now.
+"""
+
+import os
+import random
+import time
+
+from Timetable_Generation import (
+    activity_shortfalls,
+    activity_windows,
+    get_work_end_minutes,
+    make_session,
+    minutes_to_time_str,
+    next_session_num,
+    round_to_15_minutes,
+    time_str_to_minutes,
+)
+from conflict_service import get_index
+
+IMPROVE_BUDGET_MS = int(os.environ.get("NERO_IMPROVE_BUDGET_MS", 200))
+TABU_TENURE       = 20    # iterations a moved session stays where it is
+SWAP_CHANCE       = 0.3   # chance of a swap after a failed insert
+MAX_EJECT_TRIES   = 3     # sessions tried as "the one in the way" per insert
+
+
+class _Search:
+    def __init__(self, state, month_days, today, rng):
+        self.state    = state
+        self.sessions = state['sessions']
+        self.rng      = rng
+        self.work_end = get_work_end_minutes(state)
+        self.index    = get_index(state)
+        self.dates    = {d['display']: d['date'] for d in month_days}
+        self.tabu     = {}  # session_id -> iteration it can move again
+        self.iteration = 0
+
+        self.activities = {a['activity']: a for a in state['list_of_activities']}
+        self.window    = activity_windows(state, month_days, today)  # activity -> {day: earliest start}
+        self.shortfall = activity_shortfalls(state)                  # activity -> minutes unscheduled
+
+        self.movable = [sid for sid, s in self.sessions.items() if self._is_movable(s)]
+
+    def _is_movable(self, s) -> bool:
+        if s.get('is_completed') or s.get('is_user_edited') or s.get('is_manual'):
+            return False
+        earliest = self.window.get(s['activity_name'], {}).get(s.get('scheduled_day'))
+        return (earliest is not None and s.get('scheduled_time') is not None
+                and time_str_to_minutes(s['scheduled_time']) >= earliest)
+
+    def _span(self, sid):
+        s = self.sessions[sid]
+        start = time_str_to_minutes(s['scheduled_time'])
+        return s['scheduled_day'], start, start + s['duration_minutes']
+
+    def _move(self, sid, day, start):
+        s = self.sessions[sid]
+        self.index.remove_session(s)
+        s['scheduled_day']  = day
+        s['scheduled_date'] = self.dates[day].isoformat()
+        s['scheduled_time'] = minutes_to_time_str(start)
+        self.index.add_session(s)
+        self.tabu[sid] = self.iteration + TABU_TENURE
+
+    def _add(self, name, day, start, duration):
+        session = make_session(name, next_session_num(self.sessions, name), day,
+                               self.dates[day], minutes_to_time_str(start), duration)
+        self.sessions[session['session_id']] = session
+        self.index.add_session(session)
+        self.movable.append(session['session_id'])
+        self.shortfall[name] -= duration
+
+    def _free(self, sid) -> bool:
+        return self.tabu.get(sid, 0) <= self.iteration
+
+    # === Moves ===
+
+    def _eject(self, day, duration, earliest):
+        """Move one session off `day` so a `duration` block fits there. Start minute or None."""
+        blockers = [sid for sid in self.index.session_ids(day)
+                    if sid in self.movable and self._free(sid)]
+        self.rng.shuffle(blockers)
+
+        for sid in blockers[:MAX_EJECT_TRIES]:
+            blocker = self.sessions[sid]
+            _, b_start, b_end = self._span(sid)
+            self.index.remove_session(blocker)
+            start = self.index.find_slot(day, duration, earliest, self.work_end, self.rng)
+            if start is not None:
+                held = {'session_id': None}  # keeps the new block's slot while the blocker looks
+                self.index.add(day, start, start + duration, held)
+                b_window = self.window[blocker['activity_name']]
+                b_days   = list(b_window)
+                self.rng.shuffle(b_days)
+                for b_day in b_days:
+                    b_new = self.index.find_slot(b_day, b_end - b_start, b_window[b_day],
+                                                 self.work_end, self.rng)
+                    if b_new is not None:
+                        self.index.remove(day, held)
+                        self.index.add_session(blocker)  # _move takes it off again
+                        self._move(sid, b_day, b_new)
+                        return start
+                self.index.remove(day, held)
+            self.index.add_session(blocker)
+        return None
+
+    def _swap(self):
+        if len(self.movable) < 2:
+            return
+        a, b = self.rng.sample(self.movable, 2)
+        if not (self._free(a) and self._free(b)):
+            return
+        a_day, a_start, a_end = self._span(a)
+        b_day, b_start, b_end = self._span(b)
+        if a_day == b_day or a_end - a_start != b_end - b_start:
+            return
+        a_window = self.window[self.sessions[a]['activity_name']]
+        b_window = self.window[self.sessions[b]['activity_name']]
+        if b_start < a_window.get(b_day, 24 * 60) or a_start < b_window.get(a_day, 24 * 60):
+            return
+        self._move(a, b_day, b_start)
+        self._move(b, a_day, a_start)
+
+    # === Main loop ===
+
+    def run(self, deadline) -> dict:
+        added = {}
+        short = [n for n, m in self.shortfall.items() if m > 0 and self.window[n]]
+
+        while short and time.monotonic() < deadline:
+            self.iteration += 1
+            name     = self.rng.choice(short)
+            activity = self.activities[name]
+            max_session = round_to_15_minutes(activity.get('max_session_minutes', 120))
+            duration = max(15, round_to_15_minutes(min(self.shortfall[name], max_session)))
+            day      = self.rng.choice(list(self.window[name]))
+            earliest = self.window[name][day]
+
+            start = self.index.find_slot(day, duration, earliest, self.work_end, self.rng)
+            if start is None:
+                start = self._eject(day, duration, earliest)
+            if start is None:
+                if self.rng.random() < SWAP_CHANCE:
+                    self._swap()
+                continue
+
+            self._add(name, day, start, duration)
+            added[name] = added.get(name, 0) + duration
+            if self.shortfall[name] <= 0:
+                short.remove(name)
+
+        return added
+
+
+def improve_timetable(state, month_days: list, today, budget_ms: int = IMPROVE_BUDGET_MS,
+                      rng=None) -> dict:
+    """
+    Try to fit unscheduled hours into `state` for up to `budget_ms` milliseconds.
+    Returns {activity name: minutes newly scheduled} (empty if nothing changed).
+    """
+    if budget_ms <= 0:
+        return {}
+    search = _Search(state, month_days, today, rng or random.Random())
+    return search.run(time.monotonic() + budget_ms / 1000)
@@ -0,0 +1,198 @@
+"""
+PORTFOLIO SCHEDULING
+The scheduler is greedy and randomised, so some runs come out better than
+others. Portfolio mode runs K generations with different seeds in a process
+pool (one per core), scores each one and keeps the best that finished within
+the wall-clock budget.
+
+Score (higher is better), see score_timetable():
+    + hours scheduled on or before each activity's deadline
+    - fragmentation  (sessions beyond the fewest max-length ones that would do)
+    - daily imbalance (std-dev of scheduled hours per day)
+    - lateness       (hours weighted by how far into the deadline window they sit)
+
+It's off by default (a plain run shows per-activity progress, a portfolio
+only shows per-candidate). Turn it on with NERO_PORTFOLIO_CANDIDATES=K (say,
+the number of cores) and tune NERO_PORTFOLIO_BUDGET (seconds).
+
+The budget only decides which results are looked at: candidates already
+running when it runs out aren't killed (a pool can't stop a busy worker),
+they finish in the background and their results are dropped. Only ones
+still queued are cancelled.
+"""
+
+import copy
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from Timetable_Generation import iter_generate_timetable
+
+PORTFOLIO_CANDIDATES     = int(os.environ.get("NERO_PORTFOLIO_CANDIDATES", 1))
+PORTFOLIO_BUDGET_SECONDS = float(os.environ.get("NERO_PORTFOLIO_BUDGET", 3.0))
+
+SCORE_WEIGHTS = {
+    'on_time_hours':  10.0,
+    'fragmentation':  -0.5,
+    'imbalance':      -2.0,
+    'lateness':       -1.0,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# === Scoring ===
+
+def score_timetable(state, today: datetime) -> dict:
+    """Score a generated state. Returns each part plus 'total'."""
+    today_date  = today.date()
+    on_time     = 0.0
+    extra       = 0
+    lateness    = 0.0
+    daily_hours = {}
+    last_date   = today_date
+
+    for activity in state['list_of_activities']:
+        name          = activity['activity']
+        deadline_days = max(1, activity['deadline'])
+        deadline_date = today_date + timedelta(days=activity['deadline'])
+        last_date     = max(last_date, deadline_date)
+        needed        = activity['timing'] * 60
+        max_session   = max(15, activity.get('max_session_minutes', 120))
+
+        scheduled = 0
+        count     = 0
+        for s in state['sessions'].values():
+            if s['activity_name'] != name or s.get('is_skipped') or not s.get('scheduled_date'):
+                continue
+            day = datetime.fromisoformat(s['scheduled_date']).date()
+            count += 1
+            if day <= deadline_date:
+                scheduled += s['duration_minutes']
+            if not s.get('is_completed'):
+                hours = s['duration_minutes'] / 60
+                daily_hours[day] = daily_hours.get(day, 0) + hours
+                lateness += hours * max(0, (day - today_date).days) / deadline_days
+
+        on_time += min(needed, scheduled) / 60
+        extra   += max(0, count - math.ceil(needed / max_session))
+
+    num_days = (last_date - today_date).days + 1
+    mean     = sum(daily_hours.values()) / num_days
+    variance = sum(
+        (daily_hours.get(today_date + timedelta(days=i), 0) - mean) ** 2 for i in range(num_days)
+    ) / num_days
+
+    parts = {
+        'on_time_hours': on_time,
+        'fragmentation': extra,
+        'imbalance':     math.sqrt(variance),
+        'lateness':      lateness,
+    }
+    parts['total'] = sum(SCORE_WEIGHTS[k] * v for k, v in parts.items())
+    return parts
+
+
+# === Running candidates ===
+
+def _run_candidate(inputs, year, month, today, seed):
+    """One seeded generation on a copy of the inputs (runs in a worker process)."""
+    state = copy.deepcopy(inputs)
+    for _ in iter_generate_timetable(state, year, month, today=today, seed=seed):
+        pass
+    return seed, state, score_timetable(state, today)
+
+
+def _get_executor():
+    """Process pool shared by every job (started once - spawning workers isn't free)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the app process has threads (cache sync, Firebase)
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _iter_results(inputs, year, month, today, seeds, deadline, cancel):
+    """(seed, state, score) per finished candidate, in a process pool or in this thread if that fails."""
+    remaining = list(seeds)
+    try:
+        executor = _get_executor()
+        futures  = {executor.submit(_run_candidate, inputs, year, month, today, seed): seed for seed in seeds}
+        pending  = set(futures)
+        got_one  = False
+        try:
+            while pending and not cancel.is_set():
+                # Keep waiting past the budget until at least one candidate is back
+                if got_one and time.monotonic() >= deadline:
+                    break
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    # Only now - if the pool broke, the fallback below still runs this seed
+                    remaining.remove(futures[future])
+                    got_one = True
+                    yield result
+        finally:
+            # Drops queued candidates; running ones finish in their worker and are ignored
+            for future in pending:
+                future.cancel()
+        return
+    except (BrokenProcessPool, OSError, NotImplementedError):
+        _reset_executor()
+
+    for seed in remaining:
+        if cancel.is_set() or (len(remaining) < len(seeds) and time.monotonic() >= deadline):
+            return
+        yield _run_candidate(inputs, year, month, today, seed)
+        remaining = remaining[1:]
+
+
+def iter_portfolio(inputs, year: int, month: int, candidates: int = PORTFOLIO_CANDIDATES,
+                   budget_seconds: float = PORTFOLIO_BUDGET_SECONDS, today=None, cancel=None):
+    """
+    Generate `candidates` timetables from `inputs` (a plain dict of the keys
+    iter_generate_timetable reads) and keep the best. Yields:
+
+        {'type': 'candidate', 'index': i, 'total': K, 'seed': s, 'score': x, 'best_score': y}
+        {'type': 'best', 'state': {...}, 'seed': s, 'score': {...}, 'tried': n}   (last)
+
+    Nothing is yielded after a cancel.
+    """
+    from Timetable_Generation import tz
+
+    if today is None:
+        today = datetime.now(tz)
+    cancel   = cancel or threading.Event()
+    deadline = time.monotonic() + budget_seconds
+    seeds    = [random.randrange(2 ** 31) for _ in range(candidates)]
+
+    best  = None
+    tried = 0
+    for seed, state, score in _iter_results(inputs, year, month, today, seeds, deadline, cancel):
+        tried += 1
+        if best is None or score['total'] > best[2]['total']:
+            best = (seed, state, score)
+        yield {'type': 'candidate', 'index': tried, 'total': candidates, 'seed': seed,
+               'score': score['total'], 'best_score': best[2]['total']}
+
+    if cancel.is_set() or best is None:
+        return
+    seed, state, score = best
+    yield {'type': 'best', 'state': state, 'seed': seed, 'score': score, 'tried': tried}
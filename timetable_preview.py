@@ -0,0 +1,82 @@
+"""
+WHAT-IF PREVIEW
+Runs the generator on an overlay of the current state and reports what
+would change (timetable_diff.py) - nothing is written to session state or
+storage.
+
+StateOverlay falls through to the real state; a key is deep-copied the
+first time it's read (the generator edits what it reads in place) and every
+write lands on the overlay. Keys the generator never touches are never copied.
+
+Previews use a fixed seed and skip the local search (timetable_improve is
+time-boxed, so how much it finds depends on how busy the machine is). That
+way the same inputs at the same time give the same preview, which is what
+lets NeroTimeLogic.preview_generation cache it. A real generation is
+randomised and does run the search, so it can fit a little more in.
+"""
+
+import copy
+
+from Timetable_Generation import iter_generate_timetable
+from generation_job import INPUT_KEYS
+from timetable_diff import diff_plan
+
+PREVIEW_SEED              = 0
+PREVIEW_IMPROVE_BUDGET_MS = 0  # deterministic - see above
+
+
+class StateOverlay(dict):
+    def __init__(self, base, keys=INPUT_KEYS):
+        super().__init__()
+        self._base = base
+        self._keys = keys
+
+    def __missing__(self, key):
+        if key in self._keys and key in self._base:
+            value = copy.deepcopy(self._base[key])
+            self[key] = value
+            return value
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (key in self._keys and key in self._base)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def apply_changes(state, changes: dict):
+    """
+    Apply a what-if to `state` (an overlay):
+        'add_activities'     [activity dict]  appended to list_of_activities
+        'remove_activities'  [name]           dropped, with their sessions
+        'add_events'         [event dict]     appended to list_of_compulsory_events
+        any INPUT_KEYS key                    replaced outright
+    """
+    for key in INPUT_KEYS:
+        if key in changes:
+            state[key] = copy.deepcopy(changes[key])
+
+    removed = set(changes.get('remove_activities', []))
+    if removed:
+        state['list_of_activities'] = [a for a in state['list_of_activities'] if a['activity'] not in removed]
+        state['sessions'] = {sid: s for sid, s in state['sessions'].items() if s['activity_name'] not in removed}
+    state['list_of_activities'].extend(copy.deepcopy(changes.get('add_activities', [])))
+    state['list_of_compulsory_events'].extend(copy.deepcopy(changes.get('add_events', [])))
+
+
+def preview(state, year: int, month: int, changes: dict, today=None) -> dict:
+    """What generating `month` would do with `changes` applied: diff_plan(...) plus 'warnings'."""
+    overlay = StateOverlay(state)
+    apply_changes(overlay, changes)
+
+    warnings = []
+    for event in iter_generate_timetable(overlay, year, month, today=today, seed=PREVIEW_SEED,
+                                         improve_budget_ms=PREVIEW_IMPROVE_BUDGET_MS):
+        if event['type'] == 'done':
+            warnings = event['warnings']
+
+    return {**diff_plan(state, overlay), 'warnings': warnings}